@@ -0,0 +1,186 @@
+"""
+@file:   bench/e2e.py
+@module: bench.e2e
+@brief:  Runs EpicGames.run / PrimeGaming.run headless against the mock storefront (bench.mock_store)
+         and reports wall time, Playwright driver calls and peak memory per number of offers.
+         Usage: python -m bench.e2e [--sites epic_games,prime_gaming] [--offers 1,10,100] [--latency MS]
+                                    [--pacing fast] [--no-feed] [--headed] [--persistent]
+@author: Yonatan-Schrift
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL = "bench@example.com"
+
+
+class DriverCalls:
+    """
+    Counts the messages sent to the Playwright driver (every locator wait, click, evaluate... is one or more).
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        from playwright._impl._connection import Connection
+        self._connection = Connection
+        self._original = Connection._send_message_to_server
+
+    def __enter__(self) -> "DriverCalls":
+        calls, original = self.calls, self._original
+
+        def counting(connection, obj, method, params, no_reply=False):
+            calls[method] += 1
+            return original(connection, obj, method, params, no_reply)
+
+        self._connection._send_message_to_server = counting
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._connection._send_message_to_server = self._original
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class PeakRss:
+    """
+    Samples the resident memory of this process and all its descendants (driver and browser), keeping the peak.
+    Linux only (reads /proc); elsewhere only this process' own peak is reported.
+    """
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "PeakRss":
+        if os.path.isdir("/proc"):
+            self._task = asyncio.create_task(self._sample())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._task:
+            self._task.cancel()
+        elif resource:
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    async def _sample(self) -> None:
+        while True:
+            self.peak_mb = max(self.peak_mb, _tree_rss_mb(os.getpid()))
+            await asyncio.sleep(self.interval)
+
+
+def _tree_rss_mb(root: int) -> float:
+    children: dict[int, list[int]] = {}
+    rss_pages: dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{entry}/statm") as f:
+                rss_pages[int(entry)] = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # the process exited meanwhile
+        children.setdefault(int(stat[1]), []).append(int(entry))
+
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack += children.get(pid, [])
+    return total * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+async def run_once(site, offers: int, args) -> dict:
+    from bench.mock_store import MockStore
+    from core.setup import BrowserSession
+    from sites.epic_games import EpicGames
+
+    # a fresh ledger per run, so every offer is claimed
+    os.environ["LEDGER_PATH"] = os.path.join(os.getcwd(), f"claims-{site.NAME}-{offers}.db")
+
+    with MockStore(offers=offers, latency_ms=args.latency, feed=not args.no_feed) as store:
+        if site is EpicGames:
+            site.STORE_URL = store.url
+            site.PROMOTIONS_URL = f"{store.url}/freeGamesPromotions?locale=en-US"
+        else:
+            site.BASE_URL = f"{store.url}/prime/"
+
+        with DriverCalls() as driver:
+            async with PeakRss() as rss:
+                start = time.perf_counter()
+                async with BrowserSession(headless=not args.headed, persistent=args.persistent) as session:
+                    status = await site.run(EMAIL, "bench-password", session)
+                wall = time.perf_counter() - start
+
+        claimed = len(store.claimed["epic" if site is EpicGames else "prime"])
+
+    return {"site": site.NAME, "offers": offers, "status": status, "wall": wall, "calls": driver.total,
+            "rss": rss.peak_mb, "claimed": claimed, "top_calls": driver.calls.most_common(3)}
+
+
+async def run_all(args) -> list[dict]:
+    from sites.epic_games import EpicGames
+    from sites.prime_gaming import PrimeGaming
+
+    sites = {site.NAME: site for site in (EpicGames, PrimeGaming)}
+    results = []
+    for name in args.sites:
+        for offers in args.offers:
+            result = await run_once(sites[name], offers, args)
+            results.append(result)
+            print(_format_row(result), flush=True)
+    return results
+
+
+def _format_row(r: dict) -> str:
+    per_offer = r["calls"] / r["offers"] if r["offers"] else 0
+    top = ", ".join(f"{method} {n}" for method, n in r["top_calls"])
+    return (f"{r['site']:<14} {r['offers']:>6} {'OK' if r['status'] == 0 else 'FAILED':<7} {r['wall']:8.1f}s "
+            f"{r['calls']:>7} {per_offer:>8.1f} {r['rss']:8.0f} MB {r['claimed']:>5}/{r['offers']:<5}  ({top})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the claim flows against the mock storefront.")
+    parser.add_argument("--sites", default="epic_games,prime_gaming", help="comma separated site names")
+    parser.add_argument("--offers", default="1,10,100", help="comma separated numbers of offers (default: 1,10,100)")
+    parser.add_argument("--latency", type=int, default=50, help="mock response latency in ms (default: 50)")
+    parser.add_argument("--pacing", default="fast", help="anti-bot pacing profile (default: fast)")
+    parser.add_argument("--no-feed", action="store_true", help="make Epic fall back to scraping the storefront")
+    parser.add_argument("--headed", action="store_true", help="show the browser")
+    parser.add_argument("--persistent", action="store_true", help="one persistent browser profile per site")
+    args = parser.parse_args()
+    args.sites = [name.strip() for name in args.sites.split(",") if name.strip()]
+    args.offers = [int(n) for n in args.offers.split(",")]
+
+    # logs, browser profiles, ledgers and promotion windows all go to a throwaway directory
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="autoclaim-bench-")
+    os.chdir(workdir)
+    os.environ.update(NOTIFY_ON_DISCORD="false", PROMOTIONS_STATE=os.path.join(workdir, "promotions.json"))
+    os.environ.pop("EG_PROMOTIONS_URL", None)
+
+    from core.anti_bot import set_pacing
+    set_pacing(args.pacing)
+
+    print(f"Working directory: {workdir}")
+    print(f"{'site':<14} {'offers':>6} {'status':<7} {'wall':>9} {'calls':>7} {'calls/offer':>8} "
+          f"{'peak RSS':>11} {'claimed':>11}")
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
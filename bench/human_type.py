@@ -0,0 +1,204 @@
+"""
+@file:   bench/human_type.py
+@module: bench.human_type
+@brief:  Microbenchmark of human_type: driver calls and wall time per password, one key per call (the previous
+         engine, kept here as the reference) vs. the planned keystroke timeline, against a fake keyboard that
+         behaves like Playwright's (keydown, `delay`, keyup per key) with a simulated round trip per call.
+         Also compares the keystroke timing of both engines: the per-key delay distribution, the correlation
+         of consecutive delays (keys of a burst share theirs) and the typo and pause rates.
+         Usage: python -m bench.human_type [--length 30] [--runs 20] [--rtt-ms 2] [--pacing normal] [--samples 20000]
+@author: Yonatan-Schrift
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core import anti_bot  # noqa: E402
+from core.anti_bot import PacingProfile, human_type, pacing, plan_typing, set_pacing  # noqa: E402
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#%&*-_"
+
+
+class FakeKeyboard:
+    """
+    Records every call and the delay each key was typed with, and takes as long as the real driver would.
+    """
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.calls = 0
+        self.key_delays: list[float] = []
+
+    async def type(self, text: str, delay: float = 0) -> None:
+        self.calls += 1
+        self.key_delays += [delay / 1000] * len(text)
+        await asyncio.sleep(self.rtt + len(text) * delay / 1000)
+
+    async def press(self, key: str, delay: float = 0) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.rtt + delay / 1000)
+
+
+class FakePage:
+    def __init__(self, rtt: float):
+        self.keyboard = FakeKeyboard(rtt)
+
+
+class FakeLocator:
+    async def scroll_into_view_if_needed(self) -> None:
+        pass
+
+    async def click(self) -> None:
+        pass
+
+
+async def legacy_human_type(page, text: str) -> None:
+    """
+    The previous engine: one keyboard.type call per key, a press and two sleeps per typo.
+    """
+    profile = pacing()
+    min_delay, max_delay = profile.key_delay
+
+    def _ms() -> int:
+        return int(random.uniform(min_delay, max_delay) * 1000)
+
+    for ch in text:
+        if random.random() < profile.typo_rate:
+            await page.keyboard.type(random.choice(anti_bot._TYPOS_ALPHABET), delay=_ms())
+            await asyncio.sleep(random.uniform(*profile.typo_pause))
+            await page.keyboard.press("Backspace")
+            await asyncio.sleep(random.uniform(*profile.correction_pause))
+        await page.keyboard.type(ch, delay=_ms())
+        if random.random() < profile.think_rate:
+            await asyncio.sleep(random.uniform(*profile.think_pause))
+
+
+async def time_engine(engine: str, length: int, runs: int, rtt: float) -> tuple[list[int], list[float]]:
+    calls, walls = [], []
+    for _ in range(runs):
+        page = FakePage(rtt)
+        text = "".join(random.choices(_ALPHABET, k=length))
+        start = time.perf_counter()
+        if engine == "legacy":
+            await legacy_human_type(page, text)
+        else:
+            await human_type(page, FakeLocator(), text)
+        walls.append(time.perf_counter() - start)
+        calls.append(page.keyboard.calls)
+    return calls, walls
+
+
+def legacy_delays(profile: PacingProfile, samples: int) -> tuple[list[float], int, int]:
+    """
+    Per-key delays, typos and pauses of the previous engine over `samples` characters, without running it.
+    """
+    delays, typos, pauses = [], 0, 0
+    for _ in range(samples):
+        if random.random() < profile.typo_rate:
+            typos += 1
+            delays.append(int(random.uniform(*profile.key_delay) * 1000) / 1000)
+        delays.append(int(random.uniform(*profile.key_delay) * 1000) / 1000)
+        if random.random() < profile.think_rate:
+            pauses += 1
+    return delays, typos, pauses
+
+
+def planned_delays(profile: PacingProfile, samples: int) -> tuple[list[float], int, int, int]:
+    """
+    Per-key delays, typos, pauses and bursts (independent delay draws) of the planned timeline.
+    """
+    steps = plan_typing("x" * samples, *profile.key_delay, profile.typo_rate, profile)
+    delays = [step.delay for step in steps if step.kind == "type" for _ in step.text]
+    typos = sum(1 for step in steps if step.kind == "press")
+    pauses = sum(1 for step in steps if step.kind == "pause") - 2 * typos
+    bursts = sum(1 for step in steps if step.kind == "type")
+    return delays, typos, pauses, bursts
+
+
+def ks_statistic(a: list[float], b: list[float]) -> float:
+    """
+    Two-sample Kolmogorov-Smirnov statistic: the largest gap between the two empirical CDFs.
+    """
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    gap = 0.0
+    while i < len(a) and j < len(b):
+        x = min(a[i], b[j])
+        while i < len(a) and a[i] <= x:
+            i += 1
+        while j < len(b) and b[j] <= x:
+            j += 1
+        gap = max(gap, abs(i / len(a) - j / len(b)))
+    return gap
+
+
+def autocorrelation(delays: list[float]) -> float:
+    """
+    Lag-1 autocorrelation of the per-key delays: about 0 if every key is drawn on its own, 1 if they are all equal.
+    """
+    return statistics.correlation(delays[:-1], delays[1:])
+
+
+def repeat_share(delays: list[float]) -> float:
+    """
+    Share of keys typed with exactly the same delay as the key before them.
+    """
+    return sum(a == b for a, b in zip(delays, delays[1:])) / (len(delays) - 1)
+
+
+def rate_z(count: int, trials: int, rate: float) -> float:
+    """
+    How many standard deviations `count` events in `trials` are from the expected `rate` (binomial).
+    """
+    return (count - trials * rate) / (trials * rate * (1 - rate)) ** 0.5
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the human_type engines.")
+    parser.add_argument("--length", type=int, default=30, help="characters per password (default: 30)")
+    parser.add_argument("--runs", type=int, default=20, help="passwords typed per engine (default: 20)")
+    parser.add_argument("--rtt-ms", type=float, default=2, help="simulated driver round trip in ms (default: 2)")
+    parser.add_argument("--pacing", default="normal", help="pacing profile (default: normal, only fast bursts)")
+    parser.add_argument("--samples", type=int, default=20_000, help="characters for the distribution check")
+    args = parser.parse_args()
+
+    profile = set_pacing(args.pacing)
+    print(f"{args.runs} x {args.length} characters, pacing '{profile.name}', simulated round trip {args.rtt_ms} ms")
+    print(f"{'engine':<10} {'calls p50':>9} {'calls max':>9} {'wall p50':>9} {'wall max':>9}")
+    for engine in ("legacy", "planned"):
+        calls, walls = asyncio.run(time_engine(engine, args.length, args.runs, args.rtt_ms / 1000))
+        print(f"{engine:<10} {statistics.median(calls):9.0f} {max(calls):9d} "
+              f"{statistics.median(walls):8.2f}s {max(walls):8.2f}s")
+
+    old, old_typos, old_pauses = legacy_delays(profile, args.samples)
+    new, new_typos, new_pauses, bursts = planned_delays(profile, args.samples)
+    print(f"\nper-key delay over {args.samples} characters:")
+    for name, delays in (("legacy", old), ("planned", new)):
+        q = statistics.quantiles(delays, n=20)
+        print(f"  {name:<8} mean {statistics.mean(delays) * 1000:6.1f} ms  stdev {statistics.stdev(delays) * 1000:5.1f} ms"
+              f"  p5 {q[0] * 1000:5.0f}  p50 {q[9] * 1000:5.0f}  p95 {q[18] * 1000:5.0f}")
+    # keys of a burst share their draw, so the planned sample only holds `bursts` independent values
+    critical = 1.36 * ((len(old) + bursts) / (len(old) * bursts)) ** 0.5
+    print(f"  KS statistic {ks_statistic(old, new):.4f} (same distribution at 95%: below ~{critical:.4f})")
+
+    print("consecutive delays (the KS test above doesn't see these):")
+    print(f"  lag-1 autocorrelation  legacy {autocorrelation(old):6.3f}  planned {autocorrelation(new):6.3f}")
+    print(f"  same as previous key   legacy {repeat_share(old):6.1%}  planned {repeat_share(new):6.1%}")
+
+    print(f"rates over {args.samples} characters (z: standard deviations from the profile's rate, |z| < 2 is noise):")
+    for name, rate, legacy_count, planned_count in (("typos", profile.typo_rate, old_typos, new_typos),
+                                                    ("pauses", profile.think_rate, old_pauses, new_pauses)):
+        print(f"  {name:<7} expected {args.samples * rate:7.0f}  "
+              f"legacy {legacy_count:6d} (z {rate_z(legacy_count, args.samples, rate):+5.2f})  "
+              f"planned {planned_count:6d} (z {rate_z(planned_count, args.samples, rate):+5.2f})")
+
+
+if __name__ == "__main__":
+    main()
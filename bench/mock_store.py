@@ -0,0 +1,309 @@
+"""
+@file:   bench/mock_store.py
+@module: bench.mock_store
+@brief:  A local HTTP server reproducing the parts of the Epic Games and Prime Gaming pages the sites rely on,
+         with a configurable number of offers and response latency.
+         Usage: python -m bench.mock_store [--offers N] [--latency MS] [--batch N] [--no-feed] [--port PORT]
+@author: Yonatan-Schrift
+
+DOM contracts (keep in sync with sites/):
+    Epic (STORE_URL = <server>):
+        /en-US/                 signed-in storefront: [aria-label='Account menu'] and one
+                                [data-component='VaultOfferCard'] per offer (the scraping fallback)
+        /en-US/p/<slug>         product page: "In Library" once claimed, else a [data-testid*='purchase'] button
+                                that adds #webPurchaseContainer iframe -> "Place Order" -> "Thanks for your order!"
+        /freeGamesPromotions    the promotions feed (503 with --no-feed)
+    Prime (BASE_URL = <server>/prime/):
+        /prime/                 signed-in page: [data-a-target='user-dropdown-first-name-text'] and a lazily
+                                loaded .offer-list__content__grid of [data-a-target='FGWPOffer'] links (unclaimed only)
+        /prime/offer/<n>        offer page: "Get game" -> [title='Claim Code'] opening /prime/code/<n> in a new tab
+"""
+import argparse
+import html
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}
+</body></html>
+"""
+
+_PURCHASE_JS = """
+document.querySelector("[data-testid='purchase-cta-button']").addEventListener("click", () => {{
+    setTimeout(() => {{
+        const container = document.createElement("div");
+        container.id = "webPurchaseContainer";
+        container.innerHTML = '<iframe src="/purchase/{slug}" width="600" height="300"></iframe>';
+        document.body.appendChild(container);
+    }}, {latency});
+}});
+"""
+
+_PLACE_ORDER_JS = """
+document.querySelector("button").addEventListener("click", async () => {{
+    await fetch("/api/claim/epic/{slug}", {{method: "POST"}});
+    parent.document.body.insertAdjacentHTML("beforeend", "<h2>Thanks for your order!</h2>");
+}});
+"""
+
+# renders the offer grid in batches, like the real page loading more offers while scrolling
+_PRIME_GRID_JS = """
+const offers = {offers};
+const grid = document.querySelector(".offer-list__content__grid");
+let shown = 0;
+function loadBatch() {{
+    for (const offer of offers.slice(shown, shown + {batch})) {{
+        const link = document.createElement("a");
+        link.setAttribute("data-a-target", "FGWPOffer");
+        link.setAttribute("aria-label", "Claim " + offer.name);
+        link.href = offer.href;
+        link.textContent = offer.name;
+        link.style.display = "block";
+        grid.appendChild(link);
+    }}
+    shown += {batch};
+    if (shown < offers.length) setTimeout(loadBatch, {latency});
+}}
+loadBatch();
+"""
+
+_GET_GAME_JS = """
+document.querySelector("#get-game").addEventListener("click", () => {{
+    setTimeout(() => {{
+        document.body.insertAdjacentHTML("beforeend",
+            '<a title="Claim Code" href="/prime/code/{number}" target="_blank">Claim Code</a>');
+    }}, {latency});
+}});
+"""
+
+
+class MockStore:
+    """
+    The mock storefront server, running in a background thread.
+
+    Attributes:
+        offers (int): Number of free offers on each site.
+        latency_ms (int): Delay before every response, and between the lazily loaded batches of the Prime grid.
+        batch (int): Number of Prime offers loaded per batch.
+        feed (bool): Whether the Epic promotions feed works (else the sites fall back to scraping).
+        claimed (dict[str, set[str]]): Claimed offers per site ("epic" slugs, "prime" numbers).
+        requests (Counter): Number of requests per kind of page.
+
+    Usage:
+        with MockStore(offers=10, latency_ms=50) as store:
+            EpicGames.STORE_URL = store.url
+            ...
+    """
+
+    def __init__(self, offers: int = 10, latency_ms: int = 50, batch: int = 10, feed: bool = True, port: int = 0):
+        self.offers = offers
+        self.latency_ms = latency_ms
+        self.batch = max(1, batch)
+        self.feed = feed
+        self.claimed: dict[str, set[str]] = {"epic": set(), "prime": set()}
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "MockStore":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def claim(self, site: str, offer: str) -> None:
+        with self._lock:
+            self.claimed[site].add(offer)
+
+    # ─────────────────────────────────────────────
+    # Epic Games
+    # ─────────────────────────────────────────────
+
+    @staticmethod
+    def epic_slug(number: int) -> str:
+        return f"mock-game-{number}"
+
+    def epic_storefront(self) -> str:
+        cards = "\n".join(
+            f'<div data-component="VaultOfferCard"><a href="/en-US/p/{self.epic_slug(n)}">'
+            f"<div>FREE NOW</div><div>Mock Game {n}</div><div>Free Now - Until next week</div></a></div>"
+            for n in range(1, self.offers + 1)
+        )
+        body = (
+            '<nav><button aria-label="Account menu" title="Bench User">BU</button></nav>\n'
+            f'<main style="height: 3000px">Store</main>\n<section id="free-games">\n{cards}\n</section>'
+        )
+        return _PAGE.format(title="Epic Games Store", body=body)
+
+    def epic_product(self, slug: str) -> str | None:
+        if slug not in {self.epic_slug(n) for n in range(1, self.offers + 1)}:
+            return None
+        if slug in self.claimed["epic"]:
+            action = "<span>In Library</span>"
+        else:
+            script = _PURCHASE_JS.format(slug=slug, latency=self.latency_ms)
+            action = f'<button data-testid="purchase-cta-button">Get</button>\n<script>{script}</script>'
+        return _PAGE.format(title=slug, body=f"<h1>{html.escape(slug)}</h1>\n{action}")
+
+    def epic_purchase(self, slug: str) -> str:
+        body = f"<button>Place Order</button>\n<script>{_PLACE_ORDER_JS.format(slug=slug)}</script>"
+        return _PAGE.format(title="Checkout", body=body)
+
+    def epic_feed(self) -> dict:
+        now = datetime.now(timezone.utc)
+        window = {
+            "startDate": (now - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "endDate": (now + timedelta(days=6)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "discountSetting": {"discountType": "PERCENTAGE", "discountPercentage": 0},
+        }
+        elements = [
+            {
+                "title": f"Mock Game {n}",
+                "id": f"mock-offer-{n}",
+                "offerType": "BASE_GAME",
+                "productSlug": self.epic_slug(n),
+                "offerMappings": [{"pageSlug": self.epic_slug(n), "pageType": "productHome"}],
+                "promotions": {"promotionalOffers": [{"promotionalOffers": [window]}], "upcomingPromotionalOffers": []},
+            }
+            for n in range(1, self.offers + 1)
+        ]
+        return {"data": {"Catalog": {"searchStore": {"elements": elements}}}}
+
+    # ─────────────────────────────────────────────
+    # Prime Gaming
+    # ─────────────────────────────────────────────
+
+    def prime_home(self) -> str:
+        offers = [
+            {"name": f"Prime Game {n}", "href": f"/prime/offer/{n}"}
+            for n in range(1, self.offers + 1) if str(n) not in self.claimed["prime"]
+        ]
+        script = _PRIME_GRID_JS.format(offers=json.dumps(offers), batch=self.batch, latency=self.latency_ms)
+        body = (
+            '<nav><span data-a-target="user-dropdown-first-name-text" title="Bench User">Bench</span></nav>\n'
+            '<div class="offer-list__content__grid"></div>\n'
+            f"<script>{script}</script>"
+        )
+        return _PAGE.format(title="Prime Gaming", body=body)
+
+    def prime_offer(self, number: str) -> str | None:
+        if not number.isdigit() or not 1 <= int(number) <= self.offers:
+            return None
+        script = _GET_GAME_JS.format(number=number, latency=self.latency_ms)
+        body = f"<h1>Prime Game {number}</h1>\n<button id=\"get-game\">Get game</button>\n<script>{script}</script>"
+        return _PAGE.format(title=f"Prime Game {number}", body=body)
+
+    def prime_code(self, number: str) -> str:
+        self.claim("prime", number)
+        return _PAGE.format(title="Your code", body=f"<p>Code for Prime Game {number}: MOCK-{number:0>4}</p>")
+
+
+def _handler_for(store: MockStore) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args) -> None:
+            pass  # keep the benchmark output readable
+
+        def _send(self, status: int, body: str, content_type: str = "text/html; charset=utf-8") -> None:
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self, method: str) -> tuple[str, int, str, str]:
+            path = urlparse(self.path).path
+            parts = [part for part in path.split("/") if part]
+            page = None
+            content_type = "text/html; charset=utf-8"
+
+            match method, parts:
+                case "GET", ["en-US"]:
+                    kind, page = "epic_storefront", store.epic_storefront()
+                case "GET", ["en-US", "p" | "bundles", slug]:
+                    kind, page = "epic_product", store.epic_product(slug)
+                case "GET", ["purchase", slug]:
+                    kind, page = "epic_purchase", store.epic_purchase(slug)
+                case "POST", ["api", "claim", "epic", slug]:
+                    store.claim("epic", slug)
+                    kind, page, content_type = "epic_claim", "{}", "application/json"
+                case "GET", ["freeGamesPromotions"]:
+                    kind, content_type = "epic_feed", "application/json"
+                    page = json.dumps(store.epic_feed()) if store.feed else None
+                    if page is None:
+                        return kind, 503, "{}", content_type
+                case "GET", ["prime"]:
+                    kind, page = "prime_home", store.prime_home()
+                case "GET", ["prime", "offer", number]:
+                    kind, page = "prime_offer", store.prime_offer(number)
+                case "GET", ["prime", "code", number]:
+                    kind, page = "prime_code", store.prime_code(number)
+                case _:
+                    kind = "unknown"
+
+            if page is None:
+                return kind, 404, _PAGE.format(title="Not found", body="<h1>404</h1>"), "text/html; charset=utf-8"
+            return kind, 200, page, content_type
+
+        def _handle(self, method: str) -> None:
+            time.sleep(store.latency_ms / 1000)
+            kind, status, body, content_type = self._route(method)
+            with store._lock:
+                store.requests[kind] += 1
+            self._send(status, body, content_type)
+
+        def do_GET(self) -> None:
+            self._handle("GET")
+
+        def do_POST(self) -> None:
+            self._handle("POST")
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a mock Epic Games / Prime Gaming storefront.")
+    parser.add_argument("--offers", type=int, default=10, help="number of free offers per site (default: 10)")
+    parser.add_argument("--latency", type=int, default=50, help="delay before every response in ms (default: 50)")
+    parser.add_argument("--batch", type=int, default=10, help="Prime offers loaded per batch (default: 10)")
+    parser.add_argument("--no-feed", action="store_true", help="make the Epic promotions feed fail")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    store = MockStore(args.offers, args.latency, args.batch, not args.no_feed, args.port)
+    store.start()
+    print(f"Epic Games:  {store.url}/en-US/  (feed: {store.url}/freeGamesPromotions)")
+    print(f"Prime:       {store.url}/prime/")
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        store.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+@file:   bench/noop_startup.py
+@module: bench.noop_startup
+@brief:  Measures a cron run of `main.py -a` when every current promotion was already claimed:
+         wall time, peak memory, and whether Playwright got imported.
+         Usage: python -m bench.noop_startup [runs]
+@author: Yonatan-Schrift
+"""
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+EMAIL = "bench@example.com"
+
+
+def _settled_state(path: str) -> None:
+    until = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat(timespec="seconds")
+    window = {EMAIL: {"offers": ["bench"], "until": until, "checked_at": until}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"epic_games": window, "prime_gaming": window}, f)
+
+
+def _run(cwd: str, env: dict, *extra: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *extra, MAIN, "-a"], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def main(runs: int = 20) -> None:
+    with tempfile.TemporaryDirectory() as cwd:  # no user.env here, credentials come from the environment
+        state_path = os.path.join(cwd, "promotions.json")
+        _settled_state(state_path)
+        env = dict(os.environ, PROMOTIONS_STATE=state_path, ACCOUNTS_FILE="",
+                   EG_EMAIL=EMAIL, EG_PASSWORD="x", PG_EMAIL=EMAIL, PG_PASSWORD="x",
+                   PYTHONPATH=ROOT)
+
+        first = _run(cwd, env)
+        print(first.stdout.strip())
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            _run(cwd, env)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # ru_maxrss is the peak over every child so far (KiB on Linux)
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        imports = _run(cwd, env, "-X", "importtime").stderr
+        playwright_imported = any(line.rstrip().endswith("playwright") for line in imports.splitlines())
+        logs_created = os.path.exists(os.path.join(cwd, "logs"))
+
+    print(f"runs:           {runs}")
+    print(f"wall time:      median {statistics.median(timings):.0f} ms, "
+          f"min {min(timings):.0f} ms, max {max(timings):.0f} ms")
+    print(f"peak RSS:       {peak_rss_mb:.1f} MB")
+    print(f"playwright:     {'imported' if playwright_imported else 'not imported'}")
+    print(f"logs created:   {logs_created}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
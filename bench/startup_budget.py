@@ -0,0 +1,92 @@
+"""
+@file:   bench/startup_budget.py
+@module: bench.startup_budget
+@brief:  Startup budget check: runs `python -X importtime main.py --help` and fails (exit code 1) if the imports
+         take longer than the budget or pull in a module that should only load once a site runs.
+         Usage: python -m bench.startup_budget [--budget-ms MS] [--runs N] [-- main.py args]
+@author: Yonatan-Schrift
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+DEFAULT_BUDGET_MS = 75
+# heavy or side-effecting modules that must stay out of the CLI's startup
+FORBIDDEN = ("playwright", "sites.epic_games", "sites.prime_gaming", "logs.logger", "requests", "core.setup")
+
+
+def import_times(args: list[str]) -> dict[str, int]:
+    """
+    Runs main.py with -X importtime and returns the self import time (µs) of every module it imported,
+    leaving out the interpreter's own startup (the modules `python -c pass` imports, e.g. site and its .pth files).
+    """
+    baseline = set(_parse(_importtime(["-c", "pass"])))
+    times = _parse(_importtime([MAIN, *args]))
+    return {name: us for name, us in times.items() if name not in baseline}
+
+
+def forbidden_imports(times: dict[str, int]) -> list[str]:
+    """
+    Returns the modules of `times` (see `import_times`) that must stay out of the CLI's startup.
+    """
+    return sorted(name for name in times if any(name == f or name.startswith(f + ".") for f in FORBIDDEN))
+
+
+def _importtime(command: list[str]) -> str:
+    with tempfile.TemporaryDirectory() as cwd:  # no user.env or logs/ of the checkout
+        result = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=cwd,
+                                capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+    return result.stderr
+
+
+def _parse(stderr: str) -> dict[str, int]:
+    times = {}
+    for line in stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the import time budget of the CLI.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS") or DEFAULT_BUDGET_MS),
+                        help=f"maximum total import time in ms (default: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--runs", type=int, default=5, help="runs to take the median of (default: 5)")
+    parser.add_argument("main_args", nargs="*", default=["--help"], help="arguments of main.py (default: --help)")
+    args = parser.parse_args()
+
+    runs = [import_times(args.main_args) for _ in range(max(1, args.runs))]
+    totals = [sum(times.values()) / 1000 for times in runs]
+    total = statistics.median(totals)
+    last = runs[-1]
+
+    print(f"main.py {' '.join(args.main_args)}: {len(last)} modules, "
+          f"median import time {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("slowest:")
+    for name, us in sorted(last.items(), key=lambda item: -item[1])[:8]:
+        print(f"  {us / 1000:7.2f} ms  {name}")
+
+    failed = False
+    loaded = forbidden_imports(last)
+    if loaded:
+        print(f"FAIL: imported {', '.join(loaded)}")
+        failed = True
+    if total > args.budget_ms:
+        print(f"FAIL: import time over budget by {total - args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+@file:   core/accounts.py
+@module: core.accounts
+@brief:  Loading of the accounts to claim for, from an accounts file (CSV/TOML/JSON) or from user.env.
+@author: Yonatan-Schrift
+"""
+import json
+import os
+from collections.abc import Collection
+from dataclasses import dataclass
+
+from core.exceptions import AccountsFileError
+
+
+@dataclass(frozen=True)
+class Account:
+    """
+    A single account on a single site.
+
+    Attributes:
+        site (str): Name of the site (the `NAME` of its Website subclass), e.g. "epic_games".
+        email (str): Login email.
+        password (str): Login password.
+        label (str): Optional display name used in reports instead of the email.
+    """
+    site: str
+    email: str
+    password: str
+    label: str = ""
+
+    def __repr__(self) -> str:
+        # never leak the password into logs or tracebacks
+        return f"Account(site={self.site!r}, email={self.email!r})"
+
+    @property
+    def display_name(self) -> str:
+        return self.label or self.email or "<no email>"
+
+
+def accounts_from_env(credentials: dict[str, tuple[str, str]]) -> list[Account]:
+    """
+    Builds one account per site from the EG_*/PG_* variables in user.env.
+
+    Args:
+        credentials (dict[str, tuple[str, str]]): Site name -> names of its email and password variables,
+            for every site to build an account for.
+
+    Returns:
+        list[Account]: The accounts (credentials may be None if not set).
+    """
+    accounts = []
+    for site, (email_var, password_var) in credentials.items():
+        accounts.append(Account(site, os.getenv(email_var), os.getenv(password_var)))
+    return accounts
+
+
+def load_accounts(path: str, known_sites: Collection[str]) -> list[Account]:
+    """
+    Loads accounts from a CSV, TOML or JSON file (chosen by the file extension).
+
+    Formats:
+        CSV:  a header row with the columns site,email,password[,label]
+        TOML: [[account]] tables with the keys site, email, password and optionally label
+        JSON: a list of objects with the keys site, email, password and optionally label
+
+    Args:
+        path (str): Path of the accounts file.
+        known_sites (Collection[str]): Names of the sites an account may be for.
+
+    Returns:
+        list[Account]: The accounts, in file order.
+
+    Raises:
+        AccountsFileError: If the file is missing, has an unknown format or an invalid entry.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        match extension:
+            case ".csv":
+                import csv  # the parsers are imported on demand, they're a good part of the CLI's startup time
+                with open(path, newline="", encoding="utf-8") as f:
+                    entries = list(csv.DictReader(f))
+            case ".toml":
+                import tomllib
+                with open(path, "rb") as f:
+                    entries = tomllib.load(f).get("account", [])
+            case ".json":
+                with open(path, encoding="utf-8") as f:
+                    entries = json.load(f)
+            case _:
+                raise AccountsFileError(f"Unsupported accounts file format '{extension}', use .csv, .toml or .json")
+    except (OSError, ValueError) as e:  # tomllib/json decode errors are ValueErrors
+        raise AccountsFileError(f"Could not read accounts file {path}: {e}") from e
+
+    if not isinstance(entries, list):
+        raise AccountsFileError(f"Accounts file {path} must contain a list of accounts")
+
+    accounts = []
+    for i, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise AccountsFileError(f"Account #{i} in {path} is not a table/object")
+
+        site = (entry.get("site") or "").strip().lower()
+        if site not in known_sites:
+            raise AccountsFileError(
+                f"Account #{i} in {path} has unknown site '{site}', expected one of {', '.join(known_sites)}"
+            )
+        if not entry.get("email") or not entry.get("password"):
+            raise AccountsFileError(f"Account #{i} in {path} is missing an email or password")
+
+        accounts.append(Account(site, entry["email"].strip(), entry["password"], (entry.get("label") or "").strip()))
+
+    return accounts
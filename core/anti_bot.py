@@ -6,35 +6,178 @@
 """
 
 
+import asyncio
+import os
 import random
-import time
-from typing import Final
-from playwright.sync_api import Page, Locator
-from playwright.sync_api import TimeoutError as PWTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Final, Iterator
+from playwright.async_api import Page, Locator
+from playwright.async_api import TimeoutError as PWTimeoutError
 
 
-# Human-type defaults
-DEFAULT_ERROR_RATE: Final[float] = 0.06
-DEFAULT_THINK_PAUSE: Final[float] = 0.08
-DEFAULT_MIN_DELAY : Final[float] = 0.08
-DEFAULT_MAX_DELAY: Final[float] = 0.15
 _TYPOS_ALPHABET: Final[str] = "abcdefghijklmnopqrstuvwxyz0123456789"
 
 # Random sleep defaults
 DEFAULT_MAX_ALLOWED_DELAY: Final[int] = 300 # 5 minutes
 
 
-def random_sleep(min_sec: float = 0.2, max_sec: float = 1.5) -> float:
+@dataclass(frozen=True)
+class PacingProfile:
+    """
+    Every deliberate delay of the anti-bot layer, in one place.
+    Ranges are (min, max) seconds, rates are probabilities (0..1).
+    """
+    name: str
+    action_delay: tuple[float, float]      # generic pause between steps
+    find_delay: tuple[float, float]        # after an element was found
+    click_pause: tuple[float, float]       # between hovering an element and clicking it
+    key_delay: tuple[float, float]         # per keystroke
+    typo_rate: float                       # chance of a (corrected) typo per character
+    typo_pause: tuple[float, float]        # after a typo, before deleting it
+    correction_pause: tuple[float, float]  # after deleting a typo
+    think_rate: float                      # chance of a short pause per character
+    think_pause: tuple[float, float]       # length of such a pause
+    scroll_pause: tuple[float, float]      # between scrolls
+    settle_pause: tuple[float, float]      # after scrolling, for lazy content to load
+    key_burst: int = 1                     # most keys per driver call, sharing one delay (>1: identical delays)
+
+
+PACING_PROFILES: Final[dict[str, PacingProfile]] = {
+    "paranoid": PacingProfile(
+        name="paranoid",
+        action_delay=(0.5, 2.5),
+        find_delay=(2, 5),
+        click_pause=(0.2, 0.6),
+        key_delay=(0.12, 0.25),
+        typo_rate=0.08,
+        typo_pause=(0.1, 0.4),
+        correction_pause=(0.05, 0.2),
+        think_rate=0.12,
+        think_pause=(0.1, 0.8),
+        scroll_pause=(2, 3),
+        settle_pause=(3, 7),
+    ),
+    # the delays the project always used
+    "normal": PacingProfile(
+        name="normal",
+        action_delay=(0.2, 1.5),
+        find_delay=(1, 3.5),
+        click_pause=(0.1, 0.3),
+        key_delay=(0.08, 0.15),
+        typo_rate=0.06,
+        typo_pause=(0.05, 0.25),
+        correction_pause=(0.02, 0.1),
+        think_rate=0.08,
+        think_pause=(0.05, 0.4),
+        scroll_pause=(1, 2),
+        settle_pause=(2, 5),
+    ),
+    "fast": PacingProfile(
+        name="fast",
+        action_delay=(0.05, 0.3),
+        find_delay=(0.1, 0.4),
+        click_pause=(0.05, 0.1),
+        key_delay=(0.03, 0.06),
+        typo_rate=0.02,
+        typo_pause=(0.03, 0.1),
+        correction_pause=(0.01, 0.05),
+        think_rate=0.02,
+        think_pause=(0.05, 0.15),
+        scroll_pause=(0.3, 0.6),
+        settle_pause=(0.5, 1),
+        key_burst=4,  # speed over realism
+    ),
+}
+DEFAULT_PACING: Final[str] = "normal"
+
+_active_profile: PacingProfile | None = None
+
+
+def set_pacing(name: str) -> PacingProfile:
+    """
+    Selects the pacing profile used by every delay from now on.
+
+    Args:
+        name (str): One of PACING_PROFILES.
+
+    Returns:
+        PacingProfile: The selected profile.
+
+    Raises:
+        ValueError: If there is no profile with that name.
+    """
+    global _active_profile
+
+    profile = PACING_PROFILES.get(name.strip().lower())
+    if profile is None:
+        raise ValueError(f"Unknown pacing profile '{name}', expected one of {', '.join(PACING_PROFILES)}")
+
+    _active_profile = profile
+    return profile
+
+
+def pacing() -> PacingProfile:
+    """
+    Returns the active pacing profile (PACING_PROFILE from the environment until `set_pacing` is called).
+    """
+    if _active_profile is None:
+        return set_pacing(os.getenv("PACING_PROFILE") or DEFAULT_PACING)
+    return _active_profile
+
+
+class DelayStats:
+    """
+    Seconds spent in deliberate (anti-bot) delays during a run.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.seconds += seconds
+        self.count += 1
+
+
+_delay_stats: ContextVar[DelayStats | None] = ContextVar("delay_stats", default=None)
+
+
+@contextmanager
+def track_delays() -> Iterator[DelayStats]:
+    """
+    Accounts every deliberate delay made inside the block (in the current task) into the yielded DelayStats.
+    Concurrent tasks each track their own delays.
+    """
+    stats = DelayStats()
+    token = _delay_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _delay_stats.reset(token)
+
+
+def _account_delay(seconds: float) -> None:
+    stats = _delay_stats.get()
+    if stats is not None:
+        stats.add(seconds)
+
+
+async def random_sleep(min_sec: float | None = None, max_sec: float | None = None) -> float:
     """
     Sleep for a random duration between min_sec and max_sec seconds.
 
     Args:
-        min_sec: Minimum duration in seconds (must be >= 0).
-        max_sec: Maximum duration in seconds (must be >= min_sec and <= 300).
+        min_sec: Minimum duration in seconds (must be >= 0). Defaults to the pacing profile's action delay.
+        max_sec: Maximum duration in seconds (must be >= min_sec and <= 300). Defaults to the pacing profile's action delay.
 
     Returns:
         The sleep duration in seconds.
     """
+    if min_sec is None or max_sec is None:
+        min_sec, max_sec = pacing().action_delay
+
     # Swaps min and max if max is smaller
     if max_sec < min_sec:
         min_sec, max_sec = max_sec, min_sec
@@ -44,12 +187,13 @@ def random_sleep(min_sec: float = 0.2, max_sec: float = 1.5) -> float:
         return 0
 
     delay = random.uniform(min_sec, max_sec)
-    time.sleep(delay)
+    await asyncio.sleep(delay)
+    _account_delay(delay)
 
     return delay
 
 
-def user_click(locator: Locator) -> None:
+async def user_click(locator: Locator) -> None:
     """
     Human-like click:  hover -> small pause -> click.
 
@@ -58,38 +202,103 @@ def user_click(locator: Locator) -> None:
     """
     if locator is None: return  # in case of empty locator
 
-    locator.scroll_into_view_if_needed()
+    await locator.scroll_into_view_if_needed()
     try:
-        locator.hover(timeout=1000)
+        await locator.hover(timeout=1000)
     except PWTimeoutError:
         # if hover fails, just continue to click
-        random_sleep(0.1, 0.3)
-        locator.click(force=True)
+        await random_sleep(*pacing().click_pause)
+        await locator.click(force=True)
 
         return
 
-    random_sleep(0.1, 0.3)
-    locator.click()
+    await random_sleep(*pacing().click_pause)
+    await locator.click()
+
+
+@dataclass(frozen=True)
+class TypingStep:
+    """
+    One step of a typing timeline: a driver call or a pause between them.
+    """
+    kind: str           # "type" (a burst of keys), "press" (a single key) or "pause"
+    text: str = ""      # the keys of a "type", the key of a "press"
+    delay: float = 0.0  # per-key delay of a "type", length of a "pause" (seconds)
+
+
+def plan_typing(text: str, min_delay: float, max_delay: float, error_rate: float,
+                profile: PacingProfile) -> list[TypingStep]:
+    """
+    Generates the whole keystroke timeline of `text` up front: bursts of keys, typos, corrections and pauses.
+
+    Every key gets its own delay from uniform(min_delay, max_delay) and its own driver call, unless the profile's
+    key_burst allows bursts: then up to key_burst consecutive keys share one delay (a single driver call), ending
+    early at every typo and thinking pause. A key's delay keeps its distribution and typos and pauses their rates,
+    but the keys of a burst have identical delays (bench.human_type measures the correlation).
+
+    Returns:
+        list[TypingStep]: The steps, in order.
+    """
+    steps: list[TypingStep] = []
+    burst, delay, size = "", 0.0, 0
+
+    def _flush() -> None:
+        nonlocal burst
+        if burst:
+            steps.append(TypingStep("type", burst, delay))
+            burst = ""
+
+    def _key(ch: str) -> None:
+        nonlocal burst, delay, size
+        if not burst:
+            delay = int(random.uniform(min_delay, max_delay) * 1000) / 1000  # whole ms, as the driver takes it
+            size = random.randint(1, profile.key_burst)
+        burst += ch
+        if len(burst) >= size:
+            _flush()
 
+    def _pause(bounds: tuple[float, float]) -> None:
+        _flush()
+        steps.append(TypingStep("pause", delay=random.uniform(*bounds)))
 
-def human_type(
+    for ch in text:
+        # simulate occasional typo
+        if random.random() < error_rate:
+            _key(random.choice(_TYPOS_ALPHABET))
+            _pause(profile.typo_pause)
+            steps.append(TypingStep("press", "Backspace"))
+            _pause(profile.correction_pause)
+
+        # the intended char
+        _key(ch)
+
+        # small random pause occasionally (simulate thinking)
+        if random.random() < profile.think_rate:
+            _pause(profile.think_pause)
+
+    _flush()
+    return steps
+
+
+async def human_type(
         page: Page,
         locator: Locator,
         text: str,
-        min_delay: float = DEFAULT_MIN_DELAY,
-        max_delay: float = DEFAULT_MAX_DELAY,
-        error_rate: float = DEFAULT_ERROR_RATE,
+        min_delay: float | None = None,
+        max_delay: float | None = None,
+        error_rate: float | None = None,
 ) -> None:
     """
     Type `text` into element represented by `locator` simulating human typing.
+    The keystroke timeline is planned up front (see `plan_typing`); only a profile with key_burst > 1 sends bursts.
 
     Args:
         page (Page): Playwright page.
         locator (Locator): Target locator (focusable/typeable element).
         text (str): Text to type.
-        min_delay (float): Min per-character delay (seconds).
-        max_delay (float): Max per-character delay (seconds).
-        error_rate (float): Probability of a typo that gets corrected (0..1).
+        min_delay (float): Min per-character delay (seconds), defaults to the pacing profile.
+        max_delay (float): Max per-character delay (seconds), defaults to the pacing profile.
+        error_rate (float): Probability of a typo that gets corrected (0..1), defaults to the pacing profile.
 
     Returns:
         None
@@ -98,36 +307,34 @@ def human_type(
         return  # nothing to type
 
     # Focus on the element
-    locator.scroll_into_view_if_needed()
-    locator.click()
+    await locator.scroll_into_view_if_needed()
+    await locator.click()
+
+    profile = pacing()
+    if min_delay is None: min_delay = profile.key_delay[0]
+    if max_delay is None: max_delay = profile.key_delay[1]
+    if error_rate is None: error_rate = profile.typo_rate
 
     # Swaps min and max if max is smaller
     if max_delay < min_delay:
         min_delay, max_delay = max_delay, min_delay
 
-    def _ms() -> int:
-        return int(random.uniform(min_delay, max_delay) * 1000)
-
-    for ch in text:
-        # simulate occasional typo
-        if random.random() < error_rate:
-            wrong_char = random.choice(_TYPOS_ALPHABET)
-            page.keyboard.type(wrong_char, delay=_ms())
-            random_sleep(0.05, 0.25)
-            page.keyboard.press("Backspace")
-            random_sleep(0.02, 0.1)
-
-        # type the intended char
-        page.keyboard.type(ch, delay=_ms())
+    for step in plan_typing(text, min_delay, max_delay, error_rate, profile):
+        match step.kind:
+            case "type":
+                await page.keyboard.type(step.text, delay=int(step.delay * 1000))
+                _account_delay(step.delay * len(step.text))
+            case "press":
+                await page.keyboard.press(step.text)
+            case "pause":
+                await asyncio.sleep(step.delay)
+                _account_delay(step.delay)
 
-        # small random pause occasionally (simulate thinking)
-        if random.random() < DEFAULT_THINK_PAUSE:
-            random_sleep(0.05, 0.4)
 
-def scroll_down(page: Page, amount: int) -> None:
+async def scroll_down(page: Page, amount: int) -> None:
     total = 0
 
     while total < amount:
         pick = random.randint(1, amount - total)
         total += pick
-        page.mouse.wheel(100, pick)
+        await page.mouse.wheel(100, pick)
@@ -0,0 +1,78 @@
+"""
+@file:   core/batch.py
+@module: core.batch
+@brief:  Runs (site, account) claim jobs concurrently over a bounded number of browser contexts.
+@author: Yonatan-Schrift
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from core.accounts import Account
+from core.anti_bot import track_delays
+from core.constants import DEFAULT_MAX_CONTEXTS
+from core.setup import BrowserSession
+from core.tracing import span
+
+
+class JobResult:
+    """
+    The outcome of one (site, account) job.
+
+    Attributes:
+        account (Account): The account the job ran for.
+        status (int): The exit code of the site run (0 = success).
+        duration (float): Wall time of the job in seconds (excluding time waiting for a free slot).
+        delay (float): Seconds of `duration` spent in deliberate anti-bot delays.
+        error (BaseException | None): The exception if the site run crashed.
+    """
+
+    def __init__(self, account: Account, status: int, duration: float, delay: float,
+                 error: BaseException | None = None):
+        self.account = account
+        self.status = status
+        self.duration = duration
+        self.delay = delay
+        self.error = error
+
+    @property
+    def outcome(self) -> str:
+        if self.error is not None:
+            return "CRASHED"
+        return "OK" if self.status == 0 else "FAILED"
+
+
+async def run_batch(
+        jobs: list[tuple[type, Account]],
+        session: BrowserSession,
+        max_contexts: int = DEFAULT_MAX_CONTEXTS,
+        per_site: int | None = None,
+) -> list[JobResult]:
+    """
+    Runs every (site, account) job, with at most `max_contexts` browser contexts open at a time
+    and at most `per_site` of them on the same site.
+
+    Args:
+        jobs: Pairs of a Website subclass and the account to run it for.
+        session (BrowserSession): The shared browser session the sites open their contexts in.
+        max_contexts (int): Total concurrency cap over all sites.
+        per_site (int | None): Concurrency cap per site (defaults to `max_contexts`).
+
+    Returns:
+        list[JobResult]: One result per job, in the order of `jobs`.
+    """
+    total_slots = asyncio.Semaphore(max(1, max_contexts))
+    site_slots = defaultdict(lambda: asyncio.Semaphore(max(1, per_site or max_contexts)))
+
+    async def _run(site, account: Account) -> JobResult:
+        # take the site slot first, so a job waiting on its site doesn't hold one of the total slots
+        async with site_slots[site], total_slots:
+            with track_delays() as delays, span("job", site=site.NAME):
+                start = time.perf_counter()
+                try:
+                    status = await site.run(account.email, account.password, session)
+                    return JobResult(account, status, time.perf_counter() - start, delays.seconds)
+                except Exception as e:
+                    return JobResult(account, 1, time.perf_counter() - start, delays.seconds, e)
+
+    return await asyncio.gather(*(_run(site, account) for site, account in jobs))
@@ -0,0 +1,10 @@
+"""
+@file:   core/constants.py
+@module: core.constants
+@brief:  Defaults shared by main and the modules it only imports once there is something to claim.
+         Must not import anything, so main can use them on its fast path.
+@author: Yonatan-Schrift
+"""
+from typing import Final
+
+DEFAULT_MAX_CONTEXTS: Final[int] = 2    # browser contexts open at once in a batch
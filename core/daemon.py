@@ -0,0 +1,86 @@
+"""
+@file:   core/daemon.py
+@module: core.daemon
+@brief:  Keeps the claimer running and wakes it up when the claimed promotions rotate.
+@author: Yonatan-Schrift
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Final
+
+from core.accounts import Account
+from core.promotions import is_settled, next_change
+from logs.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_JITTER_MINUTES: Final[float] = 10   # wake up to this long after a rotation, never exactly on it
+DEFAULT_RETRY_MINUTES: Final[float] = 60    # when an account still has something to claim after a cycle
+_MAX_SLEEP: Final[timedelta] = timedelta(hours=1)  # re-check the clock at least this often (suspend, clock changes)
+
+
+def _minutes_env(name: str, default: float) -> timedelta:
+    try:
+        return timedelta(minutes=float(os.getenv(name) or default))
+    except ValueError:
+        return timedelta(minutes=default)
+
+
+def next_wakeup(accounts: list[Account], now: datetime = None) -> datetime:
+    """
+    Returns when the next cycle should run: the earliest end of the accounts' promotion windows,
+    or DAEMON_RETRY_MINUTES from now for accounts without one (their last cycle didn't claim everything).
+
+    Args:
+        accounts (list[Account]): Every account the daemon claims for.
+        now (datetime): The current time (timezone-aware), defaults to now.
+
+    Returns:
+        datetime: The wake-up time, without jitter.
+    """
+    now = now or datetime.now(timezone.utc)
+    retry_at = now + _minutes_env("DAEMON_RETRY_MINUTES", DEFAULT_RETRY_MINUTES)
+
+    wakeups = []
+    for account in accounts:
+        until = next_change(account.site, account.email)
+        wakeups.append(until if until is not None and until > now else retry_at)
+    return min(wakeups, default=retry_at)
+
+
+async def sleep_until(when: datetime) -> None:
+    """
+    Sleeps until `when`, in steps of at most an hour so a suspended machine or a clock change doesn't oversleep.
+    """
+    while (remaining := when - datetime.now(timezone.utc)) > timedelta(0):
+        await asyncio.sleep(min(remaining, _MAX_SLEEP).total_seconds())
+
+
+async def run_daemon(accounts: list[Account], run_cycle: Callable[[list[Account]], Awaitable[int]]) -> None:
+    """
+    Runs forever: claims for every account that may have something new, then sleeps until the next promotion
+    rotates (plus up to DAEMON_JITTER_MINUTES). `run_cycle` is expected to start and shut down its own browser,
+    so nothing but this loop stays in memory between cycles.
+
+    Args:
+        accounts (list[Account]): The accounts to claim for.
+        run_cycle: Runs the given accounts once and returns the combined exit code.
+    """
+    jitter = _minutes_env("DAEMON_JITTER_MINUTES", DEFAULT_JITTER_MINUTES)
+
+    while True:
+        due = [account for account in accounts if not is_settled(account.site, account.email)]
+        if due:
+            logger.info(f"Starting a cycle for {len(due)} of {len(accounts)} accounts")
+            try:
+                status = await run_cycle(due)
+                logger.info(f"Cycle finished with exit code {status}")
+            except Exception as e:
+                # a broken cycle must not stop the daemon, the accounts are retried later
+                logger.error(f"Cycle crashed: {e!r}")
+
+        wake = next_wakeup(accounts) + jitter * random.random()
+        logger.info(f"Sleeping until {wake.astimezone():%d-%m-%Y %H:%M:%S}")
+        await sleep_until(wake)
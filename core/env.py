@@ -0,0 +1,28 @@
+"""
+@file:   core/env.py
+@module: core.env
+@brief:  Reading settings from the environment (user.env).
+         Only depends on the standard library, so the logger and main can use it without importing Playwright.
+@author: Yonatan-Schrift
+"""
+import os
+from typing import Optional
+
+
+def env_to_bool(env_var_name: Optional[str], default: bool = False) -> bool:
+    """
+    Convert an environment variable string to a boolean.
+
+    Args:
+        env_var_name (Optional[str]): The name of the environment variable to convert.
+        default (bool): The default boolean value to return if the environment variable is not set.
+
+    Returns:
+        bool: The converted boolean value.
+    """
+    env_value = os.getenv(env_var_name)
+
+    if env_value is None:
+        return default
+
+    return env_value.lower() in ("1", "true", "yes", "on")
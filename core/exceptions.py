@@ -38,4 +38,26 @@ class EpicGamesGameNotFoundError(ProjectError):
 
 class AccountNotLinkedError(ProjectError):
     """Raised when an account is not linked. Specific to Prime-Gaming"""
-    pass
\ No newline at end of file
+    pass
+
+class ClaimUnconfirmedError(ProjectError):
+    """Raised when a failed claim may have gone through, but it can't be confirmed. Specific to Prime-Gaming"""
+    pass
+
+class AccountsFileError(ProjectError):
+    """Raised when the accounts file cannot be read or has an invalid entry."""
+    pass
+
+class HTTPStatusError(ProjectError):
+    """Raised when a server answers with an error status worth retrying (HTTP 429 or 5xx)."""
+
+    def __init__(self, status: int, url: str, retry_after: float = None, response=None):
+        super().__init__(f"HTTP {status} from {url}")
+        self.status = status
+        self.url = url
+        self.retry_after = retry_after
+        self.response = response
+
+class ProfileLockedError(ProjectError):
+    """Raised when another process keeps using a site account's browser profile."""
+    pass
@@ -0,0 +1,250 @@
+"""
+@file:   core/forensics.py
+@module: core.forensics
+@brief:  Opt-in (FORENSICS=true) capture of what the browser did during a phase that failed or was slow:
+         a Playwright trace of the phase (DOM snapshots, screenshots, network), a screenshot and the context's HAR.
+         Every phase is traced into a chunk that is thrown away unless the phase raised or exceeded its threshold,
+         and the kept captures are pruned to a disk budget.
+@author: Yonatan-Schrift
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Final
+from weakref import WeakKeyDictionary
+
+from playwright.async_api import BrowserContext, Page
+from playwright._impl._errors import Error as PlaywrightError
+
+from core.env import env_to_bool
+from logs.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_FORENSICS_DIR: Final[str] = os.path.join("data", "forensics")
+DEFAULT_SLOW_SECONDS: Final[float] = 60
+DEFAULT_MAX_MB: Final[float] = 200
+DEFAULT_KEEP_DAYS: Final[float] = 14
+
+TRACE_FILE: Final[str] = "trace.zip"        # open with `playwright show-trace`
+SCREENSHOT_FILE: Final[str] = "screenshot.png"
+HAR_FILE: Final[str] = "context.har"
+INFO_FILE: Final[str] = "info.json"
+
+
+@dataclass
+class _Recording:
+    """
+    The recording state of one context.
+    """
+    recorder: "ForensicRecorder"
+    name: str
+    har_path: str
+    captures: list[str] = field(default_factory=list)  # directories kept for this context
+    busy: bool = False  # a phase is being traced (chunks don't nest)
+
+
+_recordings: "WeakKeyDictionary[BrowserContext, _Recording]" = WeakKeyDictionary()
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+class ForensicRecorder:
+    """
+    Traces the contexts of a BrowserSession and keeps the traces of the phases that went wrong.
+
+    Attributes:
+        directory (str): Where the captures go, one directory per capture.
+        slow_seconds (float): A phase taking longer than this is captured even if it succeeded.
+        max_mb (float): Disk budget of all captures together, the oldest are removed first.
+        keep_days (float): Captures older than this are removed.
+    """
+
+    def __init__(self, directory: str = DEFAULT_FORENSICS_DIR, slow_seconds: float = DEFAULT_SLOW_SECONDS,
+                 max_mb: float = DEFAULT_MAX_MB, keep_days: float = DEFAULT_KEEP_DAYS):
+        self.directory = directory
+        self.slow_seconds = slow_seconds
+        self.max_mb = max_mb
+        self.keep_days = keep_days
+        self._har_dir: str | None = None
+
+    @classmethod
+    def from_env(cls) -> "ForensicRecorder | None":
+        """
+        Returns a recorder configured from user.env, or None unless FORENSICS=true.
+        """
+        if not env_to_bool("FORENSICS"):
+            return None
+        return cls(
+            directory=os.getenv("FORENSICS_DIR") or DEFAULT_FORENSICS_DIR,
+            slow_seconds=_float_env("FORENSICS_SLOW_SECONDS", DEFAULT_SLOW_SECONDS),
+            max_mb=_float_env("FORENSICS_MAX_MB", DEFAULT_MAX_MB),
+            keep_days=_float_env("FORENSICS_KEEP_DAYS", DEFAULT_KEEP_DAYS),
+        )
+
+    def context_options(self) -> dict:
+        """
+        The options a context needs to be recorded (a HAR without bodies, kept only if one of its phases is).
+        """
+        if self._har_dir is None:
+            self._har_dir = tempfile.mkdtemp(prefix="autoclaim-har-")
+        fd, har_path = tempfile.mkstemp(suffix=".har", dir=self._har_dir)
+        os.close(fd)
+        return {"record_har_path": har_path, "record_har_content": "omit"}
+
+    async def attach(self, context: BrowserContext, name: str, options: dict) -> None:
+        """
+        Starts tracing a context created with `context_options`.
+        """
+        try:
+            await context.tracing.start(screenshots=True, snapshots=True, title=name)
+        except PlaywrightError as e:
+            logger.warning(f"{name}: could not start tracing, no forensics for this context: {e}")
+            return
+        _recordings[context] = _Recording(self, name, options["record_har_path"])
+
+    async def detach(self, context: BrowserContext) -> None:
+        """
+        Stops tracing a context. Call before closing it, then `finish` once it is closed (the HAR is written then).
+        """
+        if context in _recordings:
+            try:
+                await context.tracing.stop()
+            except PlaywrightError:
+                pass
+
+    def finish(self, context: BrowserContext) -> None:
+        """
+        Keeps the HAR of a closed context if one of its phases was captured, and removes it otherwise.
+        """
+        recording = _recordings.pop(context, None)
+        if recording is None:
+            return
+        if recording.captures and os.path.exists(recording.har_path):
+            shutil.move(recording.har_path, os.path.join(recording.captures[-1], HAR_FILE))
+            self.prune()  # the HAR only arrives now, after the capture was pruned for
+        else:
+            try:
+                os.remove(recording.har_path)
+            except FileNotFoundError:
+                pass
+
+    async def _keep(self, page: Page, recording: _Recording, phase: str, label: str, duration: float,
+                    error: BaseException | None) -> None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{recording.name}-{phase}-{label}")[:80].strip("_")
+        target = os.path.join(self.directory, f"{stamp}-{slug}")
+        os.makedirs(target, exist_ok=True)
+
+        await page.context.tracing.stop_chunk(path=os.path.join(target, TRACE_FILE))
+        try:
+            await page.screenshot(path=os.path.join(target, SCREENSHOT_FILE), full_page=True, timeout=5000)
+        except PlaywrightError:
+            pass  # the page may be gone, the trace has the last frames anyway
+
+        with open(os.path.join(target, INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "site": recording.name, "phase": phase, "label": label, "url": page.url,
+                "duration": round(duration, 3), "slow_seconds": self.slow_seconds,
+                "error": f"{type(error).__name__}: {error}" if error else None,
+            }, f, indent=2)
+
+        recording.captures.append(target)
+        why = f"failed ({type(error).__name__})" if error else f"took {duration:.1f}s"
+        logger.warning(f"{recording.name}: {phase} {why}, forensics saved to {target}")
+        self.prune()
+
+    def prune(self) -> None:
+        """
+        Removes captures older than `keep_days`, then the oldest ones until all fit in `max_mb`.
+        """
+        try:
+            entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        except FileNotFoundError:
+            return
+        captures = sorted((path for path in entries if os.path.isdir(path)), key=os.path.getmtime)
+
+        cutoff = time.time() - self.keep_days * 24 * 60 * 60
+        sizes = {path: _size(path) for path in captures}
+        total = sum(sizes.values())
+        for path in captures[:-1]:  # never the capture just made
+            if os.path.getmtime(path) >= cutoff and total <= self.max_mb * 1_000_000:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+
+    def close(self) -> None:
+        if self._har_dir:
+            shutil.rmtree(self._har_dir, ignore_errors=True)
+            self._har_dir = None
+
+
+def _size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+@asynccontextmanager
+async def capture(page: Page, phase: str, label: str = "", slow_seconds: float = None) -> AsyncIterator[None]:
+    """
+    Traces the block as a phase of the page's context, keeping the trace (with a screenshot and later the context's
+    HAR) only if the block raises or takes longer than `slow_seconds`. A no-op unless the context is recorded.
+
+    Usage:
+        async with capture(page, "claim_game", game_name):
+            ...
+
+    Args:
+        page (Page): A page of the context to trace.
+        phase (str): Name of the phase.
+        label (str): What the phase worked on (e.g. the game), for the capture's name.
+        slow_seconds (float): Threshold for this phase, defaults to the recorder's (FORENSICS_SLOW_SECONDS).
+    """
+    recording = _recordings.get(page.context)
+    if recording is None or recording.busy:
+        yield
+        return
+
+    recorder = recording.recorder
+    threshold = recorder.slow_seconds if slow_seconds is None else slow_seconds
+    try:
+        await page.context.tracing.start_chunk(title=f"{phase} {label}".strip())
+    except PlaywrightError:
+        yield
+        return
+
+    recording.busy = True
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        recording.busy = False
+        duration = time.perf_counter() - start
+        try:
+            if error is not None or duration > threshold:
+                await recorder._keep(page, recording, phase, label, duration, error)
+            else:
+                await page.context.tracing.stop_chunk()  # nothing went wrong, drop it
+        except (PlaywrightError, OSError) as e:
+            logger.warning(f"{recording.name}: could not save the forensics of {phase}: {e}")
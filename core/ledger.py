@@ -0,0 +1,113 @@
+"""
+@file:   core/ledger.py
+@module: core.ledger
+@brief:  A local SQLite ledger of the offers each account already claimed, so they can be skipped without page visits.
+@author: Yonatan-Schrift
+"""
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Final
+
+from core.offers import Offer
+
+DEFAULT_LEDGER_PATH: Final[str] = os.path.join("data", "claims.db")
+
+# Claim statuses
+CLAIMED: Final[str] = "claimed"      # claimed by this script
+OWNED: Final[str] = "owned"          # was already in the library
+MANUAL: Final[str] = "manual"        # needs a manual step (e.g. a code was sent to the user)
+UNAVAILABLE: Final[str] = "unavailable"  # can't be claimed by this account (e.g. a DLC without its base game)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    site        TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    offer_id    TEXT NOT NULL,
+    title       TEXT,
+    url         TEXT,
+    status      TEXT NOT NULL,
+    claimed_at  TEXT NOT NULL,
+    promo_start TEXT,
+    promo_end   TEXT,
+    PRIMARY KEY (site, account, offer_id)
+)
+"""
+
+
+class ClaimLedger:
+    """
+    Claim status per (site, account, offer id), with the time of the claim and the promotion window.
+
+    Every status means "nothing left to do for this offer", so a recorded offer is skipped on later runs.
+    Safe to share between processes (SQLite locking, WAL journal).
+
+    Usage:
+        with ClaimLedger() as ledger:
+            done = ledger.claimed_ids("epic_games", email)
+            ...
+            ledger.record("epic_games", email, offer, CLAIMED)
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("LEDGER_PATH") or DEFAULT_LEDGER_PATH
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self) -> "ClaimLedger":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def claimed_ids(self, site: str, account: str) -> set[str]:
+        """
+        Returns the ids of every offer recorded for the account on the site.
+        """
+        rows = self._conn.execute(
+            "SELECT offer_id FROM claims WHERE site = ? AND account = ?",
+            (site, _account_key(account)),
+        )
+        return {offer_id for (offer_id,) in rows}
+
+    def is_claimed(self, site: str, account: str, offer_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM claims WHERE site = ? AND account = ? AND offer_id = ?",
+            (site, _account_key(account), offer_id),
+        ).fetchone()
+        return row is not None
+
+    def record(self, site: str, account: str, offer: Offer, status: str) -> None:
+        """
+        Records (or updates) the status of an offer for the account.
+
+        Args:
+            site (str): The site's NAME.
+            account (str): The account (email).
+            offer (Offer): The offer.
+            status (str): One of CLAIMED, OWNED, MANUAL or UNAVAILABLE.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO claims "
+            "(site, account, offer_id, title, url, status, claimed_at, promo_start, promo_end) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                site, _account_key(account), offer.offer_id, offer.title, offer.url, status,
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                offer.start.isoformat() if offer.start else None,
+                offer.end.isoformat() if offer.end else None,
+            ),
+        )
+        self._conn.commit()
+
+
+def _account_key(account: str) -> str:
+    return (account or "").strip().lower()
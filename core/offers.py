@@ -0,0 +1,41 @@
+"""
+@file:   core/offers.py
+@module: core.offers
+@brief:  The site-agnostic description of a free-game offer, as produced by the sites' discovery.
+@author: Yonatan-Schrift
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(frozen=True)
+class Offer:
+    """
+    A single free offer on a store.
+
+    Attributes:
+        title (str): The game's name.
+        url (str): Absolute URL of the offer's page.
+        offer_id (str): The store's identifier of the offer (falls back to the URL path when the store has none).
+        slug (str): The store's page slug, if known.
+        start (datetime | None): When the promotion started (timezone-aware), if known.
+        end (datetime | None): When the promotion ends (timezone-aware), if known.
+    """
+    title: str
+    url: str
+    offer_id: str
+    slug: str = ""
+    start: datetime | None = None
+    end: datetime | None = None
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    """
+    Parses an ISO-8601 timestamp such as "2024-05-16T15:00:00.000Z", returning None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
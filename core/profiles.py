@@ -0,0 +1,184 @@
+"""
+@file:   core/profiles.py
+@module: core.profiles
+@brief:  Where each (site, account) keeps its browser data, and the locks that keep two processes
+         from using the same one at once (the OS releases a crashed run's lock).
+@author: Yonatan-Schrift
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import socket
+import time
+from typing import Final
+
+try:
+    import fcntl  # POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt  # Windows
+
+from core.exceptions import ProfileLockedError
+
+USER_DATA_DIR: Final[str] = "pw_user_data"
+DEFAULT_LOCK_TIMEOUT: Final[float] = 30        # seconds to wait for another process to release a profile
+_POLL_INTERVAL: Final[float] = 0.5
+_WINDOWS_LOCK_OFFSET: Final[int] = 1 << 30
+
+# Firefox's own profile locks, left behind when a browser was killed
+_FIREFOX_LOCKS: Final[tuple[str, ...]] = ("lock", ".parentlock", "parent.lock")
+
+
+def safe_name(text: str) -> str:
+    """
+    Turns free text (e.g. an email) into a string that is safe to use as a file name, and unique to it:
+    the readable part alone could collide (a_b@c.com and a@b_c.com), so a short hash of the text is appended.
+    """
+    text = text.lower()  # emails are case-insensitive
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:10]
+    return f"{re.sub(r'[^A-Za-z0-9._-]', '_', text)}-{digest}"
+
+
+def profile_base(site: str, account: str = None) -> str:
+    """
+    Returns the path (without extension) of a (site, account)'s browser data, creating its site directory.
+    The storage state is `<base>.json`, the persistent profile `<base>/` and the lock `<base>.lock`.
+    """
+    site_dir = os.path.join(USER_DATA_DIR, site)
+    os.makedirs(site_dir, exist_ok=True)
+    return os.path.join(site_dir, safe_name(account or "default"))
+
+
+def _lock_fd(fd: int) -> bool:
+    """
+    Takes the OS lock of an open lock file without waiting. Returns False if another process holds it.
+    """
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            # a byte far past the owner record, so the record stays readable for other processes
+            os.lseek(fd, _WINDOWS_LOCK_OFFSET, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:  # BlockingIOError / PermissionError: held by someone else
+        return False
+    return True
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, _WINDOWS_LOCK_OFFSET, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class ProfileLock:
+    """
+    An exclusive, cross-process lock on a (site, account)'s browser data: an OS lock (flock, or msvcrt.locking
+    on Windows) on a lock file holding the owner's pid, host and start time.
+
+    The OS releases the lock when its process dies, so a crashed run's lock is free right away and taking it
+    over is atomic. The owner record is only informational; it is cleared on release, so one still present
+    when the lock is taken means the previous owner crashed (and its Firefox profile locks are removed).
+    """
+
+    def __init__(self, base: str):
+        self.base = base
+        self.path = f"{base}.lock"
+        self.held = False
+        self._fd: int | None = None
+
+    def _owner(self) -> dict | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return {}  # free (empty), being written right now, or garbage
+
+    def try_acquire(self) -> bool:
+        """
+        Takes the lock if it is free, without waiting.
+
+        Returns:
+            bool: True if the lock is now held.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not _lock_fd(fd):
+                os.close(fd)
+                return False
+            os.lseek(fd, 0, os.SEEK_SET)
+            if os.read(fd, 1):
+                self._clear_firefox_locks()  # the previous owner crashed
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "since": time.time()})
+                     .encode("utf-8"))
+        except BaseException:
+            os.close(fd)  # also drops the OS lock
+            raise
+        self._fd = fd
+        self.held = True
+        return True
+
+    def _clear_firefox_locks(self) -> None:
+        """
+        Removes the Firefox locks a crashed owner left in the profile.
+        """
+        for name in _FIREFOX_LOCKS:
+            try:
+                os.remove(os.path.join(self.base, name))
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+    async def acquire(self, timeout: float = None) -> None:
+        """
+        Waits for the lock.
+
+        Args:
+            timeout (float): Maximum seconds to wait, defaults to PROFILE_LOCK_TIMEOUT or 30.
+
+        Raises:
+            ProfileLockedError: If another process still holds the lock after `timeout`.
+        """
+        if timeout is None:
+            timeout = float(os.getenv("PROFILE_LOCK_TIMEOUT") or DEFAULT_LOCK_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                owner = self._owner() or {}
+                raise ProfileLockedError(
+                    f"{self.base} is in use by process {owner.get('pid', '?')} on {owner.get('host', '?')}")
+            await asyncio.sleep(_POLL_INTERVAL)
+
+    def release(self) -> None:
+        if not self.held:
+            return
+        self.held = False
+        fd, self._fd = self._fd, None
+        try:
+            os.ftruncate(fd, 0)  # a clean release leaves no owner behind
+            _unlock_fd(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)  # never unlink: another process may already wait on this file's lock
+
+
+def dir_size_mb(path: str) -> float:
+    """
+    Returns the size of a directory tree in MB (0 if it doesn't exist).
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total / 1_000_000
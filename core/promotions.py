@@ -0,0 +1,102 @@
+"""
+@file:   core/promotions.py
+@module: core.promotions
+@brief:  Persisted "promotion window" per site and account: until when nothing new can be claimed.
+         Only depends on the standard library, so main can check it before importing Playwright or the sites.
+@author: Yonatan-Schrift
+"""
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Final
+
+from core.offers import Offer
+
+DEFAULT_STATE_PATH: Final[str] = os.path.join("data", "promotions.json")
+DEFAULT_RECHECK_HOURS: Final[float] = 12    # when a site doesn't publish end dates
+MAX_WINDOW: Final[timedelta] = timedelta(days=7)
+
+
+def _state_path() -> str:
+    return os.getenv("PROMOTIONS_STATE") or DEFAULT_STATE_PATH
+
+
+def _account_key(account: str) -> str:
+    return (account or "").strip().lower()
+
+
+def load_state(path: str = None) -> dict:
+    """
+    Returns the saved windows as {site: {account: {"offers": [...], "until": iso, "checked_at": iso}}},
+    or an empty dict if there is no (valid) state file.
+    """
+    try:
+        with open(path or _state_path(), encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def next_change(site: str, account: str, path: str = None) -> datetime | None:
+    """
+    Returns until when the account is known to have claimed everything on the site, or None if unknown.
+    """
+    window = load_state(path).get(site, {}).get(_account_key(account))
+    if not window:
+        return None
+    try:
+        return datetime.fromisoformat(window["until"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_settled(site: str, account: str, now: datetime = None, path: str = None) -> bool:
+    """
+    Whether the account already claimed every offer of the site's current promotion (so a run can't do anything).
+    """
+    until = next_change(site, account, path)
+    return until is not None and (now or datetime.now(timezone.utc)) < until
+
+
+def record_window(site: str, account: str, offers: list[Offer], path: str = None) -> datetime:
+    """
+    Saves that every offer in `offers` is done for the account, until the first of them ends
+    (or for RECHECK_HOURS if the site doesn't publish end dates).
+
+    Args:
+        site (str): The site's NAME.
+        account (str): The account (email).
+        offers (list[Offer]): The site's current offers, all claimed/owned.
+        path (str): The state file (defaults to PROMOTIONS_STATE or data/promotions.json).
+
+    Returns:
+        datetime: The end of the saved window.
+    """
+    now = datetime.now(timezone.utc)
+    ends = [offer.end for offer in offers if offer.end]
+    recheck = timedelta(hours=float(os.getenv("RECHECK_HOURS") or DEFAULT_RECHECK_HOURS))
+    until = min(min(ends) if ends else now + recheck, now + MAX_WINDOW)
+
+    path = path or _state_path()
+    state = load_state(path)
+    state.setdefault(site, {})[_account_key(account)] = {
+        "offers": sorted(offer.offer_id for offer in offers),
+        "until": until.isoformat(timespec="seconds"),
+        "checked_at": now.isoformat(timespec="seconds"),
+    }
+    _write_state(path, state)
+
+    return until
+
+
+def _write_state(path: str, state: dict) -> None:
+    # write to a temporary file first, so a concurrent reader never sees a half-written state
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".promotions-", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
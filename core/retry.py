@@ -0,0 +1,240 @@
+"""
+@file:   core/retry.py
+@module: core.retry
+@brief:  One retry policy for navigations, claims and notifications: errors are classified (DNS, network, timeout,
+         rate limit, server error, detached frame), each class has its own attempts and backoff,
+         and all attempts together stay within a time budget.
+         Only depends on the standard library (errors of Playwright and requests are recognized by name and message).
+@author: Yonatan-Schrift
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Final, TypeVar
+
+from core.exceptions import HTTPStatusError
+
+T = TypeVar("T")
+
+# Error classes
+DNS: Final[str] = "dns"
+NETWORK: Final[str] = "network"
+TIMEOUT: Final[str] = "timeout"
+RATE_LIMITED: Final[str] = "rate_limited"
+SERVER_ERROR: Final[str] = "server_error"
+DETACHED: Final[str] = "detached"
+
+_DNS_MARKERS: Final[tuple[str, ...]] = (
+    "NS_ERROR_UNKNOWN_HOST", "ERR_NAME_NOT_RESOLVED", "NameResolutionError",
+    "Name or service not known", "Temporary failure in name resolution", "getaddrinfo failed",
+)
+_NETWORK_MARKERS: Final[tuple[str, ...]] = (
+    "NS_ERROR_NET_RESET", "NS_ERROR_NET_INTERRUPT", "NS_ERROR_CONNECTION_REFUSED", "NS_ERROR_NET_TIMEOUT",
+    "NS_ERROR_PROXY_CONNECTION_REFUSED", "ERR_CONNECTION", "ERR_NETWORK_CHANGED", "ERR_INTERNET_DISCONNECTED",
+    "Connection aborted", "Connection reset", "RemoteDisconnected",
+)
+_DETACHED_MARKERS: Final[tuple[str, ...]] = (
+    "Frame was detached", "frame got detached", "Execution context was destroyed", "Element is not attached",
+)
+
+
+def classify(error: BaseException) -> str | None:
+    """
+    Returns the class of a (possibly) transient error, or None if retrying it can't help
+    (wrong credentials, a missing element, a 404...).
+    """
+    if isinstance(error, HTTPStatusError):
+        if error.status == 429:
+            return RATE_LIMITED
+        return SERVER_ERROR if error.status >= 500 else None
+
+    message = str(error)
+    if any(marker in message for marker in _DNS_MARKERS):
+        return DNS
+    if any(marker in message for marker in _DETACHED_MARKERS):
+        return DETACHED
+
+    # Playwright's and asyncio's TimeoutError, requests' Timeout, ReadTimeout, ConnectTimeout
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if isinstance(error, TimeoutError) or names & {"TimeoutError", "Timeout"}:
+        return TIMEOUT
+    if any(marker in message for marker in _NETWORK_MARKERS) or names & {"ConnectionError", "ChunkedEncodingError"}:
+        return NETWORK
+    return None
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    How often, and how patiently, an error class is retried.
+
+    Attributes:
+        attempts (int): Retries allowed for this class (on top of the first try).
+        base_delay (float): Seconds before the first retry, doubled for every further one.
+    """
+    attempts: int
+    base_delay: float
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Which errors are retried and for how long.
+
+    Attributes:
+        rules (dict[str, Rule]): Error class -> its rule. Classes without a rule are raised right away.
+        budget (float): Maximum seconds from the first try to the start of the last retry.
+        max_delay (float): Upper bound of a single backoff (a rate limit's Retry-After still wins, within the budget).
+        jitter (float): Random extra delay, as a fraction of the delay (so retries of concurrent jobs spread out).
+    """
+    rules: dict[str, Rule] = field(default_factory=dict)
+    budget: float = 60
+    max_delay: float = 30
+    jitter: float = 0.25
+
+    def start(self, deadline: float = None) -> "Attempts":
+        return Attempts(self, deadline)
+
+
+class Attempts:
+    """
+    The retry state of one operation: how many retries each error class used, and when the budget runs out.
+    """
+
+    def __init__(self, policy: RetryPolicy, deadline: float = None):
+        self.policy = policy
+        self.deadline = time.monotonic() + policy.budget
+        if deadline is not None:
+            self.deadline = min(self.deadline, deadline)
+        self.used: dict[str, int] = {}
+
+    def delay_for(self, error: BaseException) -> float | None:
+        """
+        Returns how long to wait before retrying after `error`, or None if it shouldn't be retried
+        (not transient, out of attempts for its class, or the wait would overrun the budget).
+        """
+        kind = classify(error)
+        rule = self.policy.rules.get(kind)
+        if rule is None:
+            return None
+
+        used = self.used.get(kind, 0)
+        if used >= rule.attempts:
+            return None
+
+        delay = min(rule.base_delay * 2 ** used, self.policy.max_delay)
+        if kind == RATE_LIMITED and getattr(error, "retry_after", None):
+            delay = max(delay, error.retry_after)
+        delay += random.uniform(0, delay * self.policy.jitter)
+        if time.monotonic() + delay > self.deadline:
+            return None
+
+        self.used[kind] = used + 1
+        return delay
+
+    def describe(self, error: BaseException) -> str:
+        kind = classify(error)
+        rule = self.policy.rules[kind]
+        return f"{kind}, {self.used[kind]}/{rule.attempts}"
+
+
+async def retry_async(func: Callable[[], Awaitable[T]], policy: RetryPolicy, what: str, logger: logging.Logger,
+                      before_retry: Callable[[], Awaitable[None]] = None) -> T:
+    """
+    Awaits `func()`, retrying it by `policy`. The last error is raised once the policy gives up.
+
+    Args:
+        func (Callable[[], Awaitable]): The operation (called again for every attempt).
+        policy (RetryPolicy): Which errors to retry and for how long.
+        what (str): The operation, for the logs (e.g. "opening https://...").
+        logger (logging.Logger): Where to log the retries.
+        before_retry (Callable[[], Awaitable[None]]): Brings the page back to where `func` starts (optional).
+
+    Returns:
+        Whatever `func` returns.
+    """
+    attempts = policy.start()
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            delay = attempts.delay_for(e)
+            if delay is None:
+                raise
+            logger.warning(f"{what} failed ({attempts.describe(e)}): {_first_line(e)} - retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            if before_retry:
+                await before_retry()
+
+
+def retry_sync(func: Callable[[], T], policy: RetryPolicy, what: str, logger: logging.Logger,
+               deadline: float = None) -> T:
+    """
+    Calls `func()`, retrying it by `policy` (blocking version of `retry_async`, for worker threads).
+
+    Args:
+        func (Callable[[], T]): The operation.
+        policy (RetryPolicy): Which errors to retry and for how long.
+        what (str): The operation, for the logs.
+        logger (logging.Logger): Where to log the retries.
+        deadline (float): `time.monotonic()` value no retry may start after, on top of the policy's budget.
+
+    Returns:
+        Whatever `func` returns.
+    """
+    attempts = policy.start(deadline)
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            delay = attempts.delay_for(e)
+            if delay is None:
+                raise
+            logger.warning(f"{what} failed ({attempts.describe(e)}): {_first_line(e)} - retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _first_line(error: BaseException) -> str:
+    # Playwright errors carry a multi-line call log
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else type(error).__name__
+
+
+# A page that didn't open: worth a few quick tries before the whole site fails
+NAVIGATION: Final[RetryPolicy] = RetryPolicy(
+    rules={
+        DNS: Rule(attempts=3, base_delay=5),
+        NETWORK: Rule(attempts=3, base_delay=2),
+        TIMEOUT: Rule(attempts=2, base_delay=2),
+        RATE_LIMITED: Rule(attempts=3, base_delay=10),
+        SERVER_ERROR: Rule(attempts=3, base_delay=5),
+        DETACHED: Rule(attempts=2, base_delay=1),
+    },
+    budget=120,
+)
+
+# A claim that broke halfway: starts over from the offer's page (claiming is idempotent, an owned game is skipped)
+CLAIM: Final[RetryPolicy] = RetryPolicy(
+    rules={
+        DNS: Rule(attempts=2, base_delay=5),
+        NETWORK: Rule(attempts=2, base_delay=5),
+        TIMEOUT: Rule(attempts=2, base_delay=5),
+        SERVER_ERROR: Rule(attempts=2, base_delay=10),
+        DETACHED: Rule(attempts=2, base_delay=2),
+    },
+    budget=180,
+)
+
+# A notification; the caller's deadline (the end of the run) usually ends it first
+NOTIFICATION: Final[RetryPolicy] = RetryPolicy(
+    rules={
+        DNS: Rule(attempts=2, base_delay=1),
+        NETWORK: Rule(attempts=4, base_delay=1),
+        TIMEOUT: Rule(attempts=2, base_delay=1),
+        RATE_LIMITED: Rule(attempts=4, base_delay=1),
+        SERVER_ERROR: Rule(attempts=4, base_delay=1),
+    },
+    budget=60,
+)
@@ -4,85 +4,477 @@
 @brief:  Includes functions for setting up the browser agent.
 @author: Yonatan-Schrift
 """
+import asyncio
+import json
 import os
+import re
+import tempfile
 import time
+from collections import Counter
+from dataclasses import dataclass
 
-from playwright.sync_api import sync_playwright
+try:
+    import resource  # POSIX only, used for peak memory reporting
+except ImportError:
+    resource = None
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright, Response, Route
+from playwright.async_api import TimeoutError as PWTimeoutError
 from playwright._impl._errors import Error as PlaywrightError
+from core import retry
 from core.anti_bot import random_sleep
+from core.exceptions import HTTPStatusError
+from core.forensics import ForensicRecorder
+from core.profiles import ProfileLock, dir_size_mb, profile_base
+from core.retry import RetryPolicy
+from core.tracing import record as record_span, span
+from core.env import env_to_bool
 from logs.logger import get_logger
 
 # Setup logger
 logger = get_logger(__name__)
 
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) "
+    "Gecko/20100101 Firefox/128.0"
+)
+
+# Rough transfer size of a blocked request per resource type, used to estimate the bandwidth saved
+_TYPICAL_BYTES = {"image": 60_000, "media": 500_000, "font": 40_000, "stylesheet": 30_000, "script": 50_000}
+_DEFAULT_TYPICAL_BYTES = 5_000
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    """
+    Which requests a site's context lets through.
+
+    A request is blocked if its resource type is in `block_types` or its URL matches one of `block_urls`,
+    unless its URL matches one of `allow_urls` (e.g. sign-in, captcha and checkout flows).
+    URL patterns are regular expressions searched in the full URL.
+
+    Attributes:
+        block_types (frozenset[str]): Playwright resource types to block ("image", "media", "font", ...).
+        block_urls (tuple[str, ...]): URL patterns to block (analytics, ads, ...).
+        allow_urls (tuple[str, ...]): URL patterns that are never blocked.
+    """
+    block_types: frozenset[str] = frozenset()
+    block_urls: tuple[str, ...] = ()
+    allow_urls: tuple[str, ...] = ()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if any(re.search(pattern, url) for pattern in self.allow_urls):
+            return False
+        return resource_type in self.block_types or any(re.search(pattern, url) for pattern in self.block_urls)
+
+
+@dataclass(frozen=True)
+class Readiness:
+    """
+    What a page needs before the flow can go on, declared by each navigation instead of a blanket
+    "load"/"networkidle" (storefronts with analytics and video take long to get there, if ever).
+    The wait ends as soon as the load state is reached and the selector (if any) is there.
+
+    Attributes:
+        name (str): Name of the page, for the timing logs and spans (e.g. "storefront").
+        wait_until (str): Playwright load state to reach first ("commit", "domcontentloaded", "load" or "networkidle").
+        selector (str | None): Element that must be on the page once the load state is reached.
+        state (str): What the selector's element must be ("attached" or "visible").
+        timeout_ms (int): Maximum time for the navigation and the selector together (milliseconds).
+        optional (bool): If True, a selector that doesn't show up in time only ends the wait instead of raising.
+    """
+    name: str
+    wait_until: str = "domcontentloaded"
+    selector: str | None = None
+    state: str = "attached"
+    timeout_ms: int = 30_000
+    optional: bool = False
+
+
+LOADED = Readiness("page", wait_until="load")  # the old behaviour, for navigations that declare nothing
+
+
+class RequestStats:
+    """
+    Requests blocked in a context, per resource type.
+    """
+
+    def __init__(self):
+        self.blocked = Counter()
+
+    def add(self, resource_type: str) -> None:
+        self.blocked[resource_type] += 1
+
+    @property
+    def estimated_bytes(self) -> int:
+        return sum(_TYPICAL_BYTES.get(kind, _DEFAULT_TYPICAL_BYTES) * n for kind, n in self.blocked.items())
+
+    def summary(self) -> str:
+        by_type = ", ".join(f"{kind}: {n}" for kind, n in self.blocked.most_common())
+        return (f"blocked {sum(self.blocked.values())} requests ({by_type or 'none'}), "
+                f"~{self.estimated_bytes / 1_000_000:.1f} MB saved")
 
-def setup_and_open(url: str = None, is_epic: bool = False, headless: bool = False):
+
+@dataclass
+class _OpenContext:
+    """
+    What the session knows about a context it opened.
+    """
+    name: str
+    lock: ProfileLock
+    state_path: str | None    # storage state snapshot (None for a persistent profile)
+    restored: bool            # started from a snapshot / an existing profile
+    opened: float             # perf_counter() when the context was requested
+    signed_in: bool = False
+
+
+class BrowserSession:
+    """
+    Owns the Playwright driver and a single Firefox instance for the whole process.
+
+    Every site gets its own isolated browser context from the shared browser, so a run
+    only pays for one cold launch no matter how many sites it claims from.
+    Login sessions survive between runs through a snapshot of each context's storage state (cookies + localStorage),
+    per site and account under `USER_DATA_DIR`. A snapshot is only written once the site reported a verified
+    sign-in (`signed_in`), so a failed or logged-out run never replaces a good one.
+
+    With `persistent` (PERSISTENT_PROFILES=true), every (site, account) instead gets a full Firefox profile
+    of its own under `USER_DATA_DIR` (cache, IndexedDB, service workers...), launched as a separate browser.
+    Either way a (site, account) is locked while open, so concurrent runs can't share (and corrupt) its data.
+
+    With FORENSICS=true every context is traced, and the phases the sites wrap in `core.forensics.capture`
+    are saved (trace, screenshot, HAR) when they fail or are slow.
+
+    Usage:
+        async with BrowserSession(headless) as session:
+            page = await session.open("epic_games", url, account=email)
+            await session.signed_in(page, via_sign_in=...)
+            ...
+            await session.close_context(page.context)
     """
-    Sets up the browser and opens the given URL.
-    Includes retry logic for DNS/network failures.
+
+    def __init__(self, headless: bool = False, persistent: bool = None):
+        self.headless = headless
+        self.persistent = env_to_bool("PERSISTENT_PROFILES") if persistent is None else persistent
+        self.recorder = ForensicRecorder.from_env()
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._contexts: dict[BrowserContext, _OpenContext] = {}
+        self._request_stats: dict[BrowserContext, tuple[str, RequestStats]] = {}  # context -> (name, stats)
+        self._start_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "BrowserSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Starts the Playwright driver and launches the shared browser (persistent profiles launch their own).
+        Called lazily by `open`, so a run that opens no site never launches a browser.
+        """
+        async with self._start_lock:  # sites open their contexts concurrently
+            if self._browser or (self.persistent and self._playwright):
+                return
+
+            start = time.perf_counter()
+            with span("browser_launch"):
+                self._playwright = await async_playwright().start()
+                if self.persistent:
+                    return
+                try:
+                    self._browser = await self._playwright.firefox.launch(headless=self.headless)
+                except Exception:
+                    await self._playwright.stop()
+                    self._playwright = None
+                    raise
+
+            logger.info(f"Browser started in {time.perf_counter() - start:.2f}s")
+
+    @span("open_context")
+    async def open(self, name: str, url: str = None, account: str = None, policy: ResourcePolicy = None,
+                   ready: Readiness = LOADED) -> Page:
+        """
+        Creates an isolated context for `name` and opens the given URL in it.
+        Navigation failures are retried (see `goto_with_retry`).
+
+        Args:
+            name (str): Name of the context owner (e.g. the site), used for its storage state file.
+            url (str): The URL to open.
+            account (str): The account the context is for (usually the email), so every account keeps its own login.
+            policy (ResourcePolicy): Requests to block in this context (disabled with BLOCK_RESOURCES=false).
+            ready (Readiness): What the page at `url` has to show before it is returned.
+
+        Returns:
+            Page: The page of the new context.
+        """
+        opened = time.perf_counter()
+        await self.start()
+
+        base = profile_base(name, account)
+        lock = ProfileLock(base)
+        await lock.acquire()
+        try:
+            context, state_path, restored = await self._new_context(name, base)
+        except BaseException:
+            lock.release()
+            raise
+        self._contexts[context] = _OpenContext(name, lock, state_path, restored, opened)
+
+        try:
+            # hide navigator.webdriver
+            await context.add_init_script("""
+                Object.defineProperty(navigator, 'webdriver', {
+                    get: () => undefined
+                })
+            """)
+            if policy and env_to_bool("BLOCK_RESOURCES", True):
+                await self._install_policy(name, context, policy)
+
+            page = await context.new_page()
+
+            await random_sleep()
+
+            if url:
+                await goto_with_retry(page, url, ready)
+
+            return page
+        except Exception:
+            await self.close_context(context)
+            raise
+
+    async def _new_context(self, name: str, base: str) -> tuple[BrowserContext, str | None, bool]:
+        """
+        Creates the context of a (site, account) whose data lives at `base` (see `core.profiles.profile_base`).
+
+        Returns:
+            tuple[BrowserContext, str | None, bool]: The context, its storage state path (None for a persistent
+            profile) and whether it starts from saved data.
+        """
+        options = {"user_agent": USER_AGENT, "viewport": {"width": 1920, "height": 1080}}
+        if self.recorder:
+            options.update(self.recorder.context_options())
+
+        if not self.persistent:
+            state_path = f"{base}.json"
+            restored = os.path.exists(state_path)
+            context = await self._browser.new_context(**options, storage_state=state_path if restored else None)
+            if self.recorder:
+                await self.recorder.attach(context, name, options)
+            return context, state_path, restored
+
+        # one browser per profile: its launch time is what a smaller, site specific profile should save
+        restored = os.path.isdir(base)
+        os.makedirs(base, exist_ok=True)
+        start = time.perf_counter()
+        with span("profile_launch"):
+            context = await self._playwright.firefox.launch_persistent_context(
+                base, headless=self.headless, **options)
+        logger.info(f"{name}: profile {os.path.basename(base)} ({dir_size_mb(base):.0f} MB) "
+                    f"launched in {time.perf_counter() - start:.2f}s")
+        if self.recorder:
+            await self.recorder.attach(context, name, options)
+        return context, None, restored
+
+    async def _install_policy(self, name: str, context: BrowserContext, policy: ResourcePolicy) -> None:
+        """
+        Routes every request of the context through `policy`, counting the blocked ones.
+        """
+        stats = RequestStats()
+        self._request_stats[context] = (name, stats)
+
+        async def _handle(route: Route) -> None:
+            request = route.request
+            if policy.should_block(request.resource_type, request.url):
+                stats.add(request.resource_type)
+                await route.abort("blockedbyclient")
+            else:
+                await route.fallback()
+
+        await context.route("**/*", _handle)
+
+    async def signed_in(self, page: Page, via_sign_in: bool) -> None:
+        """
+        Tells the session the site verified its sign-in: snapshots the storage state right away, and records
+        how the context got there and how long it took from `open` (as the span "signed_in_<path>"):
+        "snapshot"/"profile" (the saved session was still valid), "expired" (it wasn't, so the site signed in)
+        or "fresh" (there was nothing saved).
+
+        Args:
+            page (Page): A page of a context created by `open`.
+            via_sign_in (bool): Whether the site had to go through its sign-in flow.
+        """
+        entry = self._contexts.get(page.context)
+        if entry is None or entry.signed_in:
+            return
+        entry.signed_in = True
+
+        if not via_sign_in:
+            path = "snapshot" if entry.state_path else "profile"
+        else:
+            path = "expired" if entry.restored else "fresh"
+        latency = time.perf_counter() - entry.opened
+        record_span(f"signed_in_{path}", latency)
+        logger.info(f"{entry.name}: signed in ({path}) {latency:.2f}s after opening the context")
+
+        if entry.state_path:
+            await self._save_state(page.context, entry.state_path)
+
+    @staticmethod
+    async def _save_state(context: BrowserContext, state_path: str) -> None:
+        """
+        Writes the storage state of a context atomically, readable by the owner only (it holds session cookies).
+        """
+        try:
+            state = await context.storage_state()
+        except PlaywrightError as e:
+            logger.warning(f"Could not save the session to {state_path}: {e}")
+            return
+
+        fd, tmp = tempfile.mkstemp(prefix=".state-", dir=os.path.dirname(state_path) or ".")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, state_path)  # mkstemp files are 0600
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @span("close_context")
+    async def close_context(self, context: BrowserContext) -> None:
+        """
+        Closes a context and unlocks its profile. The snapshot of a signed in context is refreshed first
+        (cookies rotate during a run); one that never signed in leaves the previous snapshot alone.
+
+        Args:
+            context (BrowserContext): A context created by `open`.
+        """
+        entry = self._contexts.pop(context, None)
+        if context in self._request_stats:
+            name, stats = self._request_stats.pop(context)
+            logger.info(f"{name}: {stats.summary()}")
+        try:
+            if entry and entry.signed_in and entry.state_path:
+                await self._save_state(context, entry.state_path)
+            if self.recorder:
+                await self.recorder.detach(context)
+        finally:
+            try:
+                await context.close()
+            finally:
+                if entry:
+                    entry.lock.release()
+                if self.recorder:
+                    self.recorder.finish(context)
+
+    @span("browser_close")
+    async def close(self) -> None:
+        """
+        Closes every remaining context, the browser and the driver. Safe to call more than once.
+        """
+        for context in list(self._contexts):
+            try:
+                await self.close_context(context)
+            except PlaywrightError as e:
+                logger.warning(f"Failed to close a browser context: {e}")
+
+        try:
+            if self._browser:
+                await self._browser.close()
+        finally:
+            self._browser = None
+            if self.recorder:
+                self.recorder.close()
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+
+        if resource:
+            # ru_maxrss is in KiB on Linux; the children figure is the largest exited child (the driver/browser)
+            self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+            logger.debug(f"Peak RSS: {self_rss:.0f} MiB (python), {child_rss:.0f} MiB (largest child)")
+
+
+async def wait_until_ready(page: Page, ready: Readiness, timeout_ms: float = None) -> None:
+    """
+    Waits until the page is ready by `ready`'s definition, e.g. after a click that navigates.
+
+    Args:
+        page (Page): The page to wait on.
+        ready (Readiness): The condition.
+        timeout_ms (float): Time left for the wait, defaults to `ready.timeout_ms`.
+
+    Raises:
+        PWTimeoutError: If the condition isn't met in time (a missing optional selector doesn't raise).
+    """
+    deadline = time.monotonic() + (ready.timeout_ms if timeout_ms is None else timeout_ms) / 1000
+
+    if ready.wait_until != "commit":  # not a state wait_for_load_state knows, and always reached
+        await page.wait_for_load_state(ready.wait_until, timeout=max(1.0, (deadline - time.monotonic()) * 1000))
+    if ready.selector:
+        try:
+            await page.locator(ready.selector).first.wait_for(
+                state=ready.state, timeout=max(1.0, (deadline - time.monotonic()) * 1000))
+        except PWTimeoutError:
+            if not ready.optional:
+                raise
+            logger.debug(f"{ready.name}: '{ready.selector}' not there after {ready.timeout_ms / 1000:.0f}s, going on")
+
+
+async def navigate(page: Page, url: str, ready: Readiness = LOADED) -> Response | None:
+    """
+    Opens `url` and returns as soon as the page is ready by `ready`'s definition, logging how long that took.
 
     Args:
+        page (Page): The page to navigate.
         url (str): The URL to open.
-        is_epic (bool): Unused parameter kept for backwards compatibility.
-        headless (bool): Whether to set up browser headless.
+        ready (Readiness): What the page needs before the flow can go on.
 
     Returns:
-        Tuple: A tuple containing the Playwright instance, browser context, and page object.
+        Response | None: The response of the main document (None for same-document navigations).
     """
-    p = sync_playwright().start()
-    browser = None
+    with span("navigate", page=ready.name):
+        start = time.perf_counter()
+        response = await page.goto(url, wait_until=ready.wait_until, timeout=ready.timeout_ms)
+        loaded = time.perf_counter() - start
+
+        if ready.selector:
+            await wait_until_ready(page, ready, timeout_ms=ready.timeout_ms - loaded * 1000)
+        total = time.perf_counter() - start
+
+    selector = f" + selector {total - loaded:.2f}s" if ready.selector else ""
+    logger.debug(f"Navigated to {ready.name} in {total:.2f}s ({ready.wait_until} {loaded:.2f}s{selector}): {url}")
+    return response
+
+
+@span("goto")
+async def goto_with_retry(page: Page, url: str, ready: Readiness = LOADED,
+                          policy: RetryPolicy = retry.NAVIGATION) -> Response | None:
+    """
+    Navigates to `url` (see `navigate`), retrying network failures, timeouts, detached frames and
+    HTTP 429/5xx answers by `policy`.
+
+    Args:
+        page (Page): The page to navigate.
+        url (str): The URL to open.
+        ready (Readiness): What the page needs before the flow can go on.
+        policy (RetryPolicy): Which failures to retry and for how long.
+
+    Returns:
+        Response | None: The response of the main document (still an error one if the server never recovered).
+    """
+    async def _attempt() -> Response | None:
+        response = await navigate(page, url, ready)
+        if response and (response.status == 429 or response.status >= 500):
+            retry_after = response.headers.get("retry-after")
+            raise HTTPStatusError(response.status, url, float(retry_after) if (retry_after or "").isdigit() else None,
+                                  response)
+        return response
+
     try:
-        # Use persistent context to maintain login sessions across runs
-        user_data_dir = "pw_user_data"
-        os.makedirs(user_data_dir, exist_ok=True)
-        
-        browser = p.firefox.launch_persistent_context(
-            user_data_dir,
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) "
-                "Gecko/20100101 Firefox/128.0"
-            ),
-            headless=headless,
-            viewport={"width": 1920, "height": 1080}
-        )
-
-        page = browser.pages[0]
-
-        # hide navigator.webdriver
-        page.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            })
-        """)
-
-        random_sleep()
-        
-        # Retry logic for DNS/network failures
-        if url:
-            max_retries = 3
-            retry_delay = 10  # seconds
-            for attempt in range(max_retries):
-                try:
-                    page.goto(url, wait_until="load", timeout=30000)
-                    break
-                except PlaywrightError as e:
-                    error_str = str(e)
-                    if "NS_ERROR_UNKNOWN_HOST" in error_str or "net::ERR_NAME_NOT_RESOLVED" in error_str:
-                        if attempt < max_retries - 1:
-                            logger.warning(f"DNS resolution failed for {url}, retrying in {retry_delay}s ({attempt + 1}/{max_retries})...")
-                            time.sleep(retry_delay)
-                        else:
-                            logger.error(f"DNS resolution failed after {max_retries} attempts")
-                            raise
-                    else:
-                        raise
-
-        return p, browser, page
-    except Exception:
-        if browser:
-            try:
-                browser.close()
-            except Exception:
-                pass
-        p.stop()
-        raise
+        return await retry.retry_async(_attempt, policy, f"Opening {url}", logger)
+    except HTTPStatusError as e:
+        logger.error(f"{e}, giving up")
+        return e.response
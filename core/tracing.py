@@ -0,0 +1,243 @@
+"""
+@file:   core/tracing.py
+@module: core.tracing
+@brief:  Lightweight nested timing spans for the phases of a run, with a per-phase summary
+         and exports as JSON lines and as a Prometheus textfile-collector file.
+         Only depends on the standard library.
+@author: Yonatan-Schrift
+"""
+import functools
+import inspect
+import json
+import os
+import tempfile
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Final
+
+DEFAULT_METRICS_DIR: Final[str] = os.path.join("data", "metrics")
+SPANS_FILE: Final[str] = "spans.jsonl"
+PROMETHEUS_FILE: Final[str] = "autoclaim.prom"
+
+
+@dataclass
+class Span:
+    """
+    One timed phase of a run.
+
+    Attributes:
+        name (str): The phase, e.g. "sign_in" or "safe_find".
+        path (str): The names of the enclosing spans and this one, e.g. "job/claim_game/safe_find".
+        labels (dict[str, str]): Labels of the span, inherited from the enclosing spans (e.g. site).
+        start (float): Wall-clock start time (epoch seconds).
+        duration (float): Duration in seconds (0 until the span ends).
+        error (str | None): The class name of the exception that ended the span, if any.
+    """
+    name: str
+    path: str
+    labels: dict[str, str] = field(default_factory=dict)
+    start: float = 0.0
+    duration: float = 0.0
+    error: str | None = None
+
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_finished: list[Span] = []
+_run_id: str = ""
+
+
+class span:
+    """
+    Times a phase. Works as a context manager and as a decorator of sync and async functions.
+    Spans nest per asyncio task, so concurrent sites each get their own tree.
+
+    Usage:
+        with span("job", site="epic_games"):
+            ...
+
+        @span("sign_in")
+        async def sign_in(...): ...
+    """
+
+    def __init__(self, name: str, **labels: str):
+        self.name = name
+        self.labels = labels
+        self._span: Span | None = None
+        self._token = None
+        self._started = 0.0
+
+    def __enter__(self) -> Span:
+        parent = _current.get()
+        self._span = Span(
+            name=self.name,
+            path=f"{parent.path}/{self.name}" if parent else self.name,
+            labels={**parent.labels, **self.labels} if parent else dict(self.labels),
+            start=time.time(),
+        )
+        self._token = _current.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._span.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self._span.error = exc_type.__name__
+        _current.reset(self._token)
+        _finished.append(self._span)
+
+    def __call__(self, func):
+        # every call gets its own span object, so concurrent calls don't share state
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(self.name, **self.labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def record(name: str, duration: float, **labels: str) -> Span:
+    """
+    Adds a span that was timed elsewhere (e.g. across several calls), as a child of the current span.
+
+    Args:
+        name (str): The phase.
+        duration (float): Its duration in seconds, ending now.
+        **labels (str): Labels on top of the ones inherited from the current span.
+    """
+    parent = _current.get()
+    finished = Span(
+        name=name,
+        path=f"{parent.path}/{name}" if parent else name,
+        labels={**parent.labels, **labels} if parent else dict(labels),
+        start=time.time() - duration,
+        duration=duration,
+    )
+    _finished.append(finished)
+    return finished
+
+
+def start_run() -> str:
+    """
+    Forgets the spans of the previous run and returns the id of the new one.
+    """
+    global _run_id
+    _finished.clear()
+    _run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    return _run_id
+
+
+def finished_spans() -> list[Span]:
+    """
+    Returns the spans that ended since `start_run`, in the order they ended.
+    """
+    return list(_finished)
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank quantile, good enough for a handful of samples per run
+    index = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(spans: list[Span]) -> dict[tuple[str, str], dict[str, float]]:
+    """
+    Aggregates spans per (site, phase).
+
+    Returns:
+        dict: {(site, phase): {"count", "errors", "total", "p50", "p95", "max"}}, the site being "" outside any site.
+    """
+    groups: dict[tuple[str, str], list[Span]] = {}
+    for s in spans:
+        groups.setdefault((s.labels.get("site", ""), s.name), []).append(s)
+
+    summary = {}
+    for key, group in groups.items():
+        durations = sorted(s.duration for s in group)
+        summary[key] = {
+            "count": len(group),
+            "errors": sum(1 for s in group if s.error),
+            "total": sum(durations),
+            "p50": _quantile(durations, 0.5),
+            "p95": _quantile(durations, 0.95),
+            "max": durations[-1],
+        }
+    return summary
+
+
+def format_summary(spans: list[Span]) -> str:
+    """
+    Returns a table of the time spent per (site, phase), slowest first.
+    """
+    lines = ["Phases:", f"  {'site':<14} {'phase':<24} {'count':>5} {'total':>8} {'p50':>7} {'p95':>7} {'max':>7}"]
+    summary = summarize(spans)
+    for (site, phase), stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+        errors = f"  ({stats['errors']} failed)" if stats["errors"] else ""
+        lines.append(f"  {site or '-':<14} {phase:<24} {stats['count']:>5} {stats['total']:7.2f}s "
+                     f"{stats['p50']:6.2f}s {stats['p95']:6.2f}s {stats['max']:6.2f}s{errors}")
+    return "\n".join(lines)
+
+
+def export(spans: list[Span], directory: str = None) -> None:
+    """
+    Appends the spans to `spans.jsonl` and rewrites `autoclaim.prom` with the run's per-phase metrics
+    (point a node_exporter textfile collector at the directory to graph them across runs).
+
+    Args:
+        spans (list[Span]): The spans of the run.
+        directory (str): Where to write, defaults to METRICS_DIR or data/metrics.
+    """
+    directory = directory or os.getenv("METRICS_DIR") or DEFAULT_METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, SPANS_FILE), "a", encoding="utf-8") as f:
+        for s in spans:
+            f.write(json.dumps({
+                "run": _run_id, "name": s.name, "path": s.path, "labels": s.labels,
+                "start": round(s.start, 3), "duration": round(s.duration, 6), "error": s.error,
+            }) + "\n")
+
+    _write_atomic(os.path.join(directory, PROMETHEUS_FILE), _prometheus_text(spans))
+
+
+def _prometheus_text(spans: list[Span]) -> str:
+    lines = [
+        "# HELP autoclaim_phase_duration_seconds Time spent in each phase during the last run.",
+        "# TYPE autoclaim_phase_duration_seconds summary",
+    ]
+    summary = summarize(spans)
+    for (site, phase), stats in sorted(summary.items()):
+        labels = f'site="{site}",phase="{phase}"'
+        lines.append(f'autoclaim_phase_duration_seconds{{{labels},quantile="0.5"}} {stats["p50"]:.6f}')
+        lines.append(f'autoclaim_phase_duration_seconds{{{labels},quantile="0.95"}} {stats["p95"]:.6f}')
+        lines.append(f"autoclaim_phase_duration_seconds_sum{{{labels}}} {stats['total']:.6f}")
+        lines.append(f"autoclaim_phase_duration_seconds_count{{{labels}}} {stats['count']}")
+
+    lines += [
+        "# HELP autoclaim_phase_errors Number of phases that ended with an exception during the last run.",
+        "# TYPE autoclaim_phase_errors gauge",
+    ]
+    for (site, phase), stats in sorted(summary.items()):
+        lines.append(f'autoclaim_phase_errors{{site="{site}",phase="{phase}"}} {stats["errors"]}')
+
+    lines += [
+        "# HELP autoclaim_last_run_timestamp_seconds When the last run finished.",
+        "# TYPE autoclaim_last_run_timestamp_seconds gauge",
+        f"autoclaim_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    # the textfile collector may read at any moment, so never let it see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".autoclaim-", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(tmp_path, 0o644)  # mkstemp creates it private, the collector may run as another user
+    os.replace(tmp_path, path)
@@ -4,17 +4,20 @@
 @brief:  Includes various utilities, especially for locating elements in a page
 @author: Yonatan-Schrift
 """
-import os
+import asyncio
+import time
+from collections.abc import Collection
 
-from core.anti_bot import random_sleep, user_click, human_type
+from core.anti_bot import random_sleep, user_click, human_type, pacing
+from core.tracing import span
 from core.exceptions import (
     MissingValueError,
     LocatorNotFoundError,
     ProjectError,
 )
 
-from playwright.sync_api import Page, Locator
-from playwright.sync_api import TimeoutError as PWTimeoutError
+from playwright.async_api import Page, Locator
+from playwright.async_api import TimeoutError as PWTimeoutError
 
 from typing import Optional, Final
 import threading
@@ -23,26 +26,7 @@ import queue
 DEFAULT_TIMEOUT_MS: Final[int] = 5000
 
 
-def env_to_bool(env_var_name: Optional[str], default: bool = False) -> bool:
-    """
-    Convert an environment variable string to a boolean.
-
-    Args:
-        env_var_name (Optional[str]): The name of the environment variable to convert.
-        default (bool): The default boolean value to return if the environment variable is not set.
-
-    Returns:
-        bool: The converted boolean value.
-    """
-    env_value = os.getenv(env_var_name)
-
-    if env_value is None:
-        return default
-
-    return env_value.lower() in ("1", "true", "yes", "on")
-
-
-def click_locator(page: Page, text: str) -> bool:
+async def click_locator(page: Page, text: str) -> bool:
     """
     Locate an element and click it, mimicking human behavior.
 
@@ -53,15 +37,15 @@ def click_locator(page: Page, text: str) -> bool:
     Returns:
         bool: True if the locator was found and clicked, False otherwise
     """
-    locator = safe_find(page, text)
+    locator = await safe_find(page, text)
     if not locator: return False
 
-    user_click(locator)
+    await user_click(locator)
 
     return True
 
 
-def fill_field(page: Page, to_locate: str, to_fill: str, to_continue: str) -> bool:
+async def fill_field(page: Page, to_locate: str, to_fill: str, to_continue: str) -> bool:
     """
     Locate an element and fill it with the given value.
 
@@ -78,22 +62,23 @@ def fill_field(page: Page, to_locate: str, to_fill: str, to_continue: str) -> bo
         LocatorNotFoundError: If the element to locate is not found.
         MissingValueError: If the value to fill is not provided.
     """
-    locator = safe_find(page, to_locate)
+    locator = await safe_find(page, to_locate)
     if not locator:
         # Either already signed in or locator changed
         raise LocatorNotFoundError(f"-!- Couldn't locate element {to_locate}")
     if to_fill:
-        human_type(page=page, locator=locator, text=to_fill)
-        random_sleep()
+        await human_type(page=page, locator=locator, text=to_fill)
+        await random_sleep()
     else:
         raise MissingValueError(f"-!- No value provided for \'to_locate\'")
 
-    click_locator(page, to_continue)
+    await click_locator(page, to_continue)
 
     return True
 
 
-def safe_find(page: Page, to_locate: str, timeout_ms: int = DEFAULT_TIMEOUT_MS, is_hidden: bool = False) -> Optional[Locator]:
+@span("safe_find")
+async def safe_find(page: Page, to_locate: str, timeout_ms: int = DEFAULT_TIMEOUT_MS, is_hidden: bool = False) -> Optional[Locator]:
     """
         Locate an element and wait until it becomes visible, returning None on failure (e.g., timeout or not found).
 
@@ -118,18 +103,226 @@ def safe_find(page: Page, to_locate: str, timeout_ms: int = DEFAULT_TIMEOUT_MS,
 
     try:
         locator = page.locator(to_locate).first
-        if not is_hidden: locator.wait_for(state="visible", timeout=timeout_ms)
+        if not is_hidden: await locator.wait_for(state="visible", timeout=timeout_ms)
 
-        random_sleep(1, 3.5)
+        await random_sleep(*pacing().find_delay)
         return locator
     except PWTimeoutError:
         return None
 
 
 
-def safe_fill(page: Page, to_locate: str, to_fill: str, to_continue: str):
+@span("wait_for_any")
+async def wait_for_any(
+        page: Page,
+        selectors: dict[str, str],
+        timeout_ms: int = DEFAULT_TIMEOUT_MS,
+        attached: Collection[str] = (),
+) -> tuple[Optional[str], Optional[Locator]]:
+    """
+    Waits until any of several selectors matches and returns which one, so a flow can branch on the page's state
+    in the time the page takes to show it, instead of probing each possible state with its own timeout.
+
+    Args:
+        page (Page): The page to watch.
+        selectors (dict[str, str]): State name -> selector, in priority order (if several match, the first wins).
+        timeout_ms (int): Maximum time to wait for any of them (milliseconds).
+        attached (Collection[str]): Names of the states whose element only has to be in the DOM
+            (e.g. hidden inputs), the others have to be visible.
+
+    Returns:
+        tuple[str | None, Locator | None]: The matching state and its element, or (None, None) on timeout.
+    """
+    locators = {name: page.locator(selector).first for name, selector in selectors.items()}
+    groups = {
+        state: [locators[name] for name in locators if (name in attached) == (state == "attached")]
+        for state in ("visible", "attached")
+    }
+    deadline = time.monotonic() + timeout_ms / 1000
+
+    while (remaining_ms := (deadline - time.monotonic()) * 1000) > 0:
+        # one combined wait per group (usually just the visible one), racing each other
+        waits = [
+            asyncio.ensure_future(_wait_for_group(group, state, remaining_ms))
+            for state, group in groups.items() if group
+        ]
+        try:
+            done, _ = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for wait in waits:
+                wait.cancel()
+        if not any(wait.result() for wait in done if not wait.cancelled()):
+            return None, None
+
+        # find out which one it was (it may be gone again already, then keep waiting)
+        for name, locator in locators.items():
+            present = await locator.count() > 0 if name in attached else await locator.is_visible()
+            if present:
+                await random_sleep(*pacing().find_delay)
+                return name, locator
+
+    return None, None
+
+
+async def _wait_for_group(locators: list[Locator], state: str, timeout_ms: float) -> bool:
+    combined = locators[0]
+    for locator in locators[1:]:
+        combined = combined.or_(locator)
+    try:
+        await combined.first.wait_for(state=state, timeout=timeout_ms)
+        return True
+    except PWTimeoutError:
+        return False
+
+
+# Runs in the page: reads every field of every element in one go (see extract_all for the field spec).
+_EXTRACT_JS: Final[str] = """
+(elements, fields) => elements.map(element => {
+    const read = (spec) => {
+        spec = spec.trim();
+        let target = element, selector = "", what = spec;
+        if (spec.endsWith("::text")) {
+            selector = spec.slice(0, -"::text".length).trim();
+            what = "text";
+        } else if (spec.includes("@")) {
+            const at = spec.lastIndexOf("@");
+            selector = spec.slice(0, at).trim();
+            what = spec.slice(at);
+        }
+        if (selector) target = element.querySelector(selector);
+        if (!target) return null;
+        return what === "text" ? target.innerText : target.getAttribute(what.slice(1));
+    };
+
+    const row = {};
+    for (const [name, spec] of Object.entries(fields)) {
+        row[name] = null;
+        for (const alternative of spec.split("|")) {
+            const value = read(alternative);
+            if (value) {
+                row[name] = value;
+                break;
+            }
+        }
+    }
+    return row;
+})
+"""
+
+
+@span("extract_all")
+async def extract_all(page: Page, selector: str, fields: dict[str, str]) -> list[dict[str, Optional[str]]]:
+    """
+    Reads fields of every element matching `selector` in a single call to the browser,
+    instead of one round trip per element and field.
+
+    Field specs:
+        "text"            the element's inner text
+        "@attr"           an attribute of the element
+        "sub@attr"        an attribute of the first descendant matching the CSS selector `sub`
+        "sub::text"       the inner text of that descendant
+        "spec1|spec2"     the first non-empty of several specs
+
+    Args:
+        page (Page): The page to read from.
+        selector (str): Selector of the elements (one row per element, in document order).
+        fields (dict[str, str]): Row key -> field spec.
+
+    Returns:
+        list[dict[str, Optional[str]]]: One dict per element, None for fields that weren't found.
+
+    Example:
+        await extract_all(page, ".card", {"name": "h3::text", "link": "@href|a@href"})
+    """
+    return await page.locator(selector).evaluate_all(_EXTRACT_JS, fields)
+
+
+# Runs in the page: nudges lazy loading by scrolling to the last match whenever new matches appear,
+# and resolves once the number of matches didn't change for `quietMs`.
+_STABLE_COUNT_JS: Final[str] = """
+({selector, quietMs, emptyMs, timeoutMs}) => new Promise(resolve => {
+    const start = performance.now();
+    const count = () => document.querySelectorAll(selector).length;
+    const nudge = () => {
+        const matches = document.querySelectorAll(selector);
+        (matches[matches.length - 1] || document.body).scrollIntoView({block: "end"});
+        window.scrollBy(0, window.innerHeight);
+    };
+
+    let last = count(), batches = 0, quiet = null, deadline = null;
+    const finish = (timedOut) => {
+        observer.disconnect();
+        clearTimeout(quiet);
+        clearTimeout(deadline);
+        resolve({count: count(), batches, elapsedMs: performance.now() - start, timedOut});
+    };
+    const arm = () => {
+        clearTimeout(quiet);
+        quiet = setTimeout(() => finish(false), last === 0 ? emptyMs : quietMs);
+    };
+
+    const observer = new MutationObserver(() => {
+        const current = count();
+        if (current !== last) {
+            last = current;
+            batches++;
+            nudge();
+            arm();
+        }
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    deadline = setTimeout(() => finish(true), timeoutMs);
+
+    nudge();
+    arm();
+})
+"""
+
+
+@span("wait_for_stable_count")
+async def wait_for_stable_count(page: Page, selector: str, quiet_ms: int = 1000, timeout_ms: int = 30_000,
+                                container: str = None, empty_ms: int = None) -> dict:
+    """
+    Waits until a lazily loaded list is complete: the number of elements matching `selector`
+    stopped changing for `quiet_ms`.
+
+    A MutationObserver in the page scrolls to the last match whenever new matches are added
+    (so the next batch gets loaded), so this returns as soon as the list settles instead of
+    polling with fixed sleeps.
+
+    Args:
+        page (Page): The page to watch.
+        selector (str): CSS selector of the list items.
+        quiet_ms (int): How long the count has to stay the same (milliseconds).
+        timeout_ms (int): Maximum time to wait, including for the list to appear (milliseconds).
+        container (str): CSS selector of the list itself. If given, it is waited for instead of the first item,
+            so an empty list is complete once it stayed empty for `empty_ms` (instead of timing out).
+        empty_ms (int): How long the list has to stay empty (milliseconds), defaults to `quiet_ms`.
+
+    Returns:
+        dict: {"count": matches at the end, "batches": times the count changed,
+               "elapsedMs": time spent in total, "timedOut": whether `timeout_ms` was hit}
+    """
+    start = time.monotonic()
+    try:
+        await page.locator(container or selector).first.wait_for(state="attached", timeout=timeout_ms)
+    except PWTimeoutError:
+        return {"count": 0, "batches": 0, "elapsedMs": timeout_ms, "timedOut": True}
+
+    # the wait for the list already used part of the timeout
+    remaining_ms = max(timeout_ms - (time.monotonic() - start) * 1000, 0)
+    result = await page.evaluate(
+        _STABLE_COUNT_JS,
+        {"selector": selector, "quietMs": quiet_ms, "emptyMs": quiet_ms if empty_ms is None else empty_ms,
+         "timeoutMs": remaining_ms},
+    )
+    result["elapsedMs"] = (time.monotonic() - start) * 1000
+    return result
+
+
+async def safe_fill(page: Page, to_locate: str, to_fill: str, to_continue: str):
     try:
-        fill_field(page, to_locate, to_fill, to_continue)
+        await fill_field(page, to_locate, to_fill, to_continue)
     except ProjectError as e:
         raise e
 
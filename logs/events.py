@@ -6,10 +6,8 @@
 """
 
 import logging
-from os import getenv
 
-from core.utils import env_to_bool
-from logs.notifications import send_discord_notification
+from logs.notifications import notify
 
 PERSISTENT = 60  # Custom log level for persistent logs
 logging.addLevelName(PERSISTENT, 'PERSISTENT')
@@ -26,7 +24,7 @@ logging.Logger.PERSISTENT = persistent
 def log_persistent(logger: logging.Logger, message: str) -> None:
     """
     Logs a message at the PERSISTENT level.
-    also optionally sends a notification via multiple services.
+    also queues it for the run's notification digest (sent by logs.notifications.flush_notifications).
     Args:
         logger: the logger to use
         message: the message to log
@@ -34,18 +32,5 @@ def log_persistent(logger: logging.Logger, message: str) -> None:
     """
     logger.log(PERSISTENT, message)
 
-    # send notifications
-    if env_to_bool("NOTIFY_ON_DISCORD") and getenv("DISCORD_WEBHOOK_URL"):
-        try:
-            notify_everyone = env_to_bool("DISCORD_NOTIFY_EVERYONE")
-
-            mention = " @everyone" if notify_everyone else ""
-            success = send_discord_notification(
-                getenv("DISCORD_WEBHOOK_URL"),
-                f"{message}\n\n*This is an automated message.*{mention}"
-            )
-            if not success:
-                logger.warning(f"Discord notification failed for: {message}")
-        except Exception as e:
-            logger.error(f"Failed to send Discord notification: {e}")
-            logger.warning(f"Event not notified to Discord: {message}")
+    # never blocks: the notifications of the whole run are sent together once it ends
+    notify(logger.name, message)
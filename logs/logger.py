@@ -2,139 +2,253 @@
 @file:   logs/logger.py
 @module: logs.logger
 @brief:  This file contains functions for setting up and managing a logger.
+         Log calls only put the record on a queue; a single background thread writes the console and log files.
 @author: Yonatan-Schrift
 """
 
+import atexit
 import logging
 import os
-import json
-import fcntl
+import queue
+import threading
 
-from logging.handlers import RotatingFileHandler
+try:
+    import fcntl  # POSIX only, used to keep concurrent runs from interleaving lines
+except ImportError:
+    fcntl = None
+
+from logging.handlers import QueueHandler, QueueListener
 from logs.events import PERSISTENT
+from logs.notifications import flush_notifications
+from logs.retention import Compressor, RetentionPolicy, rotate, rotation_due
 
-# Ensure logs directory exists (currently always exists as this file is in /logs)
 LOG_DIR = os.path.join("logs")
-os.makedirs(LOG_DIR, exist_ok=True)
+
+_queue: queue.Queue = queue.Queue()
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+_compressor: Compressor | None = None  # created with the first log file, once user.env is loaded
+_EXIT_NOTIFY_TIMEOUT = 5  # seconds for the notifications of a run that didn't get to send them (e.g. a crash)
 
 
-def _update_counter(counter_file: str) -> int:
+class _AppendHandler(logging.Handler):
     """
-    Atomically update the counter file using file locking.
-    
-    Args:
-        counter_file: Path to the counter JSON file.
-        
-    Returns:
-        The new count value after incrementing.
+    Appends every record to a file with a single write on an O_APPEND descriptor (under an exclusive lock
+    where available), so several processes can share the file without mixing up their lines.
+
+    The file is rotated under the same lock when the next write would make it outgrow the retention policy
+    (or, if `daily`, when it was last written on a previous day); a process that finds its file rotated
+    by another one reopens it. The rotated file is compressed in the background.
     """
-    # Create file if it doesn't exist
-    if not os.path.exists(counter_file):
-        with open(counter_file, "w") as f:
-            json.dump({"count": 1}, f)
-        return 1
-    
-    with open(counter_file, 'a+') as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-        try:
-            f.seek(0)
-            content = f.read()
-            count = json.loads(content).get("count", 0) if content else 0
-            count += 1
-            if count >= 7:
-                f.seek(0)
-                f.truncate()
-                count = 0
-            else:
-                f.seek(0)
-                f.truncate()
-                json.dump({"count": count}, f)
-            return count
-        finally:
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
 
+    def __init__(self, path: str, level: int, formatter: logging.Formatter, daily: bool = False):
+        super().__init__(level)
+        self.setFormatter(formatter)
+        self.path = path
+        self.daily = daily
+        self._fd = self._open()
 
-def get_logger(name: str) -> logging.Logger:
-    """
-    Returns a logger that writes to both console and a log file.
-    Clears the log file every couple of runs (the number is stored in the config) to avoid excessive size.
+    def _open(self) -> int:
+        return os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
 
-    Args:
-        name (str): Name of the logger (usually __name__ of the module)
+    def _reopen(self) -> None:
+        # open the new file first: if that fails, _fd must not be left pointing at a closed (reusable) descriptor
+        fd = self._open()
+        os.close(self._fd)
+        self._fd = fd
 
-    Returns:
-        logging.Logger: Configured logger instance
-    """
-    log_name = name.removeprefix("sites.")
-    log_file = os.path.join(LOG_DIR, f"{log_name}.log")
-    persistent_log_file = os.path.join(LOG_DIR, f"{log_name}_claimed.log")
-    counter_file = os.path.join(LOG_DIR, f"{log_name}_counter.json")
+    def _replaced(self) -> bool:
+        # the path no longer leads to our file: another process rotated it
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return True
 
-    clear_log_day = os.getenv("KEEP_LOG_FOR")  # days after which to clear the log file
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = (self.format(record) + "\n").encode("utf-8")
+            while True:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    if self._replaced():
+                        reopen = True
+                    elif rotation_due(self._fd, len(data), _compressor.policy, self.daily):
+                        archive = rotate(self.path)
+                        if archive:
+                            _compressor.submit(archive)
+                        reopen = archive is not None
+                    else:
+                        reopen = False
+
+                    if not reopen:
+                        while data:
+                            data = data[os.write(self._fd, data):]
+                        return
+                finally:
+                    if fcntl:
+                        fcntl.flock(self._fd, fcntl.LOCK_UN)
+                self._reopen()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        super().close()
 
-    # --- Atomically update the counter file ---
-    count = _update_counter(counter_file)
 
-    if count == 0:
-        # Clear the main log file (not the persistent one) when counter resets
-        open(log_file, "w").close()
+class _Router(logging.Handler):
+    """
+    Runs on the listener thread: sends each record to the console and to the files of the logger it came from,
+    opening those files the first time the logger is used.
+    """
 
-    # --- Create logger ---
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self._lock = threading.Lock()
+        self._handlers: dict[str, list[logging.Handler]] = {}
+        self._console = logging.StreamHandler()
+        self._console.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        self._console.setLevel(logging.INFO)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        with self._lock:
+            handlers = self._handlers.get(record.name)
+            if handlers is None:
+                handlers = self._handlers[record.name] = _file_handlers(record.name)
+
+        for handler in [self._console, *handlers]:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close_logger(self, name: str) -> None:
+        with self._lock:
+            for handler in self._handlers.pop(name, []):
+                handler.close()
+
+    def close(self) -> None:
+        with self._lock:
+            for handlers in self._handlers.values():
+                for handler in handlers:
+                    handler.close()
+            self._handlers.clear()
+        try:
+            self._console.flush()
+        except ValueError:
+            pass  # stdout was already closed (e.g. replaced by a test runner's capture)
+        super().close()
 
-    # Avoid adding duplicate handlers if get_logger is called multiple times
-    if logger.handlers:
-        return logger
 
-    # --- Console handler ---
-    console_handler = logging.StreamHandler()
-    console_formatter = logging.Formatter("[%(levelname)s] %(message)s")
-    console_handler.setFormatter(console_formatter)
-    console_handler.setLevel(logging.INFO)
+def _file_handlers(name: str) -> list[logging.Handler]:
+    """
+    Creates the main and persistent file handlers of a logger.
+    The main log rotates daily and by size, the persistent one only by size (see logs.retention).
+    """
+    global _compressor
+    os.makedirs(LOG_DIR, exist_ok=True)
+    if _compressor is None:
+        _compressor = Compressor(LOG_DIR, RetentionPolicy.from_env())
+        _compressor.submit()  # a first retention pass, in the background
+
+    log_name = name.removeprefix("sites.")
+    log_file = os.path.join(LOG_DIR, f"{log_name}.log")
+    persistent_log_file = os.path.join(LOG_DIR, f"{log_name}_claimed.log")
 
     # --- Main file handler ---
-    file_handler = logging.FileHandler(log_file, mode='a', encoding="utf-8")
-    file_formatter = logging.Formatter(
+    file_handler = _AppendHandler(log_file, logging.DEBUG, logging.Formatter(
         "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         datefmt="%d-%m-%Y %H:%M:%S"
-    )
-    file_handler.setFormatter(file_formatter)
-    file_handler.setLevel(logging.DEBUG)
+    ), daily=True)
 
     # --- Persistent file handler ---
-    persistent_handler = logging.FileHandler(persistent_log_file, encoding="utf-8")
-    persistent_handler.setLevel(PERSISTENT)  # only log persistent level logs
-    persistent_handler.setFormatter(logging.Formatter(
+    persistent_handler = _AppendHandler(persistent_log_file, PERSISTENT, logging.Formatter(  # only persistent logs
         "%(asctime)s: %(message)s",
         datefmt="%d-%m-%Y %H:%M:%S"
     ))
 
-    # --- Add handlers ---
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    logger.addHandler(persistent_handler)
+    return [file_handler, persistent_handler]
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    Puts records on the shared queue, starting the writer thread on the first record.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if _listener is None:
+            _start_listener()
+        super().emit(record)
+
+
+def _start_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            listener = QueueListener(_queue, _Router(), respect_handler_level=True)
+            listener.start()
+            atexit.register(_stop_listener)
+            _listener = listener
+
+
+def _stop_listener() -> None:
+    global _listener
+    # before stopping: sending notifications logs (failures, retries), which would restart the listener afterwards
+    flush_notifications(_EXIT_NOTIFY_TIMEOUT)
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()  # writes everything still queued
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+    if _compressor is not None:
+        _compressor.join(timeout=5)  # a late archive stays uncompressed until the next run's first pass
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a logger that writes to both console and a log file.
+    Nothing is opened or written until the logger is first used, and then only by the background writer thread.
+
+    Args:
+        name (str): Name of the logger (usually __name__ of the module)
+
+    Returns:
+        logging.Logger: Configured logger instance
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+
+    # Avoid adding duplicate handlers if get_logger is called multiple times
+    if not logger.handlers:
+        logger.addHandler(_LazyQueueHandler(_queue))
 
-    logger.debug(f"Logger '{log_name}' initialized, logging to console and '{log_file}'")
     return logger
 
 
+def flush_logs() -> None:
+    """
+    Blocks until every record logged so far has been written.
+    """
+    if _listener is not None:
+        _queue.join()
+
+
 def stop_logger(logger: logging.Logger):
     """
-    Cleanly stop a logger by closing and removing all its handlers.
+    Cleanly stop a logger: writes its pending records, closes its files and removes its handlers.
 
     Args:
         logger (logging.Logger): The logger instance to stop.
     """
-    # Copy handlers so we can modify the logger safely
-
     logger.info(f"Stopping logger\n")
+    flush_logs()
+
     for handler in logger.handlers[:]:
-        try:
-            handler.flush()  # make sure buffered logs are written
-            handler.close()  # close file/stream
-        except Exception as e:
-            # Optional: fallback in case a handler misbehaves
-            print(f"Warning: failed to close handler {handler}: {e}")
-        finally:
-            logger.removeHandler(handler)
+        logger.removeHandler(handler)
+
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.close_logger(logger.name)
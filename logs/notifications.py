@@ -2,41 +2,278 @@
 @file       logs/notifications.py
 @module     logs.notifications
 @brief      this file contains functions for sending notifications via various services (e.g., Discord, email, Telegram).
+            Events are collected during a run and sent as one digest message per channel when the run is flushed.
 @author     Yonatan-Schrift
 """
 
-import discord_webhook
-import concurrent.futures
+import os
+import threading
+import time
+from typing import Final
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core import retry
+from core.exceptions import HTTPStatusError
+from core.env import env_to_bool
 # import smtplib
 
-# Thread pool for non-blocking notifications
-_notification_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+DEFAULT_FLUSH_TIMEOUT: Final[float] = 15    # seconds the end of a run may wait for the notifications
+REQUEST_TIMEOUT: Final[float] = 10
+
+DISCORD_MAX_LENGTH: Final[int] = 2000
+TELEGRAM_MAX_LENGTH: Final[int] = 4096
+TELEGRAM_API: Final[str] = "https://api.telegram.org/bot{token}/sendMessage"
+
+
+def _logger():
+    # imported lazily: logs.logger imports this module (through logs.events)
+    from logs.logger import get_logger
+    return get_logger(__name__)
+
+
+def _session() -> requests.Session:
+    """
+    One pooled HTTP session for every notification of the process (keeps the TLS connections alive).
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=2))
+    return session
+
+
+def _retry_after(response: requests.Response) -> float | None:
+    """
+    How long a rate limited (HTTP 429) response asks to wait, in seconds.
+    Discord and Telegram put it in the JSON body, Discord also in the Retry-After header.
+    """
+    try:
+        body = response.json()
+        seconds = body.get("retry_after") or (body.get("parameters") or {}).get("retry_after")
+        if seconds:
+            return float(seconds)
+    except ValueError:
+        pass
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def post_with_retry(session: requests.Session, url: str, payload: dict, deadline: float) -> bool:
+    """
+    POSTs `payload` as JSON, retrying rate limits (HTTP 429), server errors and connection errors
+    by the NOTIFICATION retry policy, but never past `deadline`.
+
+    Args:
+        session (requests.Session): The pooled session to send with.
+        url (str): The endpoint.
+        payload (dict): The JSON body.
+        deadline (float): `time.monotonic()` value after which no more attempts are made.
+
+    Returns:
+        bool: True if the message was accepted.
+    """
+    def _attempt() -> bool:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        response = session.post(url, json=payload, timeout=min(REQUEST_TIMEOUT, remaining))
+        if response.ok:
+            return True
+        if response.status_code == 429 or response.status_code >= 500:
+            raise HTTPStatusError(response.status_code, "notification endpoint", _retry_after(response))
+        _logger().error(f"Notification rejected with HTTP {response.status_code}: {response.text[:200]}")
+        return False
+
+    try:
+        return retry.retry_sync(_attempt, retry.NOTIFICATION, "Notification", _logger(), deadline)
+    except (requests.RequestException, HTTPStatusError) as e:
+        _logger().warning(f"Notification failed: {e}")
+        return False
+
+
+def _chunks(text: str, limit: int) -> list[str]:
+    """
+    Splits a message into parts of at most `limit` characters, on line boundaries where possible.
+    """
+    parts, current = [], ""
+    for line in text.splitlines(keepends=True):
+        if len(current) + len(line) > limit and current:
+            parts.append(current)
+            current = ""
+        while len(line) > limit:  # a single line longer than the limit is cut
+            parts.append(line[:limit])
+            line = line[limit:]
+        current += line
+    if current:
+        parts.append(current)
+    return [part.rstrip("\n") for part in parts]
 
 
-def send_discord_notification(webhook_url: str, message: str) -> bool:
+def send_discord_notification(session: requests.Session, webhook_url: str, message: str, deadline: float) -> bool:
     """
     Sends a notification message to a Discord channel via webhook.
 
     Args:
+        session (requests.Session): The pooled session to send with.
         webhook_url (str): The Discord webhook URL.
-        message (str): The message to send.
+        message (str): The message to send (split if longer than Discord allows).
+        deadline (float): `time.monotonic()` value to give up at.
 
     Returns:
         bool: True if the message was sent successfully, False otherwise.
     """
+    mention = env_to_bool("DISCORD_NOTIFY_EVERYONE")
+    text = f"{message}\n\n*This is an automated message.*{' @everyone' if mention else ''}"
+    allowed = {"parse": ["everyone"] if mention else []}
+    return all(
+        post_with_retry(session, webhook_url, {"content": part, "allowed_mentions": allowed}, deadline)
+        for part in _chunks(text, DISCORD_MAX_LENGTH)
+    )
 
-    webhook = discord_webhook.DiscordWebhook(url=webhook_url, content=message)
-    response = webhook.execute()
-    return response.status_code == 200
 
-
-def send_discord_notification_async(webhook_url: str, message: str) -> None:
+def send_telegram_notification(session: requests.Session, token: str, chat_id: str, message: str,
+                               deadline: float) -> bool:
     """
-    Sends a notification message to a Discord channel via webhook asynchronously.
-    Does not block the calling thread.
+    Sends a notification message to a Telegram chat via a bot.
 
     Args:
-        webhook_url (str): The Discord webhook URL.
-        message (str): The message to send.
+        session (requests.Session): The pooled session to send with.
+        token (str): The bot token.
+        chat_id (str): The chat to send to.
+        message (str): The message to send (split if longer than Telegram allows).
+        deadline (float): `time.monotonic()` value to give up at.
+
+    Returns:
+        bool: True if the message was sent successfully, False otherwise.
+    """
+    url = TELEGRAM_API.format(token=token)
+    return all(
+        post_with_retry(session, url, {"chat_id": chat_id, "text": part, "disable_web_page_preview": True}, deadline)
+        for part in _chunks(message, TELEGRAM_MAX_LENGTH)
+    )
+
+
+def _channels() -> dict:
+    """
+    The enabled channels (see user.env), as name -> function sending a message with a session and a deadline.
+    """
+    channels = {}
+    if env_to_bool("NOTIFY_ON_DISCORD") and os.getenv("DISCORD_WEBHOOK_URL"):
+        webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
+        channels["discord"] = lambda session, text, deadline: send_discord_notification(
+            session, webhook_url, text, deadline)
+    if env_to_bool("NOTIFY_ON_TELEGRAM") and os.getenv("TELEGRAM_BOT") and os.getenv("TELEGRAM_CHAT_ID"):
+        token, chat_id = os.getenv("TELEGRAM_BOT"), os.getenv("TELEGRAM_CHAT_ID")
+        channels["telegram"] = lambda session, text, deadline: send_telegram_notification(
+            session, token, chat_id, text, deadline)
+    return channels
+
+
+class NotificationDispatcher:
+    """
+    Collects the events of a run (claims, manual steps, errors) without sending anything,
+    then sends them as a single digest per channel on `flush`.
+    """
+
+    def __init__(self):
+        self._events: list[tuple[str, str]] = []  # (source, message)
+        self._lock = threading.Lock()
+        self._session: requests.Session | None = None
+
+    def notify(self, source: str, message: str) -> None:
+        """
+        Queues an event for the next digest. Never blocks on the network.
+
+        Args:
+            source (str): Where the event comes from (e.g. the site's logger name).
+            message (str): The event.
+        """
+        with self._lock:
+            self._events.append((source.removeprefix("sites."), message))
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    @staticmethod
+    def digest(events: list[tuple[str, str]]) -> str:
+        """
+        Formats the events as one message, grouped by source in order of appearance.
+        """
+        by_source: dict[str, list[str]] = {}
+        for source, message in events:
+            by_source.setdefault(source, []).append(message)
+
+        lines = [f"Autoclaim: {len(events)} event{'s' if len(events) != 1 else ''}"]
+        for source, messages in by_source.items():
+            lines.append(f"\n{source}:")
+            lines += [f"- {message}" for message in messages]
+        return "\n".join(lines)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Sends the queued events as one digest per enabled channel, in parallel, waiting at most `timeout` seconds.
+
+        Args:
+            timeout (float): Maximum seconds to wait (defaults to NOTIFY_FLUSH_TIMEOUT or 15).
+
+        Returns:
+            bool: True if every channel got the digest (or there was nothing to send).
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        channels = _channels()
+        if not events or not channels:
+            return True
+
+        if timeout is None:
+            timeout = float(os.getenv("NOTIFY_FLUSH_TIMEOUT") or DEFAULT_FLUSH_TIMEOUT)
+        if self._session is None:
+            self._session = _session()
+
+        text = self.digest(events)
+        deadline = time.monotonic() + timeout
+        results: dict[str, bool] = {}
+
+        def _deliver(name: str, send) -> None:
+            try:
+                results[name] = send(self._session, text, deadline)
+            except Exception as e:
+                _logger().error(f"{name} notification crashed: {e}")
+                results[name] = False
+
+        # daemon threads (rather than a pool), so a stuck channel can neither block nor outlive the exit
+        threads = [threading.Thread(target=_deliver, args=(name, send), name=f"notify-{name}", daemon=True)
+                   for name, send in channels.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        ok = True
+        for name in channels:
+            if name not in results:
+                _logger().warning(f"{name} notification still pending after {timeout:.0f}s, giving up")
+            elif not results[name]:
+                _logger().warning(f"{name} notification failed, {len(events)} events not notified")
+            ok = ok and results.get(name, False)
+        return ok
+
+
+dispatcher = NotificationDispatcher()
+
+
+def notify(source: str, message: str) -> None:
+    """
+    Queues an event for the digest of the current run (see NotificationDispatcher.notify).
+    """
+    dispatcher.notify(source, message)
+
+
+def flush_notifications(timeout: float = None) -> bool:
+    """
+    Sends the digest of the current run (see NotificationDispatcher.flush).
     """
-    _notification_pool.submit(send_discord_notification, webhook_url, message)
+    return dispatcher.flush(timeout)
@@ -0,0 +1,187 @@
+"""
+@file:   logs/retention.py
+@module: logs.retention
+@brief:  Keeps logs/ bounded: log files are rotated when they grow too big (or, for the main logs, when a new day
+         starts), rotated files are gzipped by a background thread, and old or excess archives are removed.
+@author: Yonatan-Schrift
+"""
+import gzip
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Final
+
+DEFAULT_ROTATE_MB: Final[float] = 5     # a log file is rotated once it reaches this size
+DEFAULT_KEEP_DAYS: Final[float] = 7     # archives of the main logs older than this are removed
+DEFAULT_BUDGET_MB: Final[float] = 50    # everything in logs/ together
+
+# "<name>.log.<YYYYmmdd-HHMMSS>[-n]" and its gzipped version
+_ARCHIVE = re.compile(r"^(?P<log>.+\.log)\.\d{8}-\d{6}(-\d+)?(?P<gz>\.gz)?$")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    How big and how old logs may get.
+
+    Attributes:
+        rotate_bytes (int): Size at which a log file is rotated.
+        keep_days (float): Age after which the archives of the main logs are removed (KEEP_LOG_FOR).
+            The archives of the claimed logs (the history of what was claimed) are only removed for the budget.
+        budget_bytes (int): Size of the whole log directory; the oldest archives go first, main logs before claimed.
+    """
+    rotate_bytes: int = int(DEFAULT_ROTATE_MB * 1_000_000)
+    keep_days: float = DEFAULT_KEEP_DAYS
+    budget_bytes: int = int(DEFAULT_BUDGET_MB * 1_000_000)
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            rotate_bytes=int(_float_env("LOG_ROTATE_MB", DEFAULT_ROTATE_MB) * 1_000_000),
+            keep_days=_float_env("KEEP_LOG_FOR", DEFAULT_KEEP_DAYS),
+            budget_bytes=int(_float_env("LOG_BUDGET_MB", DEFAULT_BUDGET_MB) * 1_000_000),
+        )
+
+
+def rotation_due(fd: int, incoming: int, policy: RetentionPolicy, daily: bool) -> bool:
+    """
+    Whether the file open at `fd` should be rotated before `incoming` more bytes are written to it:
+    it would outgrow `policy.rotate_bytes`, or (`daily`) it was last written on a previous day.
+    """
+    stat = os.fstat(fd)
+    if stat.st_size == 0:
+        return False
+    if stat.st_size + incoming > policy.rotate_bytes:
+        return True
+    return daily and date.fromtimestamp(stat.st_mtime) < date.today()
+
+
+def rotate(path: str) -> str | None:
+    """
+    Renames a log file to a timestamped archive next to it (the caller holds the file's lock and reopens it).
+
+    Returns:
+        str | None: The archive's path, or None if the file couldn't be renamed (e.g. open elsewhere on Windows).
+    """
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    archive, n = f"{path}.{stamp}", 1
+    while os.path.exists(archive) or os.path.exists(f"{archive}.gz"):
+        archive, n = f"{path}.{stamp}-{n}", n + 1
+    try:
+        os.rename(path, archive)
+    except OSError:
+        return None
+    return archive
+
+
+def _compress(path: str) -> None:
+    try:
+        with open(path, "rb") as src, gzip.open(f"{path}.gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f"{path}.gz.tmp", f"{path}.gz")
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # another process got to it first
+
+
+def enforce(directory: str, policy: RetentionPolicy) -> None:
+    """
+    Gzips archives left uncompressed (e.g. by a process that exited meanwhile), removes the files of the old
+    run counter scheme, removes main-log archives older than `keep_days`, then removes the oldest archives
+    until the directory fits in `budget_bytes`. Active log files are never touched.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+
+    for name in names:
+        path = os.path.join(directory, name)
+        if name.endswith("_counter.json"):  # written by the old run counter scheme
+            os.remove(path)
+        elif (match := _ARCHIVE.match(name)) and not match["gz"]:
+            _compress(path)
+
+    archives, total = [], 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        total += stat.st_size
+        if _ARCHIVE.match(name) and name.endswith(".gz"):
+            claimed = _ARCHIVE.match(name)["log"].endswith("_claimed.log")
+            archives.append((claimed, stat.st_mtime, stat.st_size, path))
+
+    cutoff = time.time() - policy.keep_days * 24 * 60 * 60
+    for claimed, mtime, size, path in sorted(archives):  # main logs first, oldest first
+        expired = not claimed and mtime < cutoff
+        if not expired and total <= policy.budget_bytes:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+class Compressor:
+    """
+    A background thread that gzips rotated logs and then applies the retention policy,
+    so rotating never makes the log writer wait for compression.
+    """
+
+    def __init__(self, directory: str, policy: RetentionPolicy):
+        self.directory = directory
+        self.policy = policy
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, archive: str | None = None) -> None:
+        """
+        Queues an archive for compression (or just a retention pass with None), starting the thread if needed.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-compressor", daemon=True)
+                self._thread.start()
+        self._queue.put(archive)
+
+    def _run(self) -> None:
+        while True:
+            archive = self._queue.get()
+            try:
+                if archive:
+                    _compress(archive)
+                enforce(self.directory, self.policy)
+            except OSError:
+                pass  # retention is best effort, the next pass retries
+            finally:
+                self._queue.task_done()
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Waits (at most `timeout` seconds) until everything queued is compressed. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
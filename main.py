@@ -6,14 +6,17 @@
 """
 import os
 import sys
-import textwrap
 
 from dotenv import load_dotenv
 
-from core.utils import env_to_bool
-from sites.epic_games import EpicGames
-from sites.prime_gaming import PrimeGaming
-# from sites.gog import gog
+# Only light imports up here: a cron run with nothing new to claim exits before Playwright,
+# the loggers or the sites are imported (see the fast path in run()).
+from core.accounts import Account, accounts_from_env, load_accounts
+from core.constants import DEFAULT_MAX_CONTEXTS
+from core.env import env_to_bool
+from core.exceptions import AccountsFileError
+from core.promotions import is_settled, next_change
+from sites import registry
 
 def main():
     load_dotenv(override=True, dotenv_path="./user.env")
@@ -29,41 +32,204 @@ def main():
 
 
 def run(args):
-    status = 0
-    headless = env_to_bool("HEADLESS", False)
+    accounts_file = os.getenv("ACCOUNTS_FILE")
+    max_contexts = os.getenv("MAX_CONTEXTS", DEFAULT_MAX_CONTEXTS)
+    per_site = os.getenv("MAX_CONTEXTS_PER_SITE")
+    pacing_profile = os.getenv("PACING_PROFILE")
+    force = False
+    daemon = False
+    sites = []  # names of the sites to claim from, in order of appearance and without duplicates
+
+    args = iter(args)
     for arg in args:
+        requested = []  # sites this argument selects, options select none
         match arg:
             case '-h' | '--help':
                 print_help()
                 return 0
-            case '-eg' | '--epic-games':
-                status |= EpicGames.run(os.getenv("EG_EMAIL"), os.getenv("EG_PASSWORD"), headless)
-            case '-pg' | '--prime-games':
-                print("Prime Gaming is experimental and may not work as expected.")
-                status |= PrimeGaming.run(os.getenv("PG_EMAIL"), os.getenv("PG_PASSWORD"), headless)
-            case '-g' | '--gog':
-                # status |= gog(os.getenv("GOG_EMAIL"), os.getenv("GOG_PASSWORD"), headless)
-                print("GOG support is not yet implemented.")
             case '-a' | '--all':
-                status |= EpicGames.run(os.getenv("EG_EMAIL"), os.getenv("EG_PASSWORD"), headless)
-                status |= PrimeGaming.run(os.getenv("PG_EMAIL"), os.getenv("PG_PASSWORD"), headless)
+                requested = registry.available()
+            case '--accounts':
+                accounts_file = next(args, None)
+                if not accounts_file:
+                    print("-!- --accounts requires a file path")
+                    return 1
+            case '-j' | '--jobs':
+                max_contexts = next(args, None)
+            case '--jobs-per-site':
+                per_site = next(args, None)
+            case '--pacing':
+                pacing_profile = next(args, None) or ""
+            case '-f' | '--force':
+                force = True
+            case '--daemon':
+                daemon = True
             case _:
-                print(f"Unknown argument: {arg}")
-                return 1
+                # site flags come from the registry (the sites themselves aren't imported yet)
+                spec = registry.by_flag(arg)
+                if spec is None:
+                    print(f"Unknown argument: {arg}")
+                    return 1
+                if spec.notice:
+                    print(spec.notice)
+                requested = [spec.name] if spec.available else []
+        sites += [site for site in requested if site not in sites]
+
+    try:
+        max_contexts = int(max_contexts)
+        per_site = int(per_site) if per_site else None
+    except (TypeError, ValueError):
+        print("-!- The number of jobs must be a whole number")
+        return 1
+
+    try:
+        accounts = select_accounts(sites, accounts_file)
+    except AccountsFileError as e:
+        print(f"-!- {e}")
+        return 1
+
+    if not accounts:
+        print("Nothing to claim, select a site (see --help) or add accounts for it.")
+        return 0
+
+    # fast path: every account already claimed its site's current promotion, so nothing new can exist yet
+    if not force and not daemon and all(is_settled(account.site, account.email) for account in accounts):
+        until = min(next_change(account.site, account.email) for account in accounts)
+        print(f"Everything is claimed, nothing new before {until.astimezone():%d-%m-%Y %H:%M} (use --force to run anyway).")
+        return 0
+
+    from core.anti_bot import set_pacing
+
+    if pacing_profile is not None:
+        try:
+            set_pacing(pacing_profile)
+        except ValueError as e:
+            print(f"-!- {e}")
+            return 1
+
+    import asyncio
+
+    site_classes = {name: registry.load(name) for name in {account.site for account in accounts}}
+    headless = env_to_bool("HEADLESS", False)
+
+    async def run_cycle(due: list[Account]) -> int:
+        jobs = [(site_classes[account.site], account) for account in due]
+        return await run_jobs(jobs, headless, max_contexts, per_site)
+
+    from logs.logger import stop_logger
+
+    try:
+        if not daemon:
+            return asyncio.run(run_cycle(accounts))
+
+        from core.daemon import run_daemon
+        asyncio.run(run_daemon(accounts, run_cycle))
+    except KeyboardInterrupt:
+        print("Stopped.")
+        return 0
+    finally:
+        for site in site_classes.values():
+            stop_logger(site.logger)
+
+
+def select_accounts(sites: list[str], accounts_file: str | None) -> list[Account]:
+    """
+    Returns the accounts to claim for on the selected sites.
+
+    Args:
+        sites (list[str]): Names of the sites selected on the command line.
+            With an accounts file and no selected site, every site in the file is run.
+        accounts_file (str | None): Path of the accounts file, or None to use the single account in user.env.
+
+    Returns:
+        list[Account]: The accounts, each with the site to claim on.
+    """
+    if not accounts_file:
+        return accounts_from_env({name: registry.get(name).credentials for name in sites})
+
+    accounts = load_accounts(accounts_file, registry.available())
+    return [account for account in accounts if not sites or account.site in sites]
+
+
+async def run_jobs(jobs, headless: bool, max_contexts: int, per_site: int | None) -> int:
+    """
+    Runs the (site, account) jobs concurrently over a bounded number of browser contexts.
+    Most of a run is spent waiting on the browser or in anti-bot delays, so the
+    total run takes about as long as the slowest job (given enough contexts).
+    All jobs share one browser, which is shut down once every job is done
+    (so a daemon doesn't keep a browser around between cycles).
+    Nothing heavy is imported until a run actually has something to do.
+    The run's phase timings are printed at the end and exported (see core.tracing).
+
+    Args:
+        jobs: The (site, account) pairs to run.
+        headless (bool): Whether to run the browser headless.
+        max_contexts (int): Maximum number of browser contexts open at the same time.
+        per_site (int | None): Maximum number of contexts open on the same site.
+
+    Returns:
+        int: The exit codes of all jobs combined (0 only if every job succeeded).
+    """
+    from core.batch import run_batch
+    from core.setup import BrowserSession
+    from core import tracing
+    from logs.logger import flush_logs
+    from logs.notifications import flush_notifications
+
+    tracing.start_run()
+    try:
+        with tracing.span("run"):
+            async with BrowserSession(headless) as session:
+                results = await run_batch(jobs, session, max_contexts, per_site)
+    finally:
+        # the phase timings are the most useful when something went wrong, so export them regardless
+        spans = tracing.finished_spans()
+        if env_to_bool("METRICS_EXPORT", True):
+            tracing.export(spans)
+        # one digest per channel for the whole run, waiting a bounded time for slow or rate limited channels
+        flush_notifications()
+
+    flush_logs()  # the logs are written by a background thread, let them land before the report
+    print_report(results)
+    print(tracing.format_summary(spans))
+
+    status = 0
+    for result in results:
+        status |= result.status
     return status
 
 
+def print_report(results) -> None:
+    """
+    Prints the outcome of every (site, account) job, with how much of its time went into deliberate delays.
+    """
+    print("\nResults:")
+    for result in results:
+        delay_share = result.delay / result.duration * 100 if result.duration else 0
+        line = (f"  {result.account.site:<14} {result.account.display_name:<32} {result.outcome:<8} "
+                f"{result.duration:6.1f}s (delays: {result.delay:.1f}s, {delay_share:.0f}%)")
+        if result.error is not None:
+            line += f"  ({result.error!r})"
+        print(line)
+
+
 def print_help():
-    print(textwrap.dedent("""
-        Usage: python main.py [options]
-        Options:
-            -h, --help     Show this help message and exit
-            -eg, --epic-games  Claim free games from Epic Games Store
-            -pg, --prime-games Claim free games from Prime Gaming (Working but not tested thoroughly)
-            -g, --gog    Claim free games from GOG (not yet implemented)
-            -a, --all      Claim free games from all supported stores
-    """))
+    options = [("-h, --help", "Show this help message and exit")]
+    options += [(", ".join(spec.flags), spec.help) for spec in registry.all_specs()]
+    options += [
+        ("-a, --all", "Claim free games from all supported stores"),
+        ("--accounts FILE", "Claim for every account in FILE (.csv, .toml or .json) instead of user.env"),
+        ("-j, --jobs N", "Maximum number of browser contexts running at the same time (default: 2)"),
+        ("--jobs-per-site N", "Maximum number of contexts running on the same site (default: --jobs)"),
+        ("--pacing PROFILE", "Anti-bot delay profile: paranoid, normal or fast (default: normal)"),
+        ("-f, --force", "Run even if the current promotions were already claimed"),
+        ("--daemon", "Keep running, and claim again whenever the promotions rotate"),
+    ]
+    print("\nUsage: python main.py [options]\nOptions:")
+    for flags, description in options:
+        print(f"    {flags:<18} {description}")
+    print()
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
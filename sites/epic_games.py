@@ -4,17 +4,25 @@
 @brief:  This file contains functions specific to claiming games from the epic-games website.
 @author: Yonatan-Schrift
 """
-import os # for os.getlogin()
-from math import exp
-
-from core.anti_bot import random_sleep, user_click, scroll_down
-from core.setup import setup_and_open
-from core.utils import click_locator, safe_find, wait_for_user_input, safe_fill, DEFAULT_TIMEOUT_MS
+import asyncio
+import getpass  # for getpass.getuser()
+import os
+from datetime import datetime, timezone
+
+from core.anti_bot import random_sleep, user_click, scroll_down, pacing
+from core.ledger import ClaimLedger, CLAIMED, OWNED, UNAVAILABLE
+from core import retry
+from core.forensics import capture
+from core.setup import BrowserSession, Readiness, ResourcePolicy, goto_with_retry, navigate
+from core.tracing import span
+from core.utils import (click_locator, safe_find, wait_for_user_input, safe_fill, extract_all, wait_for_any,
+                        DEFAULT_TIMEOUT_MS)
 from core.exceptions import *
+from core.offers import Offer, parse_timestamp
 from logs.events import log_persistent
-from logs.logger import get_logger, stop_logger
+from logs.logger import get_logger
 
-from playwright.sync_api import Page, TimeoutError as PWTimeoutError
+from playwright.async_api import Page, TimeoutError as PWTimeoutError
 
 from sites.website import Website
 
@@ -22,18 +30,43 @@ from sites.website import Website
 # Setup logger
 
 class EpicGames(Website):
+    NAME = 'epic_games'
     BASE_URL = 'https://store.epicgames.com/en-US/free-games'
+    STORE_URL = 'https://store.epicgames.com'
+    PROMOTIONS_URL = ('https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions'
+                      '?locale=en-US&country=US&allowCountries=US')
+    FREE_GAME_CARDS = "[aria-label*='Free Games'][aria-label*='Free Now'], [data-component='VaultOfferCard']"
+    # What each page needs before the flow goes on (the storefront's analytics and videos keep "load" waiting)
+    STOREFRONT_READY = Readiness("storefront", selector="[aria-label='Account menu'], [aria-label='Sign in']")
+    PRODUCT_READY = Readiness("product")  # its state is raced right after (see PRODUCT_PAGE_STATES)
+    # What a product page can show, in priority order (a DLC page also has a purchase button)
+    PRODUCT_PAGE_STATES = {
+        "owned": "text='In Library'",
+        "dlc": "text='Requires Base Game'",
+        "eula": "text='end user license agreement'",
+        "purchase": "[data-testid*='purchase']",
+    }
+    # The purchase button can render before the text that rules it out, so the other states get this long to show up
+    PURCHASE_SETTLE_MS = 1500
+    # Store art, videos and trackers are never looked at; the checkout iframe and captcha/anti-bot checks must load fully
+    RESOURCE_POLICY = ResourcePolicy(
+        block_types=frozenset({"image", "media", "font"}),
+        block_urls=(r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net",
+                    r"facebook\.(net|com)", r"datarouter\.ol\.epicgames\.com", r"tracking\.epicgames\.com"),
+        allow_urls=(r"payment-website-pci\.ol\.epicgames\.com", r"hcaptcha\.com", r"talon", r"arkoselabs",
+                    r"recaptcha"),
+    )
     logger = get_logger(__name__)
 
     @staticmethod
-    def run(eg_mail: str, eg_pass: str, headless: bool = False) -> int:
+    async def run(eg_mail: str, eg_pass: str, session: BrowserSession) -> int:
         """
         Main function to claim free games from Epic Games Store.
 
         Args:
             eg_mail (str): epic-games account email
             eg_pass (str): epic-games account password
-            headless (bool): config to run browser in headless mode
+            session (BrowserSession): the shared browser session to open the site's context in
 
         Returns:
             1 on failure, 0 on success
@@ -41,149 +74,318 @@ class EpicGames(Website):
         EpicGames.logger.info("Running epic_games...")
 
         # Constants
-        url_claim = 'https://store.epicgames.com/en-US/'
+        url_claim = f'{EpicGames.STORE_URL}/en-US/'
         status = 0  # default return value to success
 
         if not eg_mail or not eg_pass:
             EpicGames.logger.critical("-!- ERROR: Epic Games credentials not provided -!-")
             return 1
 
-        # setup playwright
-        p, browser, page = setup_and_open(url_claim, is_epic=True, headless=headless)
-
-        # Searching if the website didn't load correctly
-        EpicGames.logger.info("Checking page loading errors")
-        locator = safe_find(page, 'Error')
-        if locator:
-            try:
-                user_click(locator)
-            except ProjectError as e:
-                EpicGames.logger.critical(f"-!- ERROR: {e} -!-")  # log error
-                status = 1  # set return value to error
+        # open the site in its own context of the shared browser (no navigation yet, the feed may be enough)
+        page = await session.open(EpicGames.NAME, account=eg_mail, policy=EpicGames.RESOURCE_POLICY)
+        ledger = ClaimLedger()
 
         try:
+            # Fast path: one request to the promotions feed instead of scrolling and scraping the storefront
+            offers = await EpicGames.fetch_offers(page)
+            current = offers  # every offer of the current promotion, claimed or not
+            done = ledger.claimed_ids(EpicGames.NAME, eg_mail)
+            if offers is not None:
+                pending = [offer for offer in offers if offer.offer_id not in done]
+                for offer in offers:
+                    if offer.offer_id in done:
+                        EpicGames.logger.info(f"'{offer.title}' already claimed (ledger), skipping...")
+                if not pending:
+                    EpicGames.logger.info(f"All {len(offers)} current free games already claimed, nothing to do")
+                    EpicGames.save_window(ledger, eg_mail, current)
+                    return status
+                offers = pending
+
+            await goto_with_retry(page, url_claim, EpicGames.STOREFRONT_READY)
+
+            # Searching if the website didn't load correctly
+            EpicGames.logger.info("Checking page loading errors")
+            locator = await safe_find(page, 'Error')
+            if locator:
+                try:
+                    await user_click(locator)
+                except ProjectError as e:
+                    EpicGames.logger.critical(f"-!- ERROR: {e} -!-")  # log error
+                    status = 1  # set return value to error
+
             # Checks if the user is already signed in
             EpicGames.logger.info("Checking if already signed in...")
-            locator = safe_find(page, "[aria-label='Account menu']", timeout_ms=5000)
-            if not locator:
+            locator = await safe_find(page, "[aria-label='Account menu']", timeout_ms=5000)
+            via_sign_in = not locator  # the saved session (if any) expired
+            if via_sign_in:
                 try:
-                    EpicGames.sign_in(eg_mail, eg_pass, page)  # sign in
+                    async with capture(page, "sign_in"):
+                        await EpicGames.sign_in(eg_mail, eg_pass, page)  # sign in
                 except ProjectError as e:
                     EpicGames.logger.critical(f"-!- ERROR: {e} -!-")  # log error
                     status = 1  # set return value to error
 
-            username_locator = safe_find(page, "[aria-label='Account menu']", timeout_ms=3000)
+            username_locator = await safe_find(page, "[aria-label='Account menu']", timeout_ms=3000)
             if not username_locator:
                 EpicGames.logger.error("Could not find account menu after sign in")
                 status = 1
                 return status
-            username = username_locator.get_attribute("title")
+            username = await username_locator.get_attribute("title")
             EpicGames.logger.info(f"Signed in as {username}")
-
-            # scrolling to the end of the site so the "Free Games" section loads.
-            scroll_twice(page, 5000)
-
-
-            # Locate all free games on the page
-            free_games = page.locator("[aria-label*='Free Games'][aria-label*='Free Now'], "
-                                      "[data-component='VaultOfferCard']").all()
-            if not free_games:
-                log_persistent(EpicGames.logger,
-                    "No free games found, unusual behavior, please check for updates to the script or any "
-                    "geo-restrictions."
-                )
-                return status
-
-            total_games = len(free_games)
-            EpicGames.logger.info(f"Found {total_games} free games to claim")
-
-            # Claim each free game - re-query locators after each page navigation
-            for i in range(total_games):
-                # Re-query locator each iteration to avoid stale references
+            await session.signed_in(page, via_sign_in)  # snapshots the session for the next run
+
+            if offers is None:
+                # Fallback: scrape the storefront (already open) once, then go from product page to product page
+                offers = current = await EpicGames.scrape_offers(page)
+                if offers is None:
+                    log_persistent(EpicGames.logger,
+                        "No free games found, unusual behavior, please check for updates to the script or any "
+                        "geo-restrictions."
+                    )
+                    return status
+                offers = [offer for offer in offers if offer.offer_id not in done]
+
+            EpicGames.logger.info(f"Found {len(offers)} free games to claim")
+            attempted = set()
+            refreshed = False  # the offer list is re-discovered at most once per run
+            i = 0
+            while offers:
+                offer = offers.pop(0)
+                attempted.add(offer.offer_id)
+                i += 1
                 try:
-                    free_games = page.locator("[aria-label*='Free Games'][aria-label*='Free Now'], "
-                                              "[data-component='VaultOfferCard']").all()
-                    if i >= len(free_games):
-                        break  # No more games
-                    item = free_games[i]
-                    item.scroll_into_view_if_needed()
-                    random_sleep()
-                    
-                    game_name = EpicGames.clean_text(item.inner_text())
-                    href = item.get_attribute('href')
-
-                    # A fix for when href is not directly on the item
-                    if not href:
-                        anchor = item.locator("a")
-                        if not anchor:
-                            raise EpicGamesGameNotFoundError("Could not find game link")
-                        href = anchor.get_attribute('href')
-                    if href == "/en-US/free-games":
-                        EpicGames.logger.warning(f"-!- Skipping empty free game card -!-")
+                    status |= await EpicGames.try_claim(page, i, offer, ledger, eg_mail)
+                except EpicGamesGameNotFoundError as e:
+                    if refreshed:
+                        EpicGames.logger.error(f"-!- Failed to claim {offer.title}: {e} -!-")
+                        status = 1
                         continue
-                    link = f"https://store.epicgames.com{href}"
-                except Exception as e:
-                    EpicGames.logger.warning(f"-!- Skipping a game due to unexpected error: {e}")
-                    status = 1
-                    continue
 
-                EpicGames.logger.info(f"[{i+1}] Trying to claim {game_name} from {link}...")
-                try:
-                    EpicGames.claim_game(page, link, game_name)
-                except PWTimeoutError as e:
-                    EpicGames.logger.error(f"-!- Failed to claim {game_name} due to timeout: {e} -!-")
-                    status = 1
-                except Exception as e:
-                    EpicGames.logger.error(f"-!- Failed to claim {game_name} due to unexpected error: {e}-!-")
-                    status = 1
+                    EpicGames.logger.warning(f"{e}, refreshing the list of free games...")
+                    refreshed = True
+                    fresh = await EpicGames.fetch_offers(page)
+                    if fresh is None:
+                        await goto_with_retry(page, url_claim, EpicGames.STOREFRONT_READY)
+                        fresh = await EpicGames.scrape_offers(page) or []
+                    current = fresh
+                    done = ledger.claimed_ids(EpicGames.NAME, eg_mail)
+                    offers = [o for o in fresh if o.offer_id not in done and o.offer_id not in attempted]
 
-                random_sleep()
-                page.goto(url_claim, wait_until="load", timeout=15000)
-                scroll_twice(page, 5000)
+                await random_sleep()
 
+            if status == 0:
+                EpicGames.save_window(ledger, eg_mail, current)
 
         finally:
-            EpicGames.logger.debug("Closing browser and Playwright...")
-            try:
-                browser.close()
-            finally:
-                p.stop()
-                EpicGames.logger.debug("Browser and Playwright closed.")
+            ledger.close()
+            EpicGames.logger.debug("Closing browser context...")
+            await session.close_context(page.context)
+            EpicGames.logger.debug("Browser context closed.")
 
             if status != 0:
                 log_persistent(EpicGames.logger, "Finished with an error! Check the logs")
-            # stops the logger
-            stop_logger(EpicGames.logger)
 
         return status
 
     @staticmethod
-    def sign_in(eg_mail: str, eg_pass: str, page: Page):
+    async def try_claim(page: Page, index: int, offer: Offer, ledger: ClaimLedger, eg_mail: str) -> int:
+        """
+        Claims a single game and records the outcome in the ledger, logging (instead of raising) any failure.
+        Transient failures (network, timeouts, detached frames) start the claim over from the offer's page.
+
+        Returns:
+            1 on failure, 0 on success
+
+        Raises:
+            EpicGamesGameNotFoundError: If the offer's page doesn't exist anymore (the offer list is stale).
+        """
+        EpicGames.logger.info(f"[{index}] Trying to claim {offer.title} from {offer.url}...")
+        try:
+            async with capture(page, "claim_game", offer.title):
+                result = await retry.retry_async(lambda: EpicGames.claim_game(page, offer.url, offer.title),
+                                                 retry.CLAIM, f"Claiming {offer.title}", EpicGames.logger)
+        except EpicGamesGameNotFoundError:
+            raise
+        except PWTimeoutError as e:
+            EpicGames.logger.error(f"-!- Failed to claim {offer.title} due to timeout: {e} -!-")
+            return 1
+        except Exception as e:
+            EpicGames.logger.error(f"-!- Failed to claim {offer.title} due to unexpected error: {e}-!-")
+            return 1
+
+        if result:
+            ledger.record(EpicGames.NAME, eg_mail, offer, result)
+        return 0
+
+    @staticmethod
+    @span("scrape_offers")
+    async def scrape_offers(page: Page) -> list[Offer] | None:
+        """
+        Collects every free game card of the (already open) storefront in a single pass.
+
+        Args:
+            page (Page): A page showing the storefront.
+
+        Returns:
+            list[Offer] | None: The offers (the page path is used as the offer id, the storefront has no ids),
+            or None if there are no free game cards at all.
+        """
+        # scrolling to the end of the site so the "Free Games" section loads.
+        await scroll_twice(page, 5000)
+
+        # Read all free game cards at once (the link is either on the card or on an anchor inside it)
+        cards = await extract_all(page, EpicGames.FREE_GAME_CARDS, {"text": "text", "href": "@href|a@href"})
+        if not cards:
+            return None
+
+        offers = []
+        for card in cards:
+            try:
+                game_name = EpicGames.clean_text(card["text"] or "")
+                href = card["href"]
+                if not href:
+                    raise EpicGamesGameNotFoundError("Could not find game link")
+                if href == "/en-US/free-games":
+                    EpicGames.logger.warning(f"-!- Skipping empty free game card -!-")
+                    continue
+                offers.append(Offer(title=game_name, url=f"{EpicGames.STORE_URL}{href}", offer_id=href))
+            except Exception as e:
+                EpicGames.logger.warning(f"-!- Skipping a game due to unexpected error: {e}")
+
+        return offers
+
+    @staticmethod
+    @span("fetch_offers")
+    async def fetch_offers(page: Page) -> list[Offer] | None:
+        """
+        Gets the current free games from the store's promotions feed, through the page's context
+        (same cookies and proxy as the browser).
+
+        Args:
+            page (Page): A page of the Epic Games context.
+
+        Returns:
+            list[Offer] | None: The current free offers, or None if the feed couldn't be used
+            (the caller should fall back to scraping the storefront).
+        """
+        url = os.getenv("EG_PROMOTIONS_URL") or EpicGames.PROMOTIONS_URL
+        EpicGames.logger.debug(f"Fetching free games from {url}...")
+        try:
+            response = await page.context.request.get(url, timeout=DEFAULT_TIMEOUT_MS * 2)
+            if not response.ok:
+                EpicGames.logger.warning(f"Promotions feed returned HTTP {response.status}, falling back to the storefront")
+                return None
+            offers = EpicGames.parse_promotions(await response.json())
+        except Exception as e:
+            EpicGames.logger.warning(f"Could not read the promotions feed ({e}), falling back to the storefront")
+            return None
+
+        if not offers:
+            EpicGames.logger.warning("Promotions feed has no current free games, falling back to the storefront")
+            return None
+
+        for offer in offers:
+            EpicGames.logger.debug(f"Free offer: {offer.title} ({offer.offer_id}) {offer.url} until {offer.end}")
+        return offers
+
+    @staticmethod
+    def parse_promotions(data: dict, now: datetime = None) -> list[Offer]:
+        """
+        Extracts the currently free offers from the promotions feed.
+
+        An element is free right now if one of its current promotional offers has a 0% discount setting
+        (i.e. 100% off) and `now` is inside the offer's window.
+
+        Args:
+            data (dict): The decoded JSON of the promotions feed.
+            now (datetime): The time to check the promotion windows against (defaults to the current time).
+
+        Returns:
+            list[Offer]: The free offers, in feed order.
+        """
+        now = now or datetime.now(timezone.utc)
+        elements = data["data"]["Catalog"]["searchStore"]["elements"]
+        offers = []
+
+        for element in elements:
+            promotions = element.get("promotions") or {}
+            window = None
+            for group in promotions.get("promotionalOffers") or []:
+                for promo in group.get("promotionalOffers") or []:
+                    start = parse_timestamp(promo.get("startDate"))
+                    end = parse_timestamp(promo.get("endDate"))
+                    is_free = (promo.get("discountSetting") or {}).get("discountPercentage") == 0
+                    if is_free and start and end and start <= now < end:
+                        window = (start, end)
+            if not window:
+                continue
+
+            slug = EpicGames._offer_slug(element)
+            if not slug:
+                EpicGames.logger.warning(f"Skipping free offer without a store page: {element.get('title')}")
+                continue
+            kind = "bundles" if element.get("offerType") == "BUNDLE" else "p"
+
+            offers.append(Offer(
+                title=element.get("title", slug),
+                url=f"{EpicGames.STORE_URL}/en-US/{kind}/{slug}",
+                offer_id=element.get("id") or slug,
+                slug=slug,
+                start=window[0],
+                end=window[1],
+            ))
+
+        return offers
+
+    @staticmethod
+    def _offer_slug(element: dict) -> str | None:
+        """
+        Finds the store page slug of a promotions feed element (it lives in a different field depending on the offer).
+        """
+        mappings = (element.get("offerMappings") or []) + ((element.get("catalogNs") or {}).get("mappings") or [])
+        for mapping in mappings:
+            if mapping.get("pageSlug") and mapping.get("pageType", "productHome") == "productHome":
+                return mapping["pageSlug"]
+
+        slug = (element.get("productSlug") or "").removesuffix("/home")
+        if slug and slug != "[]":
+            return slug
+
+        url_slug = element.get("urlSlug")
+        return url_slug if url_slug and url_slug != "[]" else None
+
+    @staticmethod
+    @span("sign_in")
+    async def sign_in(eg_mail: str, eg_pass: str, page: Page):
         EpicGames.logger.info("Signing in...")
 
         EpicGames.logger.debug("Clicking sign in button...")
-        if not click_locator(page, "[aria-label='Sign in']"):
+        if not await click_locator(page, "[aria-label='Sign in']"):
             raise LocatorNotFoundError("Sign in button missing, please check for updates to the script")
 
         # Checks once again for account, since sometimes the account is already signed in
-        locator = safe_find(page, "[aria-label='Account menu']", timeout_ms=DEFAULT_TIMEOUT_MS)
+        locator = await safe_find(page, "[aria-label='Account menu']", timeout_ms=DEFAULT_TIMEOUT_MS)
         if locator:
             EpicGames.logger.info("Already signed in!")
             return
 
         EpicGames.logger.debug("Entering Credentials...")
-        safe_fill(page, "#email", eg_mail, "#continue")
-        safe_fill(page, "#password", eg_pass, "#sign-in")
+        await safe_fill(page, "#email", eg_mail, "#continue")
+        await safe_fill(page, "#password", eg_pass, "#sign-in")
 
         EpicGames.logger.debug("Checking for 2FA...")
-        locator = safe_find(page, "text=6-digit")
+        locator = await safe_find(page, "text=6-digit")
         if locator:
             EpicGames.logger.info("2FA found, waiting for user to enter code...")
-            wait_for_user_input("-?- Enter the 6-digit code into the browser, press continue, then press Enter here...")
-            click_locator(page, "#yes")
+            # blocks on stdin, so keep it off the event loop (other sites keep running)
+            await asyncio.to_thread(
+                wait_for_user_input,
+                "-?- Enter the 6-digit code into the browser, press continue, then press Enter here..."
+            )
+            await click_locator(page, "#yes")
 
         # --- Verifying sign in was successful ---
-        locator = safe_find(page, "[aria-label='Account menu']", timeout_ms=3000)
+        locator = await safe_find(page, "[aria-label='Account menu']", timeout_ms=3000)
         if not locator:
             raise InvalidCredentialsError("Could not sign in, please check your credentials and/or 2FA code")
 
@@ -221,43 +423,63 @@ class EpicGames(Website):
         )
 
     @staticmethod
-    def claim_game(page: Page, link: str, game_name: str):
+    @span("claim_game")
+    async def claim_game(page: Page, link: str, game_name: str) -> str | None:
+        """
+        Claims a single game from its store page.
+
+        Returns:
+            str | None: The ledger status of the game (CLAIMED, OWNED or UNAVAILABLE),
+            or None if the order went through without a confirmation.
+        """
         EpicGames.logger.info(f"Claiming game '{game_name}' from {link}...")
         
         EpicGames.logger.debug(f"Navigating to {link}...")
-        page.goto(link)
+        response = await navigate(page, link, EpicGames.PRODUCT_READY)
+        if response and response.status == 404:
+            raise EpicGamesGameNotFoundError(f"'{game_name}' has no store page anymore ({link})")
         EpicGames.logger.debug("Page loaded, scrolling...")
-        scroll_down(page, 200)
-
-        # Check if game is already owned
-        EpicGames.logger.debug("Checking if game is in library...")
-        if safe_find(page, "text='In Library'", timeout_ms=2000):
-            EpicGames.logger.info(f"'{game_name}' already in library, skipping...")
-            return
-
-        # Check if the freebie is a DLC for another game.
-        EpicGames.logger.debug("Checking if game is a DLC...")
-        if safe_find(page, "text='Requires Base Game'", timeout_ms=2000):
-            EpicGames.logger.info(f"'{game_name}' is a DLC, skipping...")
-            return
-
-        # Accept EULA if it appears (only on first claim)
-        EpicGames.logger.debug("Checking for EULA...")
-        if safe_find(page, "text='end user license agreement'", timeout_ms=2000):
-            EpicGames.logger.warning("EULA detected, accepting...")
-            try:
-                page.locator("button").filter(has_text="Accept").click()
-                EpicGames.logger.debug("EULA accepted")
-            except Exception as e:
-                EpicGames.logger.warning(f"Failed to accept EULA: {e}")
-
-        EpicGames.logger.debug("Clicking purchase button...")
-        click_locator(page, "[data-testid*='purchase']")
+        await scroll_down(page, 200)
+
+        # Product page: wait for whichever state the page is in (instead of probing each one with its own timeout)
+        states = dict(EpicGames.PRODUCT_PAGE_STATES)
+        while True:
+            state, locator = await wait_for_any(page, states, timeout_ms=DEFAULT_TIMEOUT_MS)
+            if state == "purchase":
+                # don't click yet: a DLC, owned or EULA text rendering late would have won the race
+                others = {name: selector for name, selector in states.items() if name != "purchase"}
+                late_state, late_locator = await wait_for_any(page, others, timeout_ms=EpicGames.PURCHASE_SETTLE_MS)
+                if late_state:
+                    state, locator = late_state, late_locator
+            EpicGames.logger.debug(f"Product page state: {state}")
+            match state:
+                case "owned":
+                    EpicGames.logger.info(f"'{game_name}' already in library, skipping...")
+                    return OWNED
+                case "dlc":
+                    # the freebie is a DLC for another game
+                    EpicGames.logger.info(f"'{game_name}' is a DLC, skipping...")
+                    return UNAVAILABLE
+                case "eula":
+                    # Accept EULA if it appears (only on first claim)
+                    EpicGames.logger.warning("EULA detected, accepting...")
+                    try:
+                        await page.locator("button").filter(has_text="Accept").click()
+                        EpicGames.logger.debug("EULA accepted")
+                    except Exception as e:
+                        EpicGames.logger.warning(f"Failed to accept EULA: {e}")
+                    del states["eula"]
+                case "purchase":
+                    EpicGames.logger.debug("Clicking purchase button...")
+                    await user_click(locator)
+                    break
+                case _:
+                    raise LocatorNotFoundError(f"Purchase button for '{game_name}' not found")
 
         # Wait until the checkout iframe exists
         EpicGames.logger.debug("Waiting for checkout iframe...")
         try:
-            page.wait_for_selector("#webPurchaseContainer iframe", timeout=DEFAULT_TIMEOUT_MS)
+            await page.wait_for_selector("#webPurchaseContainer iframe", timeout=DEFAULT_TIMEOUT_MS)
         except Exception as e:
             EpicGames.logger.error(f"Checkout iframe not found: {e}")
             raise
@@ -274,13 +496,13 @@ class EpicGames(Website):
         # Wait until button is visible and click
         EpicGames.logger.debug("Waiting for Place Order button to be visible...")
         try:
-            button.wait_for(state="visible", timeout=20_000)
+            await button.wait_for(state="visible", timeout=20_000)
         except Exception as e:
             EpicGames.logger.error(f"Place Order button not visible: {e}")
             raise
             
         EpicGames.logger.debug("Clicking Place Order button...")
-        user_click(button)
+        await user_click(button)
 
         # captcha = page.frame_locator("#h_captcha_challenge_checkout_free_prod iframe")
         # if captcha:
@@ -289,16 +511,18 @@ class EpicGames(Website):
 
         # Wait until the "Thanks for your order!" text appears
         EpicGames.logger.debug("Waiting for order confirmation...")
-        if safe_find(page, "text=Thanks for your order!",timeout_ms=15_000):
+        if await safe_find(page, "text=Thanks for your order!",timeout_ms=15_000):
             EpicGames.logger.info(f"'{game_name}' successfully claimed!")
-            log_persistent(EpicGames.logger, f"User {os.getlogin()} Successfully claimed {game_name} from {link}")
-            return
+            log_persistent(EpicGames.logger, f"User {getpass.getuser()} Successfully claimed {game_name} from {link}")
+            return CLAIMED
         
         EpicGames.logger.warning(f"'{game_name}' claim completed but no confirmation found")
+        return None
 
 @staticmethod
-def scroll_twice(page: Page, scroll_amount: int):
-    scroll_down(page, scroll_amount)
-    random_sleep(1, 2)
-    scroll_down(page, scroll_amount)
-    random_sleep(2, 5)
\ No newline at end of file
+@span("scroll_twice")
+async def scroll_twice(page: Page, scroll_amount: int):
+    await scroll_down(page, scroll_amount)
+    await random_sleep(*pacing().scroll_pause)
+    await scroll_down(page, scroll_amount)
+    await random_sleep(*pacing().settle_pause)
\ No newline at end of file
@@ -4,33 +4,67 @@
 @brief:  This file contains functions specific to claiming games from the prime gaming website.
 @author: Yonatan-Schrift
 """
-import os # for os.getlogin()
-
-from core.anti_bot import random_sleep, scroll_down, user_click
-from core.setup import setup_and_open
-from core.utils import click_locator, safe_find, safe_fill
+import getpass  # for getpass.getuser()
+from urllib.parse import urljoin
+
+from core.anti_bot import random_sleep, user_click
+from core.ledger import ClaimLedger, CLAIMED, MANUAL
+from core.offers import Offer
+from core import retry
+from core.forensics import capture
+from core.setup import BrowserSession, Readiness, ResourcePolicy, goto_with_retry, wait_until_ready
+from core.tracing import span
+from core.utils import click_locator, safe_find, safe_fill, extract_all, wait_for_stable_count, wait_for_any
 from core.exceptions import *
 from logs.events import log_persistent
-from logs.logger import get_logger, stop_logger
+from logs.logger import get_logger
 
-from playwright.sync_api import Page
+from playwright.async_api import Page
 
 from sites.website import Website
 
 
 class PrimeGaming(Website):
+    NAME = "prime_gaming"
     BASE_URL = "https://gaming.amazon.com/"
+    GRID = ".offer-list__content__grid"
+    OFFER_GRID = f"{GRID} [data-a-target='FGWPOffer']"
+    EMPTY_GRID_MS = 3000  # an empty grid has to stay empty this long (its first batch may come after the grid)
+    # What each page needs before the flow goes on, instead of "load"/"networkidle" (the analytics never settle)
+    HOME_READY = Readiness("home", selector="[title='Sign in'], [data-a-target='user-dropdown-first-name-text']",
+                           timeout_ms=15_000)
+    # after clicking an offer: its page, or (amazon games are claimed in place) no "Get game" at all
+    OFFER_READY = Readiness("offer", selector="text=Get game", state="visible", timeout_ms=5000, optional=True)
+    CODE_TAB_READY = Readiness("claim_code")  # only its URL is needed
+    # What the page shows after "Get game", in priority order (the copy code input is hidden)
+    CLAIM_METHODS = {
+        "link_account": "text='Link account'",
+        "claim_code": "[title='Claim Code']",
+        "copy_code": "input[data-a-target='copy-code-input']",
+        "epic": "[title*='Epic Games']",
+    }
+    CLAIM_TIMEOUT_MS = 5000
+    # Claim methods that need nothing after "Get game": a failed attempt that got that far and took the offer
+    # off the grid claimed it (the code methods still had a code to hand over)
+    CLAIMED_AFTER_GET_GAME = frozenset({"epic"})
+    # Offer art, trailers and metrics beacons are never looked at; the sign-in pages (incl. captcha images) load fully
+    RESOURCE_POLICY = ResourcePolicy(
+        block_types=frozenset({"image", "media", "font"}),
+        block_urls=(r"fls-na\.amazon\.com", r"unagi[^/]*\.amazon\.com", r"amazon-adsystem\.com",
+                    r"google-analytics\.com", r"doubleclick\.net"),
+        allow_urls=(r"amazon\.com/ap/", r"captcha"),
+    )
     logger = get_logger(__name__)
 
     @staticmethod
-    def run(pg_mail: str, pg_pass: str, headless: bool = False) -> int:
+    async def run(pg_mail: str, pg_pass: str, session: BrowserSession) -> int:
         """
         Main function to claim free games from Prime Gaming Store.
 
         Args:
             pg_mail (str): prime-gaming account email
             pg_pass (str): prime-gaming account password
-            headless (bool): config to run browser in headless mode
+            session (BrowserSession): the shared browser session to open the site's context in
 
         Returns:
             1 on failure, 0 on success
@@ -43,36 +77,74 @@ class PrimeGaming(Website):
             PrimeGaming.logger.critical("-!- ERROR: Prime Gaming credentials not provided -!-")
             return 1
 
-        # setup playwright
-        p, browser, page = setup_and_open(PrimeGaming.BASE_URL, headless=headless)
+        # open the site in its own context of the shared browser
+        page = await session.open(PrimeGaming.NAME, PrimeGaming.BASE_URL, account=pg_mail,
+                                  policy=PrimeGaming.RESOURCE_POLICY, ready=PrimeGaming.HOME_READY)
+        ledger = ClaimLedger()
 
         try:
             PrimeGaming.logger.info("Checking if already signed in...")
-            locator = safe_find(page, "[title='Sign in']", timeout_ms=1000)
-            if locator:
+            locator = await safe_find(page, "[title='Sign in']", timeout_ms=1000)
+            via_sign_in = locator is not None  # the saved session (if any) expired
+            if via_sign_in:
                 try:
-                    PrimeGaming.sign_in(pg_mail, pg_pass, page)  # sign in
+                    async with capture(page, "sign_in"):
+                        await PrimeGaming.sign_in(pg_mail, pg_pass, page)  # sign in
                 except (ProjectError, Exception) as e:
                     PrimeGaming.logger.critical(f"-!- ERROR: {e} -!-")  # log error
                     status = 1  # set return value to error (code can maybe continue?)
 
-            username = safe_find(page, "[data-a-target='user-dropdown-first-name-text']",
-                                 timeout_ms=1000).get_attribute(
-                "title")
+            username_locator = await safe_find(page, "[data-a-target='user-dropdown-first-name-text']",
+                                               timeout_ms=1000)
+            username = await username_locator.get_attribute("title")
             PrimeGaming.logger.info(f"Signed in as {username}")
+            await session.signed_in(page, via_sign_in)  # snapshots the session for the next run
 
-            PrimeGaming.scroll_until_end(page)
+            grid_loaded = await PrimeGaming.scroll_until_end(page)
 
             # move games to dict to remove duplicates
-            unclaimed_games = PrimeGaming.get_unique_game_locators(page,
-                                                                   ".offer-list__content__grid [data-a-target='FGWPOffer']",
-                                                                   "aria-label")
+            unclaimed_games = await PrimeGaming.get_unique_game_locators(page, PrimeGaming.OFFER_GRID, "aria-label")
+
+            current = [Offer(title=name, url=urljoin(PrimeGaming.BASE_URL, href), offer_id=href)
+                       for name, href in unclaimed_games.items()]
+
+            # skip games the ledger knows are done, without opening them (the offer link identifies the offer)
+            done = ledger.claimed_ids(PrimeGaming.NAME, pg_mail)
+            for name, href in list(unclaimed_games.items()):
+                if href in done:
+                    PrimeGaming.logger.info(f"'{name}' already claimed (ledger), skipping...")
+                    del unclaimed_games[name]
+
+            async def back_to_grid() -> bool:
+                await goto_with_retry(page, PrimeGaming.BASE_URL, PrimeGaming.HOME_READY)
+                return await PrimeGaming.scroll_until_end(page)
 
-            for i, (name, selector) in enumerate(unclaimed_games.items(), start=1):
+            for i, (name, href) in enumerate(unclaimed_games.items(), start=1):
                 print(f"[{i}]: Claiming {name}")
+                selector = f'a[data-a-target="FGWPOffer"][href="{href}"]'
+
+                progress = {}  # how far the last attempt got (see claim_game)
+                grid_reloaded = None  # whether the grid loaded completely before the retry
+
+                async def claim():
+                    if grid_reloaded is not None and progress.get("got_game") \
+                            and not await PrimeGaming.is_listed(page, selector):
+                        return PrimeGaming.claimed_by_failed_attempt(name, progress, grid_reloaded)
+                    progress.clear()
+                    return await PrimeGaming.claim_game(page, selector, name, progress)
+
+                async def before_retry():
+                    nonlocal grid_reloaded
+                    grid_reloaded = await back_to_grid()
 
                 try:
-                    PrimeGaming.claim_game(page, selector, name)
+                    # transient failures (network, timeouts, detached frames) start over from the offer grid
+                    async with capture(page, "claim_game", name):
+                        result = await retry.retry_async(claim, retry.CLAIM, f"Claiming {name}", PrimeGaming.logger,
+                                                         before_retry=before_retry)
+                    if result:
+                        offer = Offer(title=name, url=urljoin(PrimeGaming.BASE_URL, href), offer_id=href)
+                        ledger.record(PrimeGaming.NAME, pg_mail, offer, result)
                 except ProjectError as e:
                     PrimeGaming.logger.error(f"-!- ERROR: {e} -!-")  # log error
                     status = 1  # set return value to error, continue to the next game
@@ -81,44 +153,42 @@ class PrimeGaming(Website):
                     PrimeGaming.logger.critical(f"-!- ERROR: {e} -!-")  # log error
                     return 1  # return error, unknown exception
 
-                random_sleep()
-                page.goto(PrimeGaming.BASE_URL, wait_until="load", timeout=15000)
-                PrimeGaming.scroll_until_end(page)
+                if i < len(unclaimed_games):  # the last game doesn't need the grid again
+                    await random_sleep()
+                    await back_to_grid()
 
             PrimeGaming.logger.info(f"Claimed {len(unclaimed_games)} games")
 
+            if status == 0:
+                PrimeGaming.save_grid_window(ledger, pg_mail, current, grid_loaded)
 
         finally:
-            PrimeGaming.logger.debug("Closing browser and Playwright...")
-            try:
-                browser.close()
-            finally:
-                p.stop()
-                PrimeGaming.logger.debug("Browser and Playwright closed.")
-
-            # stops the logger
-            stop_logger(PrimeGaming.logger)
+            ledger.close()
+            PrimeGaming.logger.debug("Closing browser context...")
+            await session.close_context(page.context)
+            PrimeGaming.logger.debug("Browser context closed.")
 
         return status
 
     @staticmethod
-    def sign_in(pg_mail: str, pg_pass: str, page: Page):
+    @span("sign_in")
+    async def sign_in(pg_mail: str, pg_pass: str, page: Page):
         PrimeGaming.logger.info("Signing in...")
 
         PrimeGaming.logger.debug("Clicking sign in button...")
-        if not click_locator(page, "[title='Sign in']"):
+        if not await click_locator(page, "[title='Sign in']"):
             raise LocatorNotFoundError("Sign in button missing, please check for updates to the script")
 
         # Checks once again for account, since sometimes the account is already signed in
-        locator = safe_find(page, "[aria-label='User dropdown and more options']", timeout_ms=3000)
+        locator = await safe_find(page, "[aria-label='User dropdown and more options']", timeout_ms=3000)
         if locator:
             PrimeGaming.logger.info("Already signed in!")
             return
 
         PrimeGaming.logger.debug("Entering Credentials...")
 
-        safe_fill(page, "#ap_email", pg_mail, "#continue-announce")
-        safe_fill(page, "#ap_password", pg_pass, "#signInSubmit")
+        await safe_fill(page, "#ap_email", pg_mail, "#continue-announce")
+        await safe_fill(page, "#ap_password", pg_pass, "#signInSubmit")
 
         # I have no clue if 2fa is even used here, leaving this commented out for now
 
@@ -130,130 +200,191 @@ class PrimeGaming(Website):
         #     click_locator(page, "#yes")
 
         # --- Verifying sign in was successful ---
-        locator = safe_find(page, "[data-a-target='user-dropdown-first-name-text']", timeout_ms=3000)
+        locator = await safe_find(page, "[data-a-target='user-dropdown-first-name-text']", timeout_ms=3000)
         if not locator:
             raise InvalidCredentialsError("Could not sign in, please check your credentials and/or 2FA code")
 
     @staticmethod
-    def claim_game(page: Page, selector: str, game_name: str) -> bool:
+    def save_grid_window(ledger: ClaimLedger, account: str, offers: list[Offer], grid_loaded: bool) -> bool:
+        """
+        Saves the promotion window of the offers read from the grid (see `Website.save_window`).
+        The grid only lists unclaimed offers, so an empty one means everything is claimed, but only if it
+        actually loaded: a grid that timed out or failed to load is empty (or incomplete) too, and saves nothing.
+
+        Args:
+            ledger (ClaimLedger): The claim ledger of the run.
+            account (str): The account (email).
+            offers (list[Offer]): The offers the grid listed.
+            grid_loaded (bool): Whether `scroll_until_end` found the grid and it settled.
+
+        Returns:
+            bool: True if the window was saved.
+        """
+        if not grid_loaded:
+            PrimeGaming.logger.info("Offer grid didn't load completely, not saving the promotion window")
+            return False
+        return PrimeGaming.save_window(ledger, account, offers, allow_empty=True)
+
+    @staticmethod
+    def claimed_by_failed_attempt(game_name: str, progress: dict, grid_reloaded: bool) -> str:
+        """
+        Decides about an offer that left the grid after an attempt clicked "Get game" and then failed.
+        The grid only lists unclaimed offers, so the attempt may have claimed it.
+
+        Returns:
+            str: CLAIMED, if the grid reloaded completely and the claim method needs nothing after "Get game".
+
+        Raises:
+            ClaimUnconfirmedError: Otherwise (nothing is recorded, the user is asked to check the offer).
+        """
+        method = progress.get("method")
+        if grid_reloaded and method in PrimeGaming.CLAIMED_AFTER_GET_GAME:
+            PrimeGaming.logger.info(f"'{game_name}' left the offer grid, the failed attempt claimed it")
+            log_persistent(PrimeGaming.logger, f"Successfully claimed {game_name}")
+            return CLAIMED
+
+        log_persistent(PrimeGaming.logger, f"User: {getpass.getuser()}\n Check {game_name} on {PrimeGaming.BASE_URL}, "
+                                           f"its claim broke off after 'Get game' and may need a code")
+        raise ClaimUnconfirmedError(f"Claim of {game_name} broke off after 'Get game' "
+                                    f"(claim method: {method or 'unknown'}), it can't be confirmed")
+
+    @staticmethod
+    async def is_listed(page: Page, selector: str) -> bool:
+        """
+        Whether an offer is on the (fully loaded) offer grid, i.e. still unclaimed.
+        """
+        return await page.locator(selector).count() > 0
+
+    @staticmethod
+    @span("claim_game")
+    async def claim_game(page: Page, selector: str, game_name: str, progress: dict = None) -> str | None:
+        """
+        Claims a single game from the offer grid.
+
+        Args:
+            page (Page): Playwright page instance, on the offer grid.
+            selector (str): Selector of the offer on the grid.
+            game_name (str): Name of the game, for the logs.
+            progress (dict): Filled with how far the claim got, for a retry after a failure:
+                "got_game" once "Get game" was clicked, "method" once the claim method is known.
+
+        Returns:
+            str | None: The ledger status of the game (CLAIMED, or MANUAL when the user has to redeem a code),
+            or None if the claim method is unknown.
+        """
         PrimeGaming.logger.info("Claiming game...")
 
-        loc = safe_find(page, selector, is_hidden=True)
+        loc = await safe_find(page, selector, is_hidden=True)
         if not loc:
             raise LocatorNotFoundError(f"Could not find game locator for {game_name}")
-        user_click(loc)
+        await user_click(loc)
 
-        page.wait_for_load_state("networkidle")
+        await wait_until_ready(page, PrimeGaming.OFFER_READY)
 
         if page.url == PrimeGaming.BASE_URL:
             # claimed an amazon game, no extra steps needed
             PrimeGaming.logger.info("Game claimed successfully!")
             log_persistent(PrimeGaming.logger, f"Successfully claimed {game_name}")
-            return True
+            return CLAIMED
 
-        random_sleep()
+        await random_sleep()
 
-        locator = safe_find(page, "text=Get game")
-        user_click(locator)
+        locator = await safe_find(page, "text=Get game")
+        if not locator:
+            raise LocatorNotFoundError(f"'Get game' button for {game_name} not found")
+        await user_click(locator)
+        if progress is not None:
+            progress["got_game"] = True
 
-        random_sleep()
+        await random_sleep()
 
-        # Some games require account linking, check for that
-        locator = safe_find(page, "text='Link account'", timeout_ms=1000)
-        if locator:
-            raise AccountNotLinkedError(
-                f"Account required for {game_name} not linked to prime_gaming - please link your account manually and try again")
+        # One wait for whichever claim method the game uses, instead of probing them one after the other
+        method, locator = await wait_for_any(page, PrimeGaming.CLAIM_METHODS, timeout_ms=PrimeGaming.CLAIM_TIMEOUT_MS,
+                                             attached={"copy_code"})
+        PrimeGaming.logger.debug(f"Claim method: {method}")
+        if progress is not None:
+            progress["method"] = method
+        match method:
+            case "link_account":
+                # Some games require account linking
+                raise AccountNotLinkedError(
+                    f"Account required for {game_name} not linked to prime_gaming - please link your account manually and try again")
 
+            case "claim_code":
+                # gog games requires manual claim (e.g. captcha) so it sends the game code for the user to claim.
+                async with page.context.expect_page() as new_page_info:
+                    await user_click(locator)
 
-        # gog games requires manual claim (e.g. captcha) so it sends the game code for the user to claim.
-        locator = safe_find(page, "[title='Claim Code']", timeout_ms=3000)
-        if locator:
-            with page.context.expect_page() as new_page_info:
-                user_click(locator)
+                new_page = await new_page_info.value
+                await wait_until_ready(new_page, PrimeGaming.CODE_TAB_READY)
 
-            new_page = new_page_info.value
-            new_page.wait_for_load_state("networkidle")
+                PrimeGaming.logger.info("Found claim code... must claim manually")
 
-            PrimeGaming.logger.info("Found claim code... must claim manually")
+                log_persistent(PrimeGaming.logger, f"User: {getpass.getuser()}\n Claim {game_name} from {new_page.url}")
 
-            log_persistent(PrimeGaming.logger, f"User: {os.getlogin()}\n Claim {game_name} from {new_page.url}")
+                PrimeGaming.logger.info("Game claimed successfully!")
 
-            PrimeGaming.logger.info("Game claimed successfully!")
+                await new_page.close()
+                return MANUAL
 
-            new_page.close()
-            return True
+            case "copy_code":
+                # Legacy games (Personally I don't care for that storefront, so no automation)
+                PrimeGaming.logger.info("Legacy-Games game... must claim manually")
 
-        # Legacy games (Personally I don't care for that storefront, so no automation)
-        locator = safe_find(page, "input[data-a-target='copy-code-input']", timeout_ms=3000, is_hidden=True)
-        if locator:
-            PrimeGaming.logger.info("Legacy-Games game... must claim manually")
-
-            log_persistent(PrimeGaming.logger,
-                           f"User: {os.getlogin()}\n Claim {game_name} from legacy games with code: {locator.get_attribute('value')}")
+                code = await locator.get_attribute('value')
+                log_persistent(PrimeGaming.logger,
+                               f"User: {getpass.getuser()}\n Claim {game_name} from legacy games with code: {code}")
 
-            PrimeGaming.logger.info("Game claimed successfully!")
-            return True
+                PrimeGaming.logger.info("Game claimed successfully!")
+                return MANUAL
 
-        # Epic games:
-        locator = safe_find(page, "[title*='Epic Games']", timeout_ms=3000)
-        if locator:
-            PrimeGaming.logger.info("Epic Games...")
+            case "epic":
+                PrimeGaming.logger.info("Epic Games...")
 
-            log_persistent(PrimeGaming.logger, f"User: {os.getlogin()} Claimed {game_name} into your epic games account!")
+                log_persistent(PrimeGaming.logger, f"User: {getpass.getuser()} Claimed {game_name} into your epic games account!")
 
-            PrimeGaming.logger.info("Game claimed successfully!")
-            return True
+                PrimeGaming.logger.info("Game claimed successfully!")
+                return CLAIMED
 
         PrimeGaming.logger.warning("Game claim method unknown, please check for updates to the script")
 
-        return False
+        return None
 
     @staticmethod
-    def scroll_until_end(page: Page, max_scrolls: int = 50, stable_retries: int = 3):
+    @span("scroll_until_end")
+    async def scroll_until_end(page: Page, stable_ms: int = 1000, timeout_ms: int = 30_000) -> bool:
         """
-        Scrolls down repeatedly using scroll_down() until the page height stops changing
-        for `stable_retries` consecutive checks.
+        Loads the whole (lazily loaded) offer grid, returning as soon as the number of offers
+        stopped changing for `stable_ms` (or the grid stayed empty for EMPTY_GRID_MS: everything is claimed).
 
         Args:
             page (Page): Playwright page instance.
-            max_scrolls (int): Maximum scroll iterations before giving up.
-            stable_retries (int): How many times height must remain unchanged before stopping.
-        """
-        stable_count = 0
+            stable_ms (int): How long the offer count has to stay the same (milliseconds).
+            timeout_ms (int): Maximum time to wait (milliseconds).
 
-        for i in range(max_scrolls):
-            previous_height = page.evaluate("document.documentElement.scrollHeight")
-
-            # Scroll down one viewport at a time
-            try:
-                scroll_down(page, amount=page.evaluate("window.innerHeight"))
-            except Exception as e:
-                PrimeGaming.logger.error(f"[ERROR] scroll_down() failed on iteration {i}: {e}")
-                break
-
-            random_sleep(1, 2)
-
-            current_height = page.evaluate("document.documentElement.scrollHeight")
-            PrimeGaming.logger.debug(
-                f" Scroll #{i}: prev={previous_height}, curr={current_height}, stable={stable_count}")
+        Returns:
+            bool: True if the grid is there and settled (possibly empty), False on timeout or error.
+        """
+        try:
+            result = await wait_for_stable_count(page, PrimeGaming.OFFER_GRID, stable_ms, timeout_ms,
+                                                 container=PrimeGaming.GRID, empty_ms=PrimeGaming.EMPTY_GRID_MS)
+        except Exception as e:
+            PrimeGaming.logger.error(f"[ERROR] waiting for the offer grid failed: {e}")
+            return False
 
-            # If height hasn't changed, increment stability counter
-            if current_height == previous_height:
-                stable_count += 1
-                if stable_count >= stable_retries:
-                    PrimeGaming.logger.debug(
-                        f"-!- Page height stable for {stable_retries} checks — finished after {i + 1} scrolls.")
-                    return True
-            else:
-                stable_count = 0  # reset if height changes
+        PrimeGaming.logger.debug(f"Offer grid loaded: {result['count']} offers in {result['batches']} batches, "
+                                 f"{result['elapsedMs'] / 1000:.1f}s")
 
-        PrimeGaming.logger.warning("[WARN] -!- Reached max scrolls without full stabilization.")
-        return False
+        if result["timedOut"]:
+            PrimeGaming.logger.warning("[WARN] -!- Offer grid didn't settle before the timeout.")
+            return False
+        return True
 
     @staticmethod
-    def get_unique_game_locators(page: Page, game_selector: str, unique_by: str) -> dict[str, str]:
+    @span("collect_offers")
+    async def get_unique_game_locators(page: Page, game_selector: str, unique_by: str) -> dict[str, str]:
         """
-        Collects all locators matching `game_selector` and deduplicates them
+        Collects all elements matching `game_selector` (in a single browser call) and deduplicates them
         by a given attribute (e.g., aria-label, id, name).
 
         Args:
@@ -264,17 +395,14 @@ class PrimeGaming(Website):
         Returns:
             dict[str, str]: Mapping from unique attribute value -> href.
         """
-        locators = page.locator(game_selector).all()
+        rows = await extract_all(page, game_selector, {"key": f"@{unique_by}", "href": "@href"})
         unique_dict = {}
 
-        for loc in locators:
-            try:
-                game_name = loc.get_attribute(unique_by).removeprefix("Claim ")
-                if not game_name:
-                    continue  # skip elements without this attribute
-                if game_name not in unique_dict:
-                    unique_dict[game_name] = f'a[data-a-target="FGWPOffer"][href="{loc.get_attribute("href")}"]'
-            except Exception as e:
-                print(f"[WARN] Failed to process locator: {e}")
+        for row in rows:
+            game_name = (row["key"] or "").removeprefix("Claim ")
+            if not game_name or not row["href"]:
+                continue  # skip elements without this attribute or a link
+            if game_name not in unique_dict:
+                unique_dict[game_name] = row["href"]
 
         return unique_dict
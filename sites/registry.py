@@ -0,0 +1,139 @@
+"""
+@file:   sites/registry.py
+@module: sites.registry
+@brief:  The registry of supported sites: their names, command line flags and where their Website subclass lives.
+         A site's module (and with it Playwright) is only imported once the site is actually run.
+@author: Yonatan-Schrift
+"""
+import importlib
+from dataclasses import dataclass
+from typing import Final
+
+ENTRY_POINT_GROUP: Final[str] = "autoclaim.sites"
+
+
+@dataclass(frozen=True)
+class SiteSpec:
+    """
+    How to find and select a site.
+
+    Attributes:
+        name (str): The site's NAME (also used in accounts files), e.g. "epic_games".
+        target (str): "module:Class" of the site's Website subclass, or "" if the site isn't implemented yet.
+        flags (tuple[str, ...]): Command line flags selecting the site.
+        help (str): Description for --help.
+        credentials (tuple[str, str]): Names of the email and password variables in user.env.
+        notice (str): Printed when the site is selected (e.g. experimental support).
+    """
+    name: str
+    target: str
+    flags: tuple[str, ...]
+    help: str
+    credentials: tuple[str, str] = ("", "")
+    notice: str = ""
+
+    @property
+    def available(self) -> bool:
+        return bool(self.target)
+
+
+_BUILTIN = (
+    SiteSpec("epic_games", "sites.epic_games:EpicGames", ("-eg", "--epic-games"),
+             "Claim free games from Epic Games Store", ("EG_EMAIL", "EG_PASSWORD")),
+    SiteSpec("prime_gaming", "sites.prime_gaming:PrimeGaming", ("-pg", "--prime-games"),
+             "Claim free games from Prime Gaming (Working but not tested thoroughly)", ("PG_EMAIL", "PG_PASSWORD"),
+             notice="Prime Gaming is experimental and may not work as expected."),
+    SiteSpec("gog", "", ("-g", "--gog"),
+             "Claim free games from GOG (not yet implemented)",
+             notice="GOG support is not yet implemented."),
+)
+
+_specs: dict[str, SiteSpec] = {spec.name: spec for spec in _BUILTIN}
+_loaded: dict[str, type] = {}
+_plugins_discovered = False
+
+
+def register(spec: SiteSpec) -> None:
+    """
+    Adds (or replaces) a site.
+    """
+    _specs[spec.name] = spec
+
+
+def _discover_plugins() -> None:
+    """
+    Registers the sites other packages provide through the "autoclaim.sites" entry point group
+    (name = the site's NAME, value = "module:Class"). Done once, and only when all sites are needed.
+    """
+    global _plugins_discovered
+    if _plugins_discovered:
+        return
+    _plugins_discovered = True
+
+    from importlib.metadata import entry_points  # ~10 ms, only paid when plugins are looked up
+
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in _specs:
+            continue  # built-in sites can't be shadowed
+        prefix = entry_point.name.upper()
+        register(SiteSpec(
+            name=entry_point.name,
+            target=entry_point.value,
+            flags=(f"--{entry_point.name.replace('_', '-')}",),
+            help=f"Claim free games from {entry_point.name} (plugin)",
+            credentials=(f"{prefix}_EMAIL", f"{prefix}_PASSWORD"),
+        ))
+
+
+def all_specs() -> list[SiteSpec]:
+    """
+    Returns every known site, built-in ones first.
+    """
+    _discover_plugins()
+    return list(_specs.values())
+
+
+def available() -> list[str]:
+    """
+    Returns the names of the sites that can be run.
+    """
+    return [spec.name for spec in all_specs() if spec.available]
+
+
+def get(name: str) -> SiteSpec | None:
+    if name not in _specs:
+        _discover_plugins()
+    return _specs.get(name)
+
+
+def by_flag(flag: str) -> SiteSpec | None:
+    """
+    Returns the site selected by a command line flag, or None if the flag doesn't select a site.
+    """
+    for spec in _specs.values():
+        if flag in spec.flags:
+            return spec
+    if not _plugins_discovered and flag.startswith("--"):
+        _discover_plugins()
+        return by_flag(flag)
+    return None
+
+
+def load(name: str) -> type:
+    """
+    Imports a site and returns its Website subclass.
+
+    Raises:
+        KeyError: If the site is unknown or not implemented.
+    """
+    if name in _loaded:
+        return _loaded[name]
+
+    spec = get(name)
+    if spec is None or not spec.available:
+        raise KeyError(f"Site '{name}' is not available")
+
+    module_name, _, class_name = spec.target.partition(":")
+    site = getattr(importlib.import_module(module_name), class_name)
+    _loaded[name] = site
+    return site
@@ -6,7 +6,11 @@
 """
 
 from abc import ABC, abstractmethod
-from playwright.sync_api import Page
+from playwright.async_api import Page
+from core.ledger import ClaimLedger
+from core.offers import Offer
+from core.promotions import record_window
+from core.setup import BrowserSession, ResourcePolicy
 import logging
 
 
@@ -16,7 +20,9 @@ class Website(ABC):
     Defines the interface every website must implement.
     """
 
+    NAME: str  # short identifier, used for per-site state and in the accounts file
     BASE_URL: str
+    RESOURCE_POLICY: ResourcePolicy | None = None  # requests to block while running the site
     logger: logging.Logger
 
     # ─────────────────────────────────────────────
@@ -25,7 +31,7 @@ class Website(ABC):
 
     @staticmethod
     @abstractmethod
-    def sign_in(email: str, password: str, page: Page):
+    async def sign_in(email: str, password: str, page: Page):
         """
         Perform sign-in flow for the website.
         """
@@ -33,7 +39,7 @@ class Website(ABC):
 
     @staticmethod
     @abstractmethod
-    def claim_game(page: Page, selector: str, game_name: str):
+    async def claim_game(page: Page, selector: str, game_name: str):
         """
         Claim a single available game or offer.
         """
@@ -41,9 +47,39 @@ class Website(ABC):
 
     @staticmethod
     @abstractmethod
-    def run(email: str, password: str, headless: bool = False) -> int:
+    async def run(email: str, password: str, session: BrowserSession) -> int:
         """
         Run the full automation flow for the site.
+        Runs as an asyncio task, possibly next to other sites, so it must never block the event loop.
+        The site opens its own context in `session` and closes it when done (the browser itself is shared).
         Returns an exit code (0 = success, non-zero = error).
         """
         pass
+
+    # ─────────────────────────────────────────────
+    # Shared helpers
+    # ─────────────────────────────────────────────
+
+    @classmethod
+    def save_window(cls, ledger: ClaimLedger, account: str, offers: list[Offer], allow_empty: bool = False) -> bool:
+        """
+        If every offer of the current promotion is in the ledger, remembers that nothing is left to claim
+        until the promotion rotates, so the next runs can exit without starting a browser.
+
+        Args:
+            ledger (ClaimLedger): The claim ledger of the run.
+            account (str): The account (email).
+            offers (list[Offer]): The current offers the site listed.
+            allow_empty (bool): Whether an empty list means "nothing to claim" (a site that only lists
+                unclaimed offers) rather than "couldn't find the offers". Saved for RECHECK_HOURS.
+
+        Returns:
+            bool: True if the window was saved.
+        """
+        done = ledger.claimed_ids(cls.NAME, account)
+        if (not offers and not allow_empty) or any(offer.offer_id not in done for offer in offers):
+            return False
+
+        until = record_window(cls.NAME, account, offers)
+        cls.logger.info(f"Everything claimed, nothing new before {until.astimezone():%d-%m-%Y %H:%M}")
+        return True
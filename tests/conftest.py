@@ -0,0 +1,53 @@
+"""
+@file:   tests/conftest.py
+@module: tests.conftest
+@brief:  Shared fixtures. The tests run in a temporary working directory, so the logs the code writes
+         (relative to the working directory) stay out of the repository, and every test gets its own state files.
+@author: Yonatan-Schrift
+"""
+import json
+import os
+
+import pytest
+
+from core.ledger import ClaimLedger
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory):
+    # once per session: the log files stay open (and are reopened by path) for the whole run
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("workdir"))
+    yield
+    os.chdir(previous)
+
+
+@pytest.fixture(autouse=True)
+def state_file(tmp_path, monkeypatch) -> str:
+    """
+    A fresh promotions state file for every test.
+    """
+    path = str(tmp_path / "promotions.json")
+    monkeypatch.setenv("PROMOTIONS_STATE", path)
+    monkeypatch.delenv("RECHECK_HOURS", raising=False)
+    return path
+
+
+@pytest.fixture
+def promotions_feed() -> dict:
+    """
+    A promotions feed recorded from the store (titles and ids anonymized), see fixtures/promotions.json.
+    """
+    with open(os.path.join(FIXTURES, "promotions.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    """
+    A fresh claim ledger for every test.
+    """
+    with ClaimLedger(str(tmp_path / "claims.db")) as ledger:
+        yield ledger
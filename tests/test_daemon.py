@@ -0,0 +1,66 @@
+"""
+@file:   tests/test_daemon.py
+@module: tests.test_daemon
+@brief:  The daemon's wake-ups: an account whose cycle found nothing to claim sleeps until its window ends,
+         instead of being retried (and a browser started) every DAEMON_RETRY_MINUTES.
+@author: Yonatan-Schrift
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import daemon
+from core.accounts import Account
+from core.ledger import ClaimLedger
+from sites.prime_gaming import PrimeGaming
+
+ACCOUNT = Account(PrimeGaming.NAME, "someone@example.com", "hunter2")
+
+
+def _empty_grid_cycle(ledger: ClaimLedger):
+    """
+    A cycle like PrimeGaming.run's when the grid lists no unclaimed offer.
+    """
+    calls = []
+
+    async def run_cycle(accounts: list[Account]) -> int:
+        calls.append(accounts)
+        for account in accounts:
+            PrimeGaming.save_grid_window(ledger, account.email, [], grid_loaded=True)
+        return 0
+
+    return run_cycle, calls
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_next_wakeup_after_empty_grid(ledger, monkeypatch):
+    monkeypatch.setenv("RECHECK_HOURS", "12")
+    now = datetime.now(timezone.utc)
+    PrimeGaming.save_grid_window(ledger, ACCOUNT.email, [], grid_loaded=True)
+
+    wakeup = daemon.next_wakeup([ACCOUNT], now)
+
+    assert timedelta(hours=11) < wakeup - now <= timedelta(hours=12, seconds=1)
+
+
+def test_daemon_does_not_rerun_a_settled_account(ledger, monkeypatch):
+    monkeypatch.setenv("DAEMON_JITTER_MINUTES", "0")
+    run_cycle, calls = _empty_grid_cycle(ledger)
+    wakeups = []
+
+    async def sleep_until(when: datetime) -> None:
+        wakeups.append(when)
+        if len(wakeups) == 3:
+            raise _Stop()  # the daemon never returns by itself
+
+    monkeypatch.setattr(daemon, "sleep_until", sleep_until)
+    with pytest.raises(_Stop):
+        asyncio.run(daemon.run_daemon([ACCOUNT], run_cycle))
+
+    assert calls == [[ACCOUNT]]  # the first cycle only, the next ones found the account settled
+    retry = timedelta(minutes=daemon.DEFAULT_RETRY_MINUTES)
+    assert all(when - datetime.now(timezone.utc) > retry for when in wakeups)
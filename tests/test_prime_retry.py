@@ -0,0 +1,26 @@
+"""
+@file:   tests/test_prime_retry.py
+@module: tests.test_prime_retry
+@brief:  A Prime claim that failed after "Get game" and left the grid is only taken as claimed when that is certain.
+@author: Yonatan-Schrift
+"""
+import pytest
+
+from core.exceptions import ClaimUnconfirmedError
+from core.ledger import CLAIMED
+from sites.prime_gaming import PrimeGaming
+
+
+def test_claimed_in_place():
+    assert PrimeGaming.claimed_by_failed_attempt("Game", {"got_game": True, "method": "epic"}, True) == CLAIMED
+
+
+@pytest.mark.parametrize("progress, grid_reloaded", [
+    ({"got_game": True, "method": "epic"}, False),        # the grid didn't load, the offer may just be missing
+    ({"got_game": True, "method": "claim_code"}, True),   # its code was never handed over
+    ({"got_game": True, "method": "copy_code"}, True),
+    ({"got_game": True}, True),                           # broke off before the claim method was known
+], ids=["grid-not-loaded", "claim-code", "copy-code", "unknown-method"])
+def test_not_confirmed(progress, grid_reloaded):
+    with pytest.raises(ClaimUnconfirmedError):
+        PrimeGaming.claimed_by_failed_attempt("Game", progress, grid_reloaded)
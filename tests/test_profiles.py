@@ -0,0 +1,97 @@
+"""
+@file:   tests/test_profiles.py
+@module: tests.test_profiles
+@brief:  The profile locks: exclusive across processes, free as soon as the owner dies,
+         and taken over by exactly one of several processes waiting for it.
+@author: Yonatan-Schrift
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from core.profiles import ProfileLock, safe_name
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(code: str, **kwargs) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", textwrap.dedent(code)], env=dict(os.environ, PYTHONPATH=ROOT),
+                            text=True, **kwargs)
+
+
+def _hold_and_crash(base: str) -> None:
+    # takes the lock, leaves the Firefox lock a killed browser would, and dies without releasing anything
+    holder = _python(f"""
+        import os
+        from core.profiles import ProfileLock
+        ProfileLock({base!r}).try_acquire() or os._exit(2)
+        os.makedirs({base!r}, exist_ok=True)
+        open(os.path.join({base!r}, "parent.lock"), "w").close()
+        os._exit(0)
+    """)
+    assert holder.wait(timeout=30) == 0
+
+
+def test_safe_names_are_unique():
+    assert safe_name("a_b@c.com") != safe_name("a@b_c.com")
+    assert safe_name("Someone@Example.com") == safe_name("someone@example.com")
+    assert safe_name("someone@example.com").startswith("someone_example.com-")
+
+
+def test_exclusive(tmp_path):
+    base = str(tmp_path / "default")
+    first, second = ProfileLock(base), ProfileLock(base)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert json.load(open(first.path))["pid"] == os.getpid()
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_clean_release_leaves_no_owner(tmp_path):
+    lock = ProfileLock(str(tmp_path / "default"))
+    lock.try_acquire()
+    lock.release()
+
+    assert os.path.getsize(lock.path) == 0
+
+
+def test_crashed_owner(tmp_path):
+    base = str(tmp_path / "default")
+    _hold_and_crash(base)
+
+    lock = ProfileLock(base)
+    assert lock.try_acquire()
+    assert not os.path.exists(os.path.join(base, "parent.lock"))
+    lock.release()
+
+
+def test_one_process_takes_over(tmp_path):
+    base = str(tmp_path / "default")
+    _hold_and_crash(base)
+
+    # all start together, then try once: exactly one may get the lock and they all keep running until told to exit
+    racers = [
+        _python(f"""
+            import sys
+            from core.profiles import ProfileLock
+            sys.stdin.readline()
+            lock = ProfileLock({base!r})
+            print(lock.try_acquire(), flush=True)
+            sys.stdin.readline()
+        """, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        for _ in range(8)
+    ]
+    for racer in racers:
+        racer.stdin.write("go\n")
+        racer.stdin.flush()
+    results = [racer.stdout.readline().strip() for racer in racers]
+    for racer in racers:
+        racer.communicate("exit\n", timeout=30)
+
+    assert results.count("True") == 1
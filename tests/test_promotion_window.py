@@ -0,0 +1,97 @@
+"""
+@file:   tests/test_promotion_window.py
+@module: tests.test_promotion_window
+@brief:  When a site saves its promotion window (so the next runs exit without a browser): only once every
+         current offer is in the ledger, and for Prime's empty grid only once the grid actually loaded.
+@author: Yonatan-Schrift
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from playwright.async_api import TimeoutError as PWTimeoutError
+
+from core.ledger import CLAIMED
+from core.offers import Offer
+from core.promotions import is_settled
+from sites.epic_games import EpicGames
+from sites.prime_gaming import PrimeGaming
+
+EMAIL = "someone@example.com"
+
+
+class _GridPage:
+    """
+    Just enough of a Page for PrimeGaming.scroll_until_end: the grid either never appears, or settles empty.
+    """
+
+    def __init__(self, grid_appears: bool):
+        self.grid_appears = grid_appears
+
+    def locator(self, selector: str) -> "_GridPage":
+        return self
+
+    @property
+    def first(self) -> "_GridPage":
+        return self
+
+    async def wait_for(self, state: str, timeout: float) -> None:
+        if not self.grid_appears:
+            raise PWTimeoutError(f"Timeout {timeout}ms exceeded.")
+
+    async def evaluate(self, script: str, arg: dict) -> dict:
+        return {"count": 0, "batches": 0, "elapsedMs": arg["emptyMs"], "timedOut": False}
+
+
+def _offer(offer_id: str, days: float = 3) -> Offer:
+    return Offer(title=offer_id, url="", offer_id=offer_id, end=datetime.now(timezone.utc) + timedelta(days=days))
+
+
+def test_all_offers_claimed(ledger):
+    offers = [_offer("a"), _offer("b")]
+    for offer in offers:
+        ledger.record(EpicGames.NAME, EMAIL, offer, CLAIMED)
+
+    assert EpicGames.save_window(ledger, EMAIL, offers)
+    assert is_settled(EpicGames.NAME, EMAIL)
+
+
+def test_unclaimed_offer_left(ledger):
+    offers = [_offer("a"), _offer("b")]
+    ledger.record(EpicGames.NAME, EMAIL, offers[0], CLAIMED)
+
+    assert not EpicGames.save_window(ledger, EMAIL, offers)
+    assert not is_settled(EpicGames.NAME, EMAIL)
+
+
+def test_empty_offers_settle_only_when_allowed(ledger):
+    # for Epic, no offers means they couldn't be found
+    assert not EpicGames.save_window(ledger, EMAIL, [])
+    assert not is_settled(EpicGames.NAME, EMAIL)
+
+    assert PrimeGaming.save_window(ledger, EMAIL, [], allow_empty=True)
+    assert is_settled(PrimeGaming.NAME, EMAIL)
+
+
+def test_loaded_empty_grid_settles(ledger):
+    loaded = asyncio.run(PrimeGaming.scroll_until_end(_GridPage(grid_appears=True)))
+
+    assert loaded
+    assert PrimeGaming.save_grid_window(ledger, EMAIL, [], loaded)
+    assert is_settled(PrimeGaming.NAME, EMAIL)
+
+
+def test_failed_grid_does_not_settle(ledger):
+    loaded = asyncio.run(PrimeGaming.scroll_until_end(_GridPage(grid_appears=False)))
+
+    assert not loaded
+    assert not PrimeGaming.save_grid_window(ledger, EMAIL, [], loaded)
+    assert not is_settled(PrimeGaming.NAME, EMAIL)
+
+
+def test_incomplete_grid_does_not_settle(ledger):
+    # everything the grid showed before it timed out is claimed, but more offers may have been behind it
+    offer = _offer("/prime/offer/1")
+    ledger.record(PrimeGaming.NAME, EMAIL, offer, CLAIMED)
+
+    assert not PrimeGaming.save_grid_window(ledger, EMAIL, [offer], grid_loaded=False)
+    assert not is_settled(PrimeGaming.NAME, EMAIL)
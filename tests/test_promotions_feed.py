@@ -0,0 +1,110 @@
+"""
+@file:   tests/test_promotions_feed.py
+@module: tests.test_promotions_feed
+@brief:  Reading the Epic Games promotions feed: which elements are free right now, and falling back to
+         the storefront when the feed can't be used.
+@author: Yonatan-Schrift
+"""
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from playwright.async_api import async_playwright
+
+from bench.mock_store import MockStore
+from sites.epic_games import EpicGames
+
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)  # inside the fixture's current promotion
+
+
+def test_only_current_free_offers(promotions_feed):
+    offers = EpicGames.parse_promotions(promotions_feed, now=NOW)
+
+    # the upcoming, the discounted (30% off), the promotion-less and the null-promotions elements are left out
+    assert [offer.title for offer in offers] == ["Hollow Signal", "Tidebreaker Collection"]
+
+
+def test_offer_urls_and_ids(promotions_feed):
+    game, bundle = EpicGames.parse_promotions(promotions_feed, now=NOW)
+
+    assert game.url == f"{EpicGames.STORE_URL}/en-US/p/hollow-signal"
+    assert game.offer_id == "5d1a7a3c0e2b4f6a8c9d0e1f2a3b4c5d"
+    # a bundle's slug is only in its catalog mappings, and it lives under /bundles/
+    assert bundle.url == f"{EpicGames.STORE_URL}/en-US/bundles/tidebreaker-collection"
+
+
+def test_z_timestamps_are_utc(promotions_feed):
+    game = EpicGames.parse_promotions(promotions_feed, now=NOW)[0]
+
+    assert game.start == datetime(2026, 10, 15, 15, 0, tzinfo=timezone.utc)
+    assert game.end == datetime(2026, 10, 22, 15, 0, tzinfo=timezone.utc)
+
+
+def test_upcoming_offer_becomes_current(promotions_feed):
+    later = datetime(2026, 10, 23, tzinfo=timezone.utc)
+    # still listed as upcoming in this recording, so nothing is free once the current promotion ended
+    assert EpicGames.parse_promotions(promotions_feed, now=later) == []
+
+
+def test_missing_promotions_key(promotions_feed):
+    elements = promotions_feed["data"]["Catalog"]["searchStore"]["elements"]
+    promotions_feed["data"]["Catalog"]["searchStore"]["elements"] = [
+        {key: value for key, value in element.items() if key != "promotions"} for element in elements
+    ]
+    assert EpicGames.parse_promotions(promotions_feed, now=NOW) == []
+
+
+def test_product_slug_without_mappings():
+    element = {"productSlug": "lantern-keep/home", "urlSlug": "lantern-keep-x1", "offerMappings": []}
+    assert EpicGames._offer_slug(element) == "lantern-keep"
+    assert EpicGames._offer_slug({"productSlug": "[]", "urlSlug": "[]"}) is None
+
+
+# ─────────────────────────────────────────────
+# fetch_offers, through a real request context against the mock storefront
+# ─────────────────────────────────────────────
+
+def _fetch(url: str) -> list | None:
+    async def fetch():
+        async with async_playwright() as playwright:
+            request = await playwright.request.new_context()
+            try:
+                # fetch_offers only uses the page's context's request API, no browser needed
+                page = SimpleNamespace(context=SimpleNamespace(request=request))
+                return await EpicGames.fetch_offers(page)
+            finally:
+                await request.dispose()
+    return asyncio.run(fetch())
+
+
+@pytest.fixture
+def feed_url(monkeypatch):
+    def set_url(url: str) -> None:
+        monkeypatch.setenv("EG_PROMOTIONS_URL", url)
+    return set_url
+
+
+def test_fetch_offers(feed_url):
+    with MockStore(offers=3, latency_ms=0) as store:
+        feed_url(f"{store.url}/freeGamesPromotions?locale=en-US")
+        offers = _fetch(store.url)
+
+    assert [offer.slug for offer in offers] == ["mock-game-1", "mock-game-2", "mock-game-3"]
+
+
+@pytest.mark.parametrize("store_options", [
+    {"feed": False},    # the feed answers 503
+    {"offers": 0},      # the feed works but has no free games
+], ids=["server-error", "empty"])
+def test_fetch_offers_falls_back(feed_url, store_options):
+    with MockStore(latency_ms=0, **store_options) as store:
+        feed_url(f"{store.url}/freeGamesPromotions?locale=en-US")
+        assert _fetch(store.url) is None
+
+
+def test_fetch_offers_unreachable(feed_url):
+    with MockStore(latency_ms=0) as store:
+        url = store.url
+    feed_url(f"{url}/freeGamesPromotions")  # the server is closed now
+    assert _fetch(url) is None
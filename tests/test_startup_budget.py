@@ -0,0 +1,46 @@
+"""
+@file:   tests/test_startup_budget.py
+@module: tests.test_startup_budget
+@brief:  The CLI's startup budget (bench/startup_budget.py) as tests: `main.py --help` and a cron run with
+         nothing new to claim must not import Playwright, the loggers or the sites, and must import quickly.
+@author: Yonatan-Schrift
+"""
+import os
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from bench import startup_budget
+from core.offers import Offer
+from core.promotions import record_window
+
+
+def _loaded_sites(times: dict[str, int]) -> list[str]:
+    # the registry describes the sites without importing them
+    return sorted(name for name in times if name.startswith("sites.") and name != "sites.registry")
+
+
+def test_help_imports_nothing_heavy():
+    times = startup_budget.import_times(["--help"])
+
+    assert startup_budget.forbidden_imports(times) == []
+    assert _loaded_sites(times) == []
+
+
+def test_settled_run_imports_nothing_heavy(monkeypatch, state_file):
+    monkeypatch.setenv("EG_EMAIL", "someone@example.com")
+    monkeypatch.setenv("EG_PASSWORD", "hunter2")
+    end = datetime.now(timezone.utc) + timedelta(days=3)
+    record_window("epic_games", "someone@example.com", [Offer(title="Game", url="", offer_id="game", end=end)])
+
+    times = startup_budget.import_times(["--epic-games"])  # exits on the fast path, nothing new to claim
+
+    assert startup_budget.forbidden_imports(times) == []
+    assert _loaded_sites(times) == []
+
+
+def test_help_within_budget():
+    budget_ms = float(os.getenv("STARTUP_BUDGET_MS") or startup_budget.DEFAULT_BUDGET_MS)
+    totals = [sum(startup_budget.import_times(["--help"]).values()) / 1000 for _ in range(3)]
+
+    median = statistics.median(totals)
+    assert median <= budget_ms, f"main.py --help imports take {median:.1f} ms, budget {budget_ms:.0f} ms"
@@ -0,0 +1,27 @@
+"""
+@file:   tests/test_typing.py
+@module: tests.test_typing
+@brief:  The keystroke plan of human_type: one key per driver call (each with its own delay) unless the pacing
+         profile explicitly allows bursts.
+@author: Yonatan-Schrift
+"""
+import pytest
+
+from core.anti_bot import PACING_PROFILES, plan_typing
+
+
+@pytest.mark.parametrize("name", ["paranoid", "normal"])
+def test_one_key_per_call(name):
+    profile = PACING_PROFILES[name]
+    steps = plan_typing("x" * 2000, *profile.key_delay, profile.typo_rate, profile)
+
+    assert all(len(step.text) == 1 for step in steps if step.kind == "type")
+
+
+def test_fast_bursts():
+    profile = PACING_PROFILES["fast"]
+    steps = plan_typing("x" * 2000, *profile.key_delay, profile.typo_rate, profile)
+
+    sizes = [len(step.text) for step in steps if step.kind == "type"]
+    assert max(sizes) == profile.key_burst
+    assert sum(sizes) == 2000 + sum(step.kind == "press" for step in steps)  # every key, typos included